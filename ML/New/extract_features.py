@@ -11,36 +11,41 @@ def extract_audio_features(audio_path):
     # Load audio file
     y, sr = librosa.load(audio_path, duration=3.0, sr=22050)
     
-    # Initialize feature dictionary
-    features = {}
-    
     try:
-        # Compute STFT
-        stft = librosa.stft(y)
-        chroma = librosa.feature.chroma_stft(S=np.abs(stft), sr=sr)
-        features['chroma_stft'] = np.mean(chroma)
-        
-        # Compute RMS energy
-        features['rms'] = np.mean(librosa.feature.rms(y=y))
-        
-        # Compute spectral centroid and bandwidth
-        features['spectral_centroid'] = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-        features['spectral_bandwidth'] = np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr))
-        
-        # Compute spectral rolloff
-        features['rolloff'] = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
-        
-        # Compute zero crossing rate
-        features['zero_crossing_rate'] = np.mean(librosa.feature.zero_crossing_rate(y))
-        
-        # Compute MFCCs
-        mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
-        for i in range(20):
-            features[f'mfcc{i+1}'] = np.mean(mfccs[i])
-            
+        return compute_audio_features(y, sr)
     except Exception as e:
         print(f"Error processing {audio_path}: {str(e)}")
         return None
+
+def compute_audio_features(y, sr):
+    """
+    Compute the handcrafted features for an already loaded clip
+    """
+    # Initialize feature dictionary
+    features = {}
+    
+    # Compute STFT
+    stft = librosa.stft(y)
+    chroma = librosa.feature.chroma_stft(S=np.abs(stft), sr=sr)
+    features['chroma_stft'] = np.mean(chroma)
+    
+    # Compute RMS energy
+    features['rms'] = np.mean(librosa.feature.rms(y=y))
+    
+    # Compute spectral centroid and bandwidth
+    features['spectral_centroid'] = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
+    features['spectral_bandwidth'] = np.mean(librosa.feature.spectral_bandwidth(y=y, sr=sr))
+    
+    # Compute spectral rolloff
+    features['rolloff'] = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
+    
+    # Compute zero crossing rate
+    features['zero_crossing_rate'] = np.mean(librosa.feature.zero_crossing_rate(y))
+    
+    # Compute MFCCs
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
+    for i in range(20):
+        features[f'mfcc{i+1}'] = np.mean(mfccs[i])
         
     return features
 
@@ -0,0 +1,170 @@
+import argparse
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Column order produced by extract_audio_features and used by every training CSV
+FEATURE_NAMES = [
+    'chroma_stft', 'rms', 'spectral_centroid', 'spectral_bandwidth', 'rolloff', 'zero_crossing_rate'
+] + [f'mfcc{i+1}' for i in range(20)]
+
+# Feature extraction settings the models were trained with
+FEATURE_SPEC = {'sr': 22050, 'duration': 3.0, 'n_mfcc': 20}
+
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.webm', '.aac')
+
+ARTIFACT_VERSION = 1
+
+
+def build_artifact(model, scaler, label_encoder=None, feature_names=None, feature_spec=None):
+    """
+    Bundle the feature spec, fitted scaler, model and label names into one dictionary
+    """
+    feature_names = list(feature_names or FEATURE_NAMES)
+    if getattr(scaler, 'n_features_in_', len(feature_names)) != len(feature_names):
+        raise ValueError(f"Scaler expects {scaler.n_features_in_} features, spec has {len(feature_names)}")
+
+    classes = np.asarray(model.classes_)
+    if label_encoder is not None:
+        labels = [str(label) for label in label_encoder.inverse_transform(classes)]
+    else:
+        labels = [str(label) for label in classes]
+
+    return {
+        'version': ARTIFACT_VERSION,
+        'feature_names': feature_names,
+        'feature_spec': dict(feature_spec or FEATURE_SPEC),
+        'scaler': scaler,
+        'model': model,
+        'labels': labels,
+    }
+
+
+def save_artifact(artifact, path):
+    """
+    Save uncompressed so the NumPy arrays inside can be memory-mapped on load
+    """
+    joblib.dump(artifact, path, compress=0)
+    return path
+
+
+def load_artifact(path, mmap_mode='r'):
+    """
+    Load an artifact; large arrays (SVM support vectors, tree tables) stay memory-mapped
+    """
+    artifact = joblib.load(path, mmap_mode=mmap_mode)
+    if not isinstance(artifact, dict) or artifact.get('version') != ARTIFACT_VERSION:
+        raise ValueError(f"{path} is not a version {ARTIFACT_VERSION} inference artifact")
+    return artifact
+
+
+def predict_features(artifact, features):
+    """
+    Score a feature matrix (array or DataFrame) with one scaler.transform and one predict_proba call.
+    Returns a DataFrame with the predicted label and one probability column per label.
+    """
+    feature_names = artifact['feature_names']
+    if isinstance(features, pd.DataFrame):
+        missing = [name for name in feature_names if name not in features.columns]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        matrix = features[feature_names].to_numpy(dtype=np.float64)
+    else:
+        matrix = np.asarray(features, dtype=np.float64).reshape(-1, len(feature_names))
+
+    scaled = artifact['scaler'].transform(matrix)
+    model = artifact['model']
+    labels = artifact['labels']
+
+    if hasattr(model, 'predict_proba'):
+        probabilities = model.predict_proba(scaled)
+    else:
+        # Models trained without probability estimates (e.g. SVC(probability=False)) vote one-hot
+        predicted = model.predict(scaled)
+        probabilities = (predicted[:, None] == np.asarray(model.classes_)[None, :]).astype(np.float64)
+
+    results = pd.DataFrame(probabilities, columns=[f'prob_{label}' for label in labels])
+    results.insert(0, 'label', np.asarray(labels)[np.argmax(probabilities, axis=1)])
+    results.insert(1, 'confidence', probabilities.max(axis=1))
+    return results
+
+
+def extract_directory_features(audio_dir):
+    """
+    Extract the handcrafted features for every audio file in a directory in stacked batches
+    """
+    from batch_features import extract_paths
+
+    paths = [os.path.join(audio_dir, filename) for filename in sorted(os.listdir(audio_dir))
+             if filename.lower().endswith(AUDIO_EXTENSIONS)]
+    paths, features = extract_paths(paths)
+    return paths, pd.DataFrame(features, columns=FEATURE_NAMES)
+
+
+def read_feature_file(path):
+    if path.lower().endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def predict_path(artifact, input_path):
+    """
+    Score a directory of audio clips or a CSV/Parquet feature file in one batch
+    """
+    if os.path.isdir(input_path):
+        paths, features = extract_directory_features(input_path)
+    else:
+        features = read_feature_file(input_path)
+        paths = features['FILE_PATH'].tolist() if 'FILE_PATH' in features.columns else list(features.index)
+
+    if features.empty:
+        return pd.DataFrame(columns=['FILE_PATH', 'label', 'confidence'])
+
+    results = predict_features(artifact, features)
+    results.insert(0, 'FILE_PATH', paths)
+    return results
+
+
+def write_results(results, output_path):
+    if output_path.lower().endswith('.parquet'):
+        results.to_parquet(output_path, index=False)
+    else:
+        results.to_csv(output_path, index=False)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and run single-file sklearn inference artifacts")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Bundle scaler, model and label encoder into one artifact")
+    build_parser.add_argument('--model', required=True, help="Pickled/joblib model (e.g. ML/New/models/deepfake_model.pkl)")
+    build_parser.add_argument('--scaler', required=True, help="Fitted StandardScaler (e.g. ML/New/models/scaler.pkl)")
+    build_parser.add_argument('--label-encoder', help="Fitted LabelEncoder (e.g. ML/New/models/label_encoder.pkl)")
+    build_parser.add_argument('--output', required=True, help="Artifact path (.joblib)")
+
+    predict_parser = subparsers.add_parser('predict', help="Score a directory of clips or a feature file")
+    predict_parser.add_argument('artifact', help="Artifact created with the build command")
+    predict_parser.add_argument('input', help="Audio directory or CSV/Parquet file with feature columns")
+    predict_parser.add_argument('--output', default='predictions.csv', help="Results path (.csv or .parquet)")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        label_encoder = joblib.load(args.label_encoder) if args.label_encoder else None
+        artifact = build_artifact(joblib.load(args.model), joblib.load(args.scaler), label_encoder)
+        save_artifact(artifact, args.output)
+        print(f"Artifact saved to {args.output} (labels: {artifact['labels']})")
+    else:
+        artifact = load_artifact(args.artifact)
+        results = predict_path(artifact, args.input)
+        write_results(results, args.output)
+        print(f"Scored {len(results)} rows, results saved to {args.output}")
+        if not results.empty:
+            print(results['label'].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Activations supported by the exported dense detectors
+ACTIVATIONS = ('linear', 'relu', 'sigmoid', 'tanh', 'softmax')
+
+
+def _as_str(value):
+    """
+    h5py returns attributes as bytes or str depending on the writer version
+    """
+    return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+
+def _layer_configs(model_config):
+    """
+    Return the layer configs of a saved Sequential model (Keras 2 and Keras 3 layouts)
+    """
+    config = model_config.get('config', {})
+    layers = config.get('layers', []) if isinstance(config, dict) else config
+    return [layer for layer in layers if layer.get('class_name') != 'InputLayer']
+
+
+def extract_dense_layers(h5_path):
+    """
+    Read the Dense kernels, biases and activations out of a Keras .h5 file.
+    Only h5py is needed, TensorFlow is never imported.
+    """
+    import h5py
+
+    layers = []
+    with h5py.File(h5_path, 'r') as h5_file:
+        model_config = json.loads(_as_str(h5_file.attrs['model_config']))
+        weights_root = h5_file['model_weights'] if 'model_weights' in h5_file else h5_file
+
+        for layer in _layer_configs(model_config):
+            class_name = layer['class_name']
+            config = layer['config']
+
+            # Dropout is an identity at inference time
+            if class_name == 'Dropout':
+                continue
+            if class_name != 'Dense':
+                raise ValueError(f"Unsupported layer '{class_name}' in {h5_path}")
+
+            activation = config.get('activation', 'linear')
+            if activation not in ACTIVATIONS:
+                raise ValueError(f"Unsupported activation '{activation}' in layer {config['name']}")
+
+            group = weights_root[config['name']]
+            arrays = [np.asarray(group[_as_str(name)]) for name in group.attrs['weight_names']]
+            kernel = next(array for array in arrays if array.ndim == 2)
+            bias = next((array for array in arrays if array.ndim == 1), np.zeros(kernel.shape[1]))
+
+            layers.append((kernel.astype(np.float32), bias.astype(np.float32), activation))
+
+    if not layers:
+        raise ValueError(f"No Dense layers found in {h5_path}")
+    return layers
+
+
+def convert_h5_to_npz(h5_path, npz_path):
+    """
+    Convert a Keras dense model into a compact .npz with one kernel/bias pair per layer
+    """
+    layers = extract_dense_layers(h5_path)
+    arrays = {'activations': np.array([activation for _, _, activation in layers])}
+    for index, (kernel, bias, _) in enumerate(layers):
+        arrays[f'kernel_{index}'] = kernel
+        arrays[f'bias_{index}'] = bias
+
+    np.savez(npz_path, **arrays)
+    return layers
+
+
+class NumpyMLP:
+    """
+    Pure NumPy forward pass for the exported dense detectors.
+    Scores a whole batch of feature vectors as one matrix multiply per layer.
+    """
+
+    def __init__(self, layers):
+        self.layers = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32), activation)
+                       for kernel, bias, activation in layers]
+        self.input_dim = self.layers[0][0].shape[0]
+
+    @classmethod
+    def load(cls, npz_path):
+        with np.load(npz_path, allow_pickle=False) as data:
+            activations = [str(activation) for activation in data['activations']]
+            layers = [(data[f'kernel_{index}'], data[f'bias_{index}'], activation)
+                      for index, activation in enumerate(activations)]
+        return cls(layers)
+
+    @staticmethod
+    def _activate(values, activation):
+        if activation == 'relu':
+            np.maximum(values, 0, out=values)
+        elif activation == 'sigmoid':
+            # tanh form stays finite for large negative logits
+            np.multiply(values, 0.5, out=values)
+            np.tanh(values, out=values)
+            values += 1.0
+            values *= 0.5
+        elif activation == 'tanh':
+            np.tanh(values, out=values)
+        elif activation == 'softmax':
+            values -= values.max(axis=1, keepdims=True)
+            np.exp(values, out=values)
+            values /= values.sum(axis=1, keepdims=True)
+        return values
+
+    def predict(self, features):
+        """
+        Return the raw model outputs, shape (n_samples, units_of_last_layer)
+        """
+        values = np.asarray(features, dtype=np.float32)
+        if values.ndim == 1:
+            values = values.reshape(1, -1)
+        if values.shape[1] != self.input_dim:
+            raise ValueError(f"Expected {self.input_dim} features, got {values.shape[1]}")
+
+        for kernel, bias, activation in self.layers:
+            values = values @ kernel
+            values += bias
+            values = self._activate(values, activation)
+        return values
+
+    def predict_proba(self, features):
+        """
+        Probability of the positive class (REAL in the training scripts) for every row
+        """
+        outputs = self.predict(features)
+        return outputs[:, -1] if outputs.shape[1] > 1 else outputs[:, 0]
+
+
+def verify_against_keras(h5_path, npz_path, n_samples=1024, tolerance=1e-5):
+    """
+    Compare the NumPy forward pass with Keras on random standardized inputs
+    """
+    from tensorflow.keras.models import load_model
+
+    numpy_model = NumpyMLP.load(npz_path)
+    keras_model = load_model(h5_path, compile=False)
+
+    rng = np.random.default_rng(42)
+    features = rng.standard_normal((n_samples, numpy_model.input_dim)).astype(np.float32)
+
+    expected = keras_model.predict(features, verbose=0)
+    actual = numpy_model.predict(features)
+    max_error = float(np.max(np.abs(expected - actual)))
+    return max_error, max_error <= tolerance
+
+
+def benchmark(npz_path, batch_sizes=(1, 32, 1024), repeats=200):
+    """
+    Time model loading and batched scoring of the NumPy model
+    """
+    start = time.perf_counter()
+    model = NumpyMLP.load(npz_path)
+    print(f"Loaded {npz_path} in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        features = rng.standard_normal((batch_size, model.input_dim)).astype(np.float32)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model.predict_proba(features)
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"batch={batch_size:5d}: {elapsed * 1e6:9.1f} us/batch, {batch_size / elapsed:12.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Keras dense detectors to NumPy .npz weights")
+    parser.add_argument('h5_path', help="Keras .h5 model (e.g. ML/New/models/deepfake_detector.h5)")
+    parser.add_argument('npz_path', nargs='?', help="Output .npz path (defaults to the .h5 name)")
+    parser.add_argument('--verify', action='store_true', help="Check parity against Keras (needs TensorFlow)")
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    parser.add_argument('--benchmark', action='store_true', help="Time the NumPy forward pass")
+    args = parser.parse_args()
+
+    npz_path = args.npz_path or os.path.splitext(args.h5_path)[0] + '.npz'
+    layers = convert_h5_to_npz(args.h5_path, npz_path)
+    shapes = ' -> '.join(f"{kernel.shape[1]} ({activation})" for kernel, _, activation in layers)
+    print(f"Saved {npz_path}: {layers[0][0].shape[0]} inputs -> {shapes}")
+
+    if args.verify:
+        max_error, ok = verify_against_keras(args.h5_path, npz_path, tolerance=args.tolerance)
+        print(f"Max abs difference vs Keras: {max_error:.3e} ({'OK' if ok else 'MISMATCH'})")
+        if not ok:
+            sys.exit(1)
+
+    if args.benchmark:
+        benchmark(npz_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, f1_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from inference_pipeline import build_artifact, save_artifact
+
+# Candidate families and their search spaces (RF grid matches training_random.py)
+PARAM_GRIDS = {
+    'random_forest': {
+        'n_estimators': [50, 100, 200],
+        'max_depth': [None, 10, 20],
+        'min_samples_split': [2, 5],
+        'min_samples_leaf': [1, 2],
+    },
+    'xgboost': {
+        'n_estimators': [100, 200],
+        'max_depth': [3, 6],
+        'learning_rate': [0.05, 0.1, 0.3],
+    },
+    'svm': {
+        'kernel': ['rbf', 'linear'],
+        'C': [0.1, 1.0, 10.0],
+    },
+}
+
+
+def make_model(family, params, random_state=42):
+    """
+    Build an unfitted estimator; every model uses one thread, parallelism comes from the harness
+    """
+    if family == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(class_weight='balanced', random_state=random_state, n_jobs=1, **params)
+    if family == 'xgboost':
+        from xgboost import XGBClassifier
+        return XGBClassifier(random_state=random_state, n_jobs=1, **params)
+    if family == 'svm':
+        from sklearn.svm import SVC
+        return SVC(probability=True, random_state=random_state, **params)
+    raise ValueError(f"Unknown model family: {family}")
+
+
+def expand_grid(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+def prepare_cache(csv_path, cache_root, n_folds=5, test_size=0.2, random_state=42):
+    """
+    Split, scale and store every fold as .npy files once; later runs reuse them memory-mapped
+    """
+    with open(csv_path, 'rb') as csv_file:
+        digest = hashlib.sha1(csv_file.read()).hexdigest()[:16]
+    cache_dir = os.path.join(cache_root, f"{digest}_k{n_folds}_t{test_size}_s{random_state}")
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            return cache_dir, json.load(manifest_file)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    df = pd.read_csv(csv_path)
+    features = df.drop(columns=['LABEL', 'FILE_PATH'], errors='ignore')
+    label_encoder = LabelEncoder()
+    labels = label_encoder.fit_transform(df['LABEL'])
+    X = features.to_numpy(dtype=np.float64)
+
+    train_idx, test_idx = train_test_split(
+        np.arange(len(X)), test_size=test_size, random_state=random_state, stratify=labels)
+
+    def save_split(prefix, fit_idx, eval_idx):
+        scaler = StandardScaler().fit(X[fit_idx])
+        np.save(os.path.join(cache_dir, f'{prefix}_X_train.npy'), scaler.transform(X[fit_idx]))
+        np.save(os.path.join(cache_dir, f'{prefix}_y_train.npy'), labels[fit_idx])
+        np.save(os.path.join(cache_dir, f'{prefix}_X_eval.npy'), scaler.transform(X[eval_idx]))
+        np.save(os.path.join(cache_dir, f'{prefix}_y_eval.npy'), labels[eval_idx])
+        return scaler
+
+    # Holdout split for the final report, CV folds inside the training part for the search
+    holdout_scaler = save_split('holdout', train_idx, test_idx)
+    folds = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=random_state)
+    for fold, (fit_pos, eval_pos) in enumerate(folds.split(train_idx, labels[train_idx])):
+        save_split(f'fold{fold}', train_idx[fit_pos], train_idx[eval_pos])
+
+    joblib.dump(holdout_scaler, os.path.join(cache_dir, 'holdout_scaler.joblib'))
+    joblib.dump(label_encoder, os.path.join(cache_dir, 'label_encoder.joblib'))
+
+    manifest = {
+        'csv_path': os.path.abspath(csv_path),
+        'feature_names': features.columns.tolist(),
+        'classes': [str(label) for label in label_encoder.classes_],
+        'n_folds': n_folds,
+        'n_train': int(len(train_idx)),
+        'n_test': int(len(test_idx)),
+    }
+    with open(manifest_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return cache_dir, manifest
+
+
+def load_split(cache_dir, prefix):
+    return tuple(np.load(os.path.join(cache_dir, f'{prefix}_{name}.npy'), mmap_mode='r')
+                 for name in ('X_train', 'y_train', 'X_eval', 'y_eval'))
+
+
+def subsample_indices(y, n_resources, seed):
+    """
+    Sorted row indices of a stratified subsample of `n_resources` rows, the same for every candidate
+    of a fold. A prefix would follow the CSV order, which can leave out a class entirely.
+    """
+    if n_resources >= len(y):
+        return np.arange(len(y))
+    try:
+        indices, _ = train_test_split(np.arange(len(y)), train_size=n_resources, stratify=y, random_state=seed)
+    except ValueError:
+        # Too few rows of some class to stratify: a seeded shuffle still mixes the classes
+        indices = np.random.default_rng(seed).permutation(len(y))[:n_resources]
+    return np.sort(indices)
+
+
+def evaluate_fold(cache_dir, fold, family, params, n_resources):
+    """
+    Fit one configuration on (a stratified subsample of) one cached fold and return its F1 score
+    """
+    X_train, y_train, X_eval, y_eval = load_split(cache_dir, f'fold{fold}')
+    y_train = np.asarray(y_train)
+    rows = subsample_indices(y_train, n_resources, seed=fold)
+    model = make_model(family, params)
+    model.fit(np.asarray(X_train[rows]), y_train[rows])
+    return f1_score(y_eval, model.predict(np.asarray(X_eval)), average='macro')
+
+
+def search(cache_dir, manifest, family, candidates, parallel, strategy='halving', factor=3, min_resources=None):
+    """
+    Grid or successive-halving search over the cached CV folds.
+    Halving scores all configurations on few samples and keeps the best 1/factor each round.
+    """
+    n_folds = manifest['n_folds']
+    n_fold_train = manifest['n_train'] * (n_folds - 1) // n_folds
+    history = []
+
+    if strategy == 'grid':
+        rounds = [n_fold_train]
+    else:
+        n_rounds = max(1, math.ceil(math.log(len(candidates), factor)))
+        min_resources = min_resources or max(20, n_fold_train // factor ** (n_rounds - 1))
+        rounds = [min(n_fold_train, min_resources * factor ** i) for i in range(n_rounds)]
+        rounds[-1] = n_fold_train
+
+    survivors = list(candidates)
+    for round_index, n_resources in enumerate(rounds):
+        scores = parallel(
+            delayed(evaluate_fold)(cache_dir, fold, family, params, n_resources)
+            for params in survivors for fold in range(n_folds))
+        mean_scores = np.asarray(scores).reshape(len(survivors), n_folds).mean(axis=1)
+
+        ranked = sorted(zip(mean_scores.tolist(), range(len(survivors))), reverse=True)
+        history.append({
+            'round': round_index,
+            'n_resources': int(n_resources),
+            'n_candidates': len(survivors),
+            'scores': [{'params': survivors[i], 'f1_macro': score} for score, i in ranked],
+        })
+
+        if round_index < len(rounds) - 1:
+            keep = max(1, math.ceil(len(survivors) / factor))
+            survivors = [survivors[i] for _, i in ranked[:keep]]
+        else:
+            survivors = [survivors[ranked[0][1]]]
+
+    return survivors[0], history
+
+
+def train_final(cache_dir, manifest, family, params):
+    """
+    Refit the chosen configuration on the full training split and evaluate on the holdout
+    """
+    X_train, y_train, X_test, y_test = load_split(cache_dir, 'holdout')
+    model = make_model(family, params)
+
+    start = time.perf_counter()
+    model.fit(np.asarray(X_train), np.asarray(y_train))
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(np.asarray(X_test))
+    predict_seconds = time.perf_counter() - start
+
+    metrics = {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'f1_macro': f1_score(y_test, y_pred, average='macro'),
+        'classification_report': classification_report(
+            y_test, y_pred, target_names=manifest['classes'], output_dict=True, zero_division=0),
+        'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+    }
+    return model, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless parallel training and evaluation of the detectors")
+    parser.add_argument('csv_path', help="Feature CSV with LABEL and FILE_PATH columns")
+    parser.add_argument('--models', default='random_forest,xgboost,svm', help="Comma separated model families")
+    parser.add_argument('--search', choices=['halving', 'grid'], default='halving')
+    parser.add_argument('--factor', type=int, default=3, help="Successive-halving reduction factor")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--cache-dir', default=os.path.join('ML', 'New', 'cache'))
+    parser.add_argument('--output-dir', default=os.path.join('ML', 'New', 'models', 'trained'))
+    args = parser.parse_args()
+
+    families = [family.strip() for family in args.models.split(',') if family.strip()]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    run_start = time.perf_counter()
+    cache_dir, manifest = prepare_cache(args.csv_path, args.cache_dir, n_folds=args.folds)
+    prepare_seconds = time.perf_counter() - run_start
+    print(f"Using cached folds in {cache_dir}")
+
+    report = {'csv_path': manifest['csv_path'], 'search': args.search, 'prepare_seconds': prepare_seconds,
+              'models': {}}
+
+    with Parallel(n_jobs=args.n_jobs) as parallel:
+        # Searches fan out over (configuration, fold) pairs
+        chosen = {}
+        for family in families:
+            start = time.perf_counter()
+            candidates = expand_grid(PARAM_GRIDS[family])
+            best_params, history = search(cache_dir, manifest, family, candidates, parallel,
+                                          strategy=args.search, factor=args.factor)
+            chosen[family] = best_params
+            report['models'][family] = {
+                'best_params': best_params,
+                'n_candidates': len(candidates),
+                'search_seconds': time.perf_counter() - start,
+                'search_history': history,
+            }
+            print(f"{family}: best params {best_params}")
+
+        # Final refits of the winners run side by side
+        finals = parallel(delayed(train_final)(cache_dir, manifest, family, chosen[family]) for family in families)
+
+    scaler = joblib.load(os.path.join(cache_dir, 'holdout_scaler.joblib'))
+    label_encoder = joblib.load(os.path.join(cache_dir, 'label_encoder.joblib'))
+    for family, (model, metrics) in zip(families, finals):
+        artifact_path = os.path.join(args.output_dir, f'{family}.joblib')
+        save_artifact(build_artifact(model, scaler, label_encoder, manifest['feature_names']), artifact_path)
+        report['models'][family].update(metrics, artifact=artifact_path)
+        print(f"{family}: accuracy {metrics['accuracy']:.4f}, f1 {metrics['f1_macro']:.4f}, "
+              f"fit {metrics['fit_seconds']:.2f}s -> {artifact_path}")
+
+    report['total_seconds'] = time.perf_counter() - run_start
+    report_path = os.path.join(args.output_dir, 'training_report.json')
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2, default=float)
+    print(f"Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    main()
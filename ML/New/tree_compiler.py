@@ -0,0 +1,324 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+
+def _float32_floor(thresholds):
+    """
+    Largest float32 <= each float64 threshold, so `x32 <= t32` matches sklearn's `x32 <= t64`
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    rounded = thresholds.astype(np.float32)
+    too_high = rounded.astype(np.float64) > thresholds
+    rounded[too_high] = np.nextafter(rounded[too_high], np.float32(-np.inf))
+    return rounded
+
+
+class CompiledEnsemble:
+    """
+    Tree ensemble flattened into NumPy node arrays (feature, threshold, left, right, value).
+
+    Every tree is stored in one shared node table. Leaves point to themselves, so a batch
+    of rows walks all trees at once in `max_depth` vectorized steps.
+    """
+
+    ARRAY_FIELDS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'value', 'roots',
+                    'base_margin', 'classes')
+
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots,
+                 aggregation, transform, base_margin, classes, n_features, max_depth):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.missing_left = np.asarray(missing_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.aggregation = aggregation
+        self.transform = transform
+        self.base_margin = np.asarray(base_margin, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.n_features = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def save(self, path):
+        arrays = {field: getattr(self, field) for field in self.ARRAY_FIELDS}
+        meta = {
+            'aggregation': self.aggregation,
+            'transform': self.transform,
+            'n_features': self.n_features,
+            'max_depth': self.max_depth,
+        }
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            arrays = {field: data[field] for field in cls.ARRAY_FIELDS}
+        return cls(**arrays, **meta)
+
+    def _leaf_indices(self, features):
+        """
+        Walk every tree for every row; returns leaf node ids of shape (n_rows, n_trees)
+        """
+        nodes = np.broadcast_to(self.roots, (features.shape[0], self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            values = np.take_along_axis(features, self.feature[nodes], axis=1)
+            go_left = values <= self.threshold[nodes]
+            missing = np.isnan(values)
+            if missing.any():
+                go_left = np.where(missing, self.missing_left[nodes], go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def decision_function(self, features, chunk_size=4096):
+        """
+        Aggregated raw scores before the probability transform, shape (n_rows, n_outputs)
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        if features.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {features.shape[1]}")
+
+        scores = np.empty((features.shape[0], self.value.shape[1]), dtype=np.float64)
+        for start in range(0, features.shape[0], chunk_size):
+            leaves = self._leaf_indices(features[start:start + chunk_size])
+            leaf_values = self.value[leaves].astype(np.float64)  # (rows, trees, outputs)
+            if self.aggregation == 'mean':
+                scores[start:start + chunk_size] = leaf_values.mean(axis=1)
+            else:
+                scores[start:start + chunk_size] = leaf_values.sum(axis=1)
+        return scores + self.base_margin
+
+    def predict_proba(self, features):
+        scores = self.decision_function(features)
+        if self.transform == 'sigmoid':
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        if self.transform == 'softmax':
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            return scores / scores.sum(axis=1, keepdims=True)
+        return scores
+
+    def predict(self, features):
+        return self.classes[np.argmax(self.predict_proba(features), axis=1)]
+
+
+def compile_sklearn_forest(model):
+    """
+    Compile a fitted sklearn RandomForest/ExtraTrees (or a single DecisionTree) classifier
+    """
+    estimators = getattr(model, 'estimators_', [model])
+    n_classes = len(model.classes_)
+
+    features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.int32) + offset
+        is_leaf = tree.children_left == -1
+
+        # Leaves loop back onto themselves so extra traversal steps are no-ops
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+        rights.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(_float32_floor(np.where(is_leaf, 0.0, tree.threshold)))
+        missing.append(getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8)).astype(bool))
+
+        # Each tree votes with its normalized class distribution, as in predict_proba
+        leaf_proba = tree.value[:, 0, :].astype(np.float64)
+        normalizer = leaf_proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(leaf_proba / normalizer)
+
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledEnsemble(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        missing_left=np.concatenate(missing),
+        value=np.concatenate(values),
+        roots=roots,
+        aggregation='mean',
+        transform='none',
+        base_margin=np.zeros(n_classes),
+        classes=model.classes_,
+        n_features=model.n_features_in_,
+        max_depth=max_depth,
+    )
+
+
+def _parse_base_score(raw_value):
+    # XGBoost >= 2 stores base_score as a bracketed vector string
+    return [float(part) for part in str(raw_value).strip('[]').split(',') if part]
+
+
+def compile_xgboost(model):
+    """
+    Compile an XGBClassifier (or raw Booster) using its exact JSON model dump
+    """
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+    learner = json.loads(bytes(booster.save_raw(raw_format='json')))['learner']
+
+    gradient_booster = learner['gradient_booster']
+    if gradient_booster['name'] != 'gbtree':
+        raise ValueError(f"Only gbtree boosters are supported, got {gradient_booster['name']}")
+
+    objective = learner['objective']['name']
+    model_params = learner['learner_model_param']
+    n_outputs = max(int(model_params.get('num_class', '0')), 1)
+    base_score = np.resize(_parse_base_score(model_params['base_score']), n_outputs)
+
+    if objective.startswith('binary:logistic') or objective == 'reg:logistic':
+        transform = 'sigmoid'
+        base_margin = np.log(base_score / (1.0 - base_score))
+    elif objective == 'multi:softprob' or objective == 'multi:softmax':
+        transform = 'softmax'
+        base_margin = base_score
+    else:
+        transform = 'none'
+        base_margin = base_score
+
+    trees = gradient_booster['model']['trees']
+    tree_info = gradient_booster['model'].get('tree_info', [0] * len(trees))
+
+    features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for tree, output_index in zip(trees, tree_info):
+        left = np.asarray(tree['left_children'], dtype=np.int64)
+        right = np.asarray(tree['right_children'], dtype=np.int64)
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        node_ids = np.arange(len(left)) + offset
+        is_leaf = left == -1
+
+        lefts.append(np.where(is_leaf, node_ids, left + offset))
+        rights.append(np.where(is_leaf, node_ids, right + offset))
+        features.append(np.where(is_leaf, 0, np.asarray(tree['split_indices'])))
+
+        # XGBoost goes left on `x < t`; the largest float32 below t turns that into `x <= t'`
+        below = np.nextafter(conditions, np.float32(-np.inf))
+        thresholds.append(np.where(is_leaf, np.float32(0.0), below))
+        missing.append(np.asarray(tree['default_left'], dtype=bool))
+
+        # Leaf weights live in split_conditions; they only feed this tree's output group
+        leaf_values = np.zeros((len(left), n_outputs), dtype=np.float32)
+        leaf_values[is_leaf, output_index] = conditions[is_leaf]
+        values.append(leaf_values)
+
+        # Depth of the deepest leaf, found level by level from the root
+        depth, frontier = 0, np.array([0])
+        while True:
+            frontier = frontier[left[frontier] != -1]
+            if frontier.size == 0:
+                break
+            frontier = np.concatenate([left[frontier], right[frontier]])
+            depth += 1
+
+        roots.append(offset)
+        offset += len(left)
+        max_depth = max(max_depth, depth)
+
+    classes = getattr(model, 'classes_', np.arange(max(n_outputs, 2)))
+    return CompiledEnsemble(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        missing_left=np.concatenate(missing),
+        value=np.concatenate(values),
+        roots=roots,
+        aggregation='sum',
+        transform=transform,
+        base_margin=base_margin,
+        classes=classes,
+        n_features=int(model_params['num_feature']),
+        max_depth=max_depth,
+    )
+
+
+def compile_model(model):
+    """
+    Compile any supported tree model into a CompiledEnsemble
+    """
+    if hasattr(model, 'get_booster') or type(model).__name__ == 'Booster':
+        return compile_xgboost(model)
+    if hasattr(model, 'tree_') or (hasattr(model, 'estimators_') and hasattr(model.estimators_[0], 'tree_')):
+        return compile_sklearn_forest(model)
+    raise ValueError(f"Unsupported model type: {type(model).__name__}")
+
+
+def verify_against_model(model, compiled, n_samples=2048, tolerance=1e-5):
+    """
+    Compare compiled probabilities with the original model on random inputs
+    """
+    rng = np.random.default_rng(42)
+    features = rng.standard_normal((n_samples, compiled.n_features)).astype(np.float32)
+
+    expected = model.predict_proba(features)
+    actual = compiled.predict_proba(features)
+    max_error = float(np.max(np.abs(expected - actual)))
+    agreement = float(np.mean(np.argmax(expected, axis=1) == np.argmax(actual, axis=1)))
+    return max_error, agreement, max_error <= tolerance
+
+
+def benchmark(model, compiled, batch_sizes=(1, 64, 1024), repeats=50):
+    """
+    Compare scoring latency of the original model and the compiled arrays
+    """
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        features = rng.standard_normal((batch_size, compiled.n_features)).astype(np.float32)
+        timings = []
+        for scorer in (model.predict_proba, compiled.predict_proba):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                scorer(features)
+            timings.append((time.perf_counter() - start) / repeats)
+        print(f"batch={batch_size:5d}: original {timings[0] * 1e3:8.3f} ms, "
+              f"compiled {timings[1] * 1e3:8.3f} ms ({timings[0] / timings[1]:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile RF/XGBoost pickles into NumPy node arrays")
+    parser.add_argument('model_path', help="Pickled model (e.g. ML/New/models/xgb_model.pkl)")
+    parser.add_argument('output_path', nargs='?', help="Output .npz path (defaults to <model>_compiled.npz)")
+    parser.add_argument('--verify', action='store_true', help="Check prediction parity against the original model")
+    parser.add_argument('--tolerance', type=float, default=1e-5)
+    parser.add_argument('--benchmark', action='store_true', help="Time original vs compiled scoring")
+    args = parser.parse_args()
+
+    import joblib
+
+    model = joblib.load(args.model_path)
+    compiled = compile_model(model)
+    output_path = args.output_path or os.path.splitext(args.model_path)[0] + '_compiled.npz'
+    compiled.save(output_path)
+    print(f"Saved {output_path}: {compiled.n_trees} trees, {len(compiled.feature)} nodes, depth {compiled.max_depth}")
+
+    if args.verify:
+        max_error, agreement, ok = verify_against_model(model, compiled, tolerance=args.tolerance)
+        print(f"Max abs probability difference: {max_error:.3e}, class agreement: {agreement:.2%} "
+              f"({'OK' if ok else 'MISMATCH'})")
+        if not ok:
+            sys.exit(1)
+
+    if args.benchmark:
+        benchmark(model, compiled)
+
+
+if __name__ == "__main__":
+    main()
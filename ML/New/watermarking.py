@@ -29,27 +29,15 @@ def embed_watermark(audio_file, unique_hex_code, weight=0.01):
         frames = wav.readframes(params.nframes)
         samples = np.frombuffer(frames, dtype=np.int16)
 
-    # Convert the unique hex code to a binary string
-    watermark_bin = bin(int(unique_hex_code, 16))[2:].zfill(len(unique_hex_code) * 4)  # 4 bits per hex digit
-
-    # Embed the watermark into the least significant bit of the samples
-    watermark_index = 0
-    for i in range(len(samples)):
-        if watermark_index < len(watermark_bin):
-            # Extract watermark bit
-            bit = int(watermark_bin[watermark_index])
-
-            # Modify the least significant bit (LSB)
-            samples[i] = (samples[i] & 0xFFFE) | bit  # Set LSB to watermark bit
+    # Apply a small weight first, so the payload bits set below are not disturbed by it
+    samples = np.clip(np.round(samples.astype(np.float64) * (1 + weight)), -32768, 32767).astype(np.int16)
 
-            # Increment watermark bit index
-            watermark_index += 1
-
-        # Apply a small weight to minimize the impact on quality
-        samples[i] += int(samples[i] * weight)
+    # Convert the unique hex code to a binary string, then to an array of 0/1 bits
+    watermark_bin = bin(int(unique_hex_code, 16))[2:].zfill(len(unique_hex_code) * 4)  # 4 bits per hex digit
+    watermark_bits = np.frombuffer(watermark_bin.encode('ascii'), dtype=np.uint8) - ord('0')
 
-    # Ensure the samples are within the valid range for audio data
-    samples = np.clip(samples, -32768, 32767)
+    # Embed the watermark into the least significant bits of the leading samples
+    samples[:len(watermark_bits)] = (samples[:len(watermark_bits)] & ~np.int16(1)) | watermark_bits
 
     # Write the watermarked audio to a new file
     return samples, params
@@ -115,13 +103,14 @@ def process_csv(csv_file, real_folder, fake_folder, output_folder):
     df.to_csv(csv_file, index=False)
     print(f"CSV updated with watermark details. Saved to {csv_file}")
 
-# Example usage of the process_csv function
-real_folder = 'ML/New/Data/REAL'  # Folder containing real audio files
-fake_folder = 'ML/New/Data/FAKE'  # Folder containing fake audio files
-output_folder = 'watermarked_files'  # Folder to store the watermarked files
+if __name__ == '__main__':
+    # Example usage of the process_csv function
+    real_folder = 'ML/New/Data/REAL'  # Folder containing real audio files
+    fake_folder = 'ML/New/Data/FAKE'  # Folder containing fake audio files
+    output_folder = 'watermarked_files'  # Folder to store the watermarked files
 
-# Ensure the output folder exists
-os.makedirs(output_folder, exist_ok=True)
+    # Ensure the output folder exists
+    os.makedirs(output_folder, exist_ok=True)
 
-# Replace with your actual CSV file path
-process_csv('ML/New/updated_deepfake_audio_data.csv', real_folder, fake_folder, output_folder)
+    # Replace with your actual CSV file path
+    process_csv('ML/New/updated_deepfake_audio_data.csv', real_folder, fake_folder, output_folder)
@@ -2,7 +2,7 @@ import os
 import librosa
 import joblib
 import numpy as np
-from sklearn.preprocessing import StandardScaler
+import pandas as pd
 
 def extract_audio_features(audio_path):
     """
@@ -45,8 +45,9 @@ def predict_audio_class(audio_file_path):
     """
     Predict whether an audio file is REAL or FAKE based on its features.
     """
-    # Load the trained SVM model
+    # Load the trained SVM model and the scaler fitted on its training data
     model = joblib.load("svm_model.joblib")
+    scaler = joblib.load("scaler.joblib")
     
     # Extract features from the given audio file
     features = extract_audio_features(audio_file_path)
@@ -58,9 +59,8 @@ def predict_audio_class(audio_file_path):
     # Convert features to DataFrame for consistency
     features_df = pd.DataFrame([features])
     
-    # Scale the features using StandardScaler
-    scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(features_df)
+    # Scale with the persisted training scaler (fitting on one sample zeroes every feature)
+    features_scaled = scaler.transform(features_df)
     
     # Make prediction using the trained SVM model
     prediction = model.predict(features_scaled)
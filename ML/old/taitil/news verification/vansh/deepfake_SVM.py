@@ -89,9 +89,9 @@ def train_and_evaluate_models(X_train, X_test, y_train, y_test, feature_names):
     
     return models, results
 
-def save_models(models, path='models/'):
+def save_models(models, path='models/', scaler=None):
     """
-    Save the trained models to the specified directory.
+    Save the trained models (and the scaler they were trained with) to the specified directory.
     """
     import os
     if not os.path.exists(path):
@@ -102,6 +102,12 @@ def save_models(models, path='models/'):
         joblib.dump(model, model_path)
         print(f"Model {name} saved to {model_path}")
 
+    # Inference must reuse the training scaler instead of refitting on new samples
+    if scaler is not None:
+        scaler_path = os.path.join(path, 'scaler.joblib')
+        joblib.dump(scaler, scaler_path)
+        print(f"Scaler saved to {scaler_path}")
+
 def load_model(model_name, path='models/'):
     """
     Load a saved model from the specified directory.
@@ -139,7 +145,7 @@ if __name__ == "__main__":
     models, results = train_and_evaluate_models(X_train, X_test, y_train, y_test, feature_names)
 
     # Save models
-    save_models(models)
+    save_models(models, scaler=scaler)
 
     # Example: Load a saved model (for testing)
     loaded_model = load_model("Random Forest")  # Example for loading the Random Forest model
@@ -2,8 +2,7 @@ import os
 import numpy as np
 import pandas as pd
 import librosa
-import joblib  # For loading the SVM model
-from sklearn.preprocessing import StandardScaler  # Import StandardScaler
+import joblib  # For loading the SVM model and its fitted scaler
 
 def extract_audio_features(audio_path):
     """
@@ -45,7 +44,7 @@ def extract_audio_features(audio_path):
         
     return features
 
-def predict_audio_class(model, audio_path):
+def predict_audio_class(model, scaler, audio_path):
     """
     Extract audio features from the given audio file and predict its class (REAL/FAKE)
     """
@@ -58,9 +57,8 @@ def predict_audio_class(model, audio_path):
     # Convert features to DataFrame for consistency
     df = pd.DataFrame([features])
     
-    # Scale the features using StandardScaler
-    scaler = StandardScaler()  # Initialize StandardScaler
-    features_scaled = scaler.fit_transform(df)  # Fitting and transforming the features
+    # Scale with the scaler fitted on the training set (fitting on one sample zeroes every feature)
+    features_scaled = scaler.transform(df)
     
     # Make prediction using the trained SVM model
     prediction = model.predict(features_scaled)
@@ -74,9 +72,10 @@ def predict_audio_class(model, audio_path):
 def main():
     # Load the trained SVM model using joblib
     try:
-        model = joblib.load("models\SVM_model.joblib")
+        model = joblib.load(os.path.join("models", "SVM_model.joblib"))
+        scaler = joblib.load(os.path.join("models", "scaler.joblib"))
     except Exception as e:
-        print(f"Error loading the SVM model: {e}")
+        print(f"Error loading the SVM model or scaler: {e}")
         return
     
     # Ask the user for the path to the audio file
@@ -88,7 +87,7 @@ def main():
         return
     
     # Predict the class of the input audio
-    predict_audio_class(model, audio_file_path)
+    predict_audio_class(model, scaler, audio_file_path)
 
 if __name__ == "__main__":
     main()
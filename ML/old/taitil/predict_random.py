@@ -2,11 +2,6 @@ import numpy as np
 import librosa
 import joblib
 
-# Load the saved model, scaler, and label encoder
-rf_model = joblib.load('ML/taitil/Models/Random Forest/rf_model.pkl')
-scaler = joblib.load('ML/taitil/Models/Random Forest/scaler.pkl')
-label_encoder = joblib.load('ML/taitil/Models/Random Forest/label_encoder.pkl')
-
 # Function to extract features from an audio file
 def extract_features(audio_path):
     y, sr = librosa.load(audio_path, sr=None)
@@ -40,7 +35,7 @@ def extract_features(audio_path):
     return features
 
 # Predict whether the audio file is real or fake
-def predict_audio(audio_path):
+def predict_audio(audio_path, rf_model, scaler, label_encoder):
     # Extract features from the provided audio file
     features = extract_features(audio_path).reshape(1, -1)
     
@@ -55,8 +50,16 @@ def predict_audio(audio_path):
     
     return label[0]  # Returns either 'REAL' or 'FAKE'
 
-# Example usage
-audio_file = input("Enter the path to the audio file: ")
-prediction = predict_audio(audio_file)
+def main():
+    # Load the saved model, scaler, and label encoder
+    rf_model = joblib.load('ML/taitil/Models/Random Forest/rf_model.pkl')
+    scaler = joblib.load('ML/taitil/Models/Random Forest/scaler.pkl')
+    label_encoder = joblib.load('ML/taitil/Models/Random Forest/label_encoder.pkl')
+
+    audio_file = input("Enter the path to the audio file: ")
+    prediction = predict_audio(audio_file, rf_model, scaler, label_encoder)
+
+    print(f"The audio is predicted to be: {prediction}")
 
-print(f"The audio is predicted to be: {prediction}")
+if __name__ == "__main__":
+    main()
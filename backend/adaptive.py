@@ -0,0 +1,138 @@
+"""
+Early-exit window scheduling for long clips.
+
+Fixed windows are visited in coarse-to-fine (bit-reversed) order, so every batch
+spreads over the whole clip instead of crawling from the start. After each
+batch the mean fake probability gets a normal-approximation confidence interval
+(with finite-population correction, since windows are drawn without
+replacement). Scoring stops as soon as the interval clears the decision
+threshold. Windows whose own score is ambiguous are refined first with
+half-window shifted neighbours.
+"""
+from collections import deque
+from statistics import NormalDist
+
+import numpy as np
+
+
+def coarse_to_fine_order(n_windows):
+    """Window indices in van der Corput order: 0, n/2, n/4, 3n/4, ..."""
+    if n_windows <= 0:
+        return []
+    order, seen = [], set()
+    bits = max(1, int(np.ceil(np.log2(n_windows))))
+    for position in range(1 << bits):
+        reversed_bits = int(format(position, f'0{bits}b')[::-1], 2)
+        index = reversed_bits * n_windows >> bits
+        if index not in seen:
+            seen.add(index)
+            order.append(index)
+    return order
+
+
+def fake_probability(scores):
+    """Probability of the 'fake' class from a pipeline-style score list."""
+    by_label = {item['label']: item['score'] for item in scores}
+    if 'fake' in by_label:
+        return by_label['fake']
+    return 1.0 - by_label.get('real', 0.0)
+
+
+def tile_starts(n_samples, window):
+    """Non-overlapping window offsets, plus one aligned to the end so the tail of the clip is scored too."""
+    starts = np.arange(0, max(1, n_samples - window + 1), window)
+    if n_samples > window and starts[-1] != n_samples - window:
+        starts = np.append(starts, n_samples - window)
+    return starts
+
+
+def _interval(values, population, z, sampled=None):
+    # `sampled`: how many of the `population` tiles are among `values` (refinement windows are not tiles)
+    values = np.asarray(values, dtype=np.float64)
+    mean = float(values.mean())
+    if len(values) < 2:
+        return mean, 0.0, 1.0
+    sampled = min(len(values) if sampled is None else sampled, population)
+    correction = np.sqrt(max(0.0, (population - sampled) / max(population - 1, 1)))
+    half_width = z * float(values.std(ddof=1)) / np.sqrt(len(values)) * correction
+    return mean, mean - half_width, mean + half_width
+
+
+def adaptive_classify(score_batch, waveform, sr, window_seconds=4.0, batch_size=4, confidence=0.95,
+                      min_windows=3, max_windows=None, ambiguity=0.15, threshold=0.5, window_starts=None):
+    """
+    Score a long clip window by window until the verdict is statistically settled.
+
+    Args:
+        score_batch: callable(list of waveforms) -> (fake probabilities, (n, dim) embeddings)
+        waveform (np.ndarray): mono waveform at `sr`
+        window_seconds (float): window length; windows tile the clip without overlap, the last one end-aligned
+        confidence (float): two-sided confidence level required to stop early
+        min_windows (int): never stop before this many windows were scored
+        ambiguity (float): windows within this distance of `threshold` get refined
+        window_starts (np.ndarray): optional subset of tile offsets to consider (e.g. speech only)
+
+    Returns:
+        dict: fake_probability, label, windows_evaluated, windows_total, stopped_early,
+        window_scores and the mean window embedding
+    """
+    waveform = np.asarray(waveform, dtype=np.float32)
+    window = max(1, int(window_seconds * sr))
+    half = window // 2
+    if window_starts is None or not len(window_starts):
+        window_starts = tile_starts(len(waveform), window)
+    tiles = [int(start) for start in window_starts]
+    tile_set = set(tiles)
+    max_windows = max_windows or 2 * len(tiles)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    pending = deque(tiles[index] for index in coarse_to_fine_order(len(tiles)))
+    refinements = deque()
+    visited = set()
+    starts, probabilities, embeddings = [], [], []
+    stopped_early = False
+
+    while (refinements or pending) and len(starts) < max_windows:
+        batch = []
+        while len(batch) < batch_size and (refinements or pending):
+            start = (refinements or pending).popleft()
+            if start not in visited:
+                visited.add(start)
+                batch.append(start)
+        if not batch:
+            continue
+
+        batch_probabilities, batch_embeddings = score_batch([waveform[start:start + window] for start in batch])
+        for start, probability, embedding in zip(batch, batch_probabilities, batch_embeddings):
+            starts.append(start)
+            probabilities.append(float(probability))
+            embeddings.append(embedding)
+            # Ambiguous tiles get their half-shifted neighbours scored next
+            if start in tile_set and abs(probability - threshold) < ambiguity:
+                for neighbour in (start - half, start + half):
+                    if 0 <= neighbour <= len(waveform) - window and neighbour not in visited:
+                        refinements.append(neighbour)
+
+        if len(starts) >= min_windows:
+            _, lower, upper = _interval(probabilities, len(tiles), z, sampled=len(tile_set.intersection(starts)))
+            if lower > threshold or upper < threshold:
+                stopped_early = not tile_set <= visited
+                break
+
+    mean_embedding = np.mean(embeddings, axis=0)
+    mean_embedding /= max(float(np.linalg.norm(mean_embedding)), 1e-12)
+    fake = float(np.mean(probabilities))
+    order = np.argsort(starts)
+    return {
+        'fake_probability': fake,
+        'label': 'fake' if fake >= threshold else 'real',
+        'windows_evaluated': len(starts),
+        'windows_total': len(tiles),
+        'stopped_early': stopped_early,
+        'window_scores': [
+            {'start': round(starts[i] / sr, 3), 'end': round(min(starts[i] + window, len(waveform)) / sr, 3),
+             'fake_probability': round(probabilities[i], 6)}
+            for i in order
+        ],
+        'embedding': mean_embedding.astype(np.float32),
+    }
@@ -0,0 +1,158 @@
+"""
+Admission control for expensive analysis requests.
+
+Requests are sorted into priority lanes by clip duration (short interactive clips
+vs long batch clips). Each lane has a fixed number of execution slots, a bounded
+wait queue and a budget of outstanding estimated work. Work is estimated as
+audio duration times a realtime factor learned from finished requests. A request
+that would overflow its lane, or a user that already has too many requests in
+flight, is rejected up front with a Retry-After hint instead of queueing until
+the worker times out.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries the Retry-After hint."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+@dataclass
+class Lane:
+    name: str
+    slots: int
+    max_queue: int
+    max_backlog_seconds: float
+    running: int = 0
+    waiting: int = 0
+    backlog_seconds: float = 0.0
+    condition: threading.Condition = field(default_factory=threading.Condition)
+
+
+@dataclass
+class Ticket:
+    lane: Lane
+    user_key: str
+    duration: float
+    work_seconds: float
+    started: float
+
+
+class AdmissionController:
+    def __init__(self, interactive_max_duration=30.0, interactive_slots=2, batch_slots=1,
+                 interactive_max_queue=8, batch_max_queue=4, interactive_max_backlog=60.0,
+                 batch_max_backlog=300.0, max_wait_seconds=10.0, per_user_limit=2,
+                 realtime_factor=0.1, overhead_seconds=0.2):
+        self.interactive_max_duration = interactive_max_duration
+        self.max_wait_seconds = max_wait_seconds
+        self.per_user_limit = per_user_limit
+        self.realtime_factor = realtime_factor
+        self.overhead_seconds = overhead_seconds
+        self.lanes = {
+            'interactive': Lane('interactive', interactive_slots, interactive_max_queue, interactive_max_backlog),
+            'batch': Lane('batch', batch_slots, batch_max_queue, batch_max_backlog),
+        }
+        self._user_inflight = {}
+        self._lock = threading.Lock()
+
+    def estimate_work(self, duration):
+        """Estimated processing seconds for a clip of `duration` seconds."""
+        return self.overhead_seconds + duration * self.realtime_factor
+
+    def lane_for(self, duration):
+        return self.lanes['interactive' if duration <= self.interactive_max_duration else 'batch']
+
+    def acquire(self, user_key, duration):
+        """
+        Admit a request or raise AdmissionRejected.
+
+        Args:
+            user_key (str): per-user (or per-client) concurrency key
+            duration (float): clip duration in seconds, read from the container header
+
+        Returns:
+            Ticket: pass to release() when the request finishes
+        """
+        lane = self.lane_for(duration)
+        work = self.estimate_work(duration)
+
+        with self._lock:
+            if self._user_inflight.get(user_key, 0) >= self.per_user_limit:
+                raise AdmissionRejected('user_concurrency_limit', self.estimate_work(duration))
+            self._user_inflight[user_key] = self._user_inflight.get(user_key, 0) + 1
+
+        try:
+            with lane.condition:
+                # Shed load before doing any work when the lane is already saturated
+                expected_wait = (lane.backlog_seconds + work) / lane.slots
+                # An idle lane always admits, or clips longer than the budget could never run
+                idle = lane.running == 0 and lane.waiting == 0
+                if not idle and lane.backlog_seconds + work > lane.max_backlog_seconds:
+                    raise AdmissionRejected('work_backlog_full', expected_wait)
+                if lane.running >= lane.slots and lane.waiting >= lane.max_queue:
+                    raise AdmissionRejected('queue_full', expected_wait)
+
+                lane.backlog_seconds += work
+                lane.waiting += 1
+                deadline = time.monotonic() + self.max_wait_seconds
+                try:
+                    while lane.running >= lane.slots:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            lane.backlog_seconds = max(0.0, lane.backlog_seconds - work)
+                            raise AdmissionRejected('queue_timeout', expected_wait)
+                        lane.condition.wait(remaining)
+                finally:
+                    lane.waiting -= 1
+                lane.running += 1
+        except AdmissionRejected:
+            self._release_user(user_key)
+            raise
+
+        return Ticket(lane, user_key, duration, work, time.monotonic())
+
+    def release(self, ticket):
+        """Free the slot and fold the observed speed into the realtime factor."""
+        elapsed = time.monotonic() - ticket.started
+        lane = ticket.lane
+        with lane.condition:
+            lane.running -= 1
+            lane.backlog_seconds = max(0.0, lane.backlog_seconds - ticket.work_seconds)
+            if lane.running == 0 and lane.waiting == 0:
+                lane.backlog_seconds = 0.0      # drop floating-point residue of out-of-order releases
+            lane.condition.notify()
+        self._release_user(ticket.user_key)
+
+        if ticket.duration > 1.0:
+            observed = max(0.0, elapsed - self.overhead_seconds) / ticket.duration
+            with self._lock:
+                self.realtime_factor = 0.9 * self.realtime_factor + 0.1 * observed
+
+    def _release_user(self, user_key):
+        with self._lock:
+            remaining = self._user_inflight.get(user_key, 1) - 1
+            if remaining > 0:
+                self._user_inflight[user_key] = remaining
+            else:
+                self._user_inflight.pop(user_key, None)
+
+    def snapshot(self):
+        """Current lane state, for health/metrics endpoints."""
+        return {
+            'realtime_factor': round(self.realtime_factor, 4),
+            'lanes': {
+                name: {
+                    'running': lane.running,
+                    'waiting': lane.waiting,
+                    'backlog_seconds': round(lane.backlog_seconds, 2),
+                    'slots': lane.slots,
+                } for name, lane in self.lanes.items()
+            }
+        }
@@ -1,23 +1,55 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import os
+import sys
+
+# Tuned thread settings must be exported before numpy/torch load their thread pools
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from runtime_config import apply_thread_env, configure_torch, load_runtime_config
+RUNTIME_CONFIG = load_runtime_config()
+apply_thread_env(RUNTIME_CONFIG)
+
+from flask import Flask, request, jsonify, send_file, send_from_directory, g
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from pymongo import MongoClient
 from gridfs import GridFS
 from bson import ObjectId
-import os
 import csv
 import qrcode
 import io
 import datetime
-import smtplib
 import secrets
-from email.message import EmailMessage
+import subprocess
+import threading
+import time
+import atexit
+from functools import wraps
+from contextlib import nullcontext
+from urllib.parse import quote
 import librosa
 from transformers import pipeline
 
+# Sibling backend modules (path set above) resolve for both `python backend/app.py` and `gunicorn backend.app:app`
+from fingerprint import FINGERPRINT_SAMPLE_RATE, FingerprintIndex, compute_hashes
+from inference import classify_waveforms
+from embedding_index import EmbeddingIndex
+from admission import AdmissionController, AdmissionRejected
+from audio_probe import ProbeError, probe_stream
+from vad import speech_windows, trim_silence
+from adaptive import adaptive_classify, fake_probability
+from model_server import ModelClient, authkey_from_env
+from profiling import SamplingProfiler
+from write_behind import WriteBehindBuffer
+from outbox import EmailOutbox, SMTPConnection
+from reports import ReportCache, get_report, get_report_path
+from canonical import CANONICAL_SAMPLE_RATE, load_waveform, store_canonical, transcode
+from tiered_storage import TieredStorage
+from peaks import build_pyramid, select_peaks, store_pyramid
+import watermark
+import spread_spectrum
+
 # Load environment variables
 load_dotenv()
 
@@ -37,30 +69,194 @@ CSV_FILE_PATH = os.getenv(
     os.path.join(os.getcwd(), "ML", "New", "updated_deepfake_audio_data_with_tampered.csv")
 )
 QR_IMAGES_FOLDER = os.path.join(app.root_path, 'public', 'QR_images')  # Adjusted path
+REPORTS_FOLDER = os.getenv('REPORTS_FOLDER', os.path.join(app.root_path, 'reports'))
+REPORT_CACHE_ITEMS = int(os.getenv('REPORT_CACHE_ITEMS', '64'))
+REPORT_RENDER_WORKERS = int(os.getenv('REPORT_RENDER_WORKERS', '0')) or None
+REPORT_BATCH_MAX = int(os.getenv('REPORT_BATCH_MAX', '500'))
+PEAK_BITS = int(os.getenv('PEAK_BITS', '8'))
+PEAK_MAX_WIDTH = int(os.getenv('PEAK_MAX_WIDTH', '8192'))
+RESCORE_WORKERS = int(os.getenv('RESCORE_WORKERS', '0')) or None
+RESCORE_BATCH_SIZE = int(os.getenv('RESCORE_BATCH_SIZE', '8'))
+# Spread-spectrum watermark detection on upload runs only when a key is configured
+WATERMARK_KEY = os.getenv('WATERMARK_KEY')
+FINGERPRINT_INDEX_PATH = os.getenv(
+    'FINGERPRINT_INDEX_PATH',
+    os.path.join(os.getcwd(), "ML", "New", "fingerprints.npz")
+)
+FINGERPRINT_SAVE_INTERVAL = int(os.getenv('FINGERPRINT_SAVE_INTERVAL', '30'))
+KNOWN_CLIPS_INDEX_PATH = os.getenv(
+    'KNOWN_CLIPS_INDEX_PATH',
+    os.path.join(os.getcwd(), "ML", "New", "known_clips.npz")
+)
+KNOWN_CLIPS_NEIGHBORS = int(os.getenv('KNOWN_CLIPS_NEIGHBORS', '5'))
+KNOWN_CLIPS_IVF_THRESHOLD = int(os.getenv('KNOWN_CLIPS_IVF_THRESHOLD', '50000'))
+KNOWN_FAKE_SIMILARITY = float(os.getenv('KNOWN_FAKE_SIMILARITY', '0.97'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# Uploads longer than MAX_AUDIO_SECONDS are refused; analysis decodes at most ANALYZE_MAX_SECONDS
+MAX_AUDIO_SECONDS = float(os.getenv('MAX_AUDIO_SECONDS', '1800'))
+ANALYZE_MAX_SECONDS = float(os.getenv('ANALYZE_MAX_SECONDS', '300'))
+# Silence is trimmed before inference unless less than VAD_MIN_SPEECH_SECONDS of speech remains
+VAD_ENABLED = os.getenv('VAD_ENABLED', '1') == '1'
+VAD_MIN_SPEECH_SECONDS = float(os.getenv('VAD_MIN_SPEECH_SECONDS', '0.5'))
+# ?mode=adaptive scores windows coarse-to-fine and stops once the verdict is settled
+ADAPTIVE_WINDOW_SECONDS = float(os.getenv('ADAPTIVE_WINDOW_SECONDS', '4'))
+ADAPTIVE_BATCH_SIZE = int(os.getenv('ADAPTIVE_BATCH_SIZE', RUNTIME_CONFIG.get('batch_size', 4)))
+ADAPTIVE_CONFIDENCE = float(os.getenv('ADAPTIVE_CONFIDENCE', '0.95'))
+ADAPTIVE_MIN_WINDOWS = int(os.getenv('ADAPTIVE_MIN_WINDOWS', '3'))
+
+# Admission control for the analyze path (per worker process)
+ADMISSION = AdmissionController(
+    interactive_max_duration=float(os.getenv('ADMISSION_INTERACTIVE_MAX_SECONDS', '30')),
+    interactive_slots=int(os.getenv('ADMISSION_INTERACTIVE_SLOTS', '2')),
+    batch_slots=int(os.getenv('ADMISSION_BATCH_SLOTS', '1')),
+    interactive_max_queue=int(os.getenv('ADMISSION_INTERACTIVE_MAX_QUEUE', '8')),
+    batch_max_queue=int(os.getenv('ADMISSION_BATCH_MAX_QUEUE', '4')),
+    interactive_max_backlog=float(os.getenv('ADMISSION_INTERACTIVE_MAX_BACKLOG', '60')),
+    batch_max_backlog=float(os.getenv('ADMISSION_BATCH_MAX_BACKLOG', '300')),
+    max_wait_seconds=float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '10')),
+    per_user_limit=int(os.getenv('ADMISSION_PER_USER_LIMIT', '2')),
+    realtime_factor=float(os.getenv('ADMISSION_REALTIME_FACTOR', '0.1'))
+)
+
+# Opt-in request profiling; nothing is hooked in unless PROFILING_ENABLED=1
+PROFILER = SamplingProfiler(
+    interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000,
+    window_seconds=int(os.getenv('PROFILE_WINDOW_SECONDS', '300')),
+    max_windows=int(os.getenv('PROFILE_MAX_WINDOWS', '12')),
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    trace_memory=os.getenv('PROFILE_TRACEMALLOC', '0') == '1'
+) if os.getenv('PROFILING_ENABLED', '0') == '1' else None
 
 # Ensure generated asset folders exist
 os.makedirs(QR_IMAGES_FOLDER, exist_ok=True)
+REPORT_CACHE = ReportCache(REPORTS_FOLDER, max_items=REPORT_CACHE_ITEMS)
 
 # Establish MongoDB connection
 client = MongoClient(MONGODB_URI)
 db = client[MONGODB_DB_NAME]
-fs = GridFS(db, collection=MONGODB_AUDIO_COLLECTION_NAME)
+# GridFS is the hot tier; old or rarely read files are offloaded to a compressed local store
+# and transparently promoted again when read, behind the same put/get interface
+fs = TieredStorage(
+    GridFS(db, collection=MONGODB_AUDIO_COLLECTION_NAME),
+    db,
+    MONGODB_AUDIO_COLLECTION_NAME,
+    cold_dir=os.getenv('COLD_STORAGE_DIR', os.path.join(app.root_path, 'cold_storage')),
+    demote_after_days=float(os.getenv('STORAGE_DEMOTE_AFTER_DAYS', '30')),
+    idle_days=float(os.getenv('STORAGE_IDLE_DAYS', '7')),
+    hot_min_reads=int(os.getenv('STORAGE_HOT_MIN_READS', '3'))
+)
+audio_files_index = db[f"{MONGODB_AUDIO_COLLECTION_NAME}.files"]
+
+# Watermark payloads resolve through an indexed provenance table instead of the CSV
+try:
+    watermark.sync_from_csv(db.provenance, CSV_FILE_PATH)
+except Exception as provenance_error:
+    print(f"Error loading provenance table: {provenance_error}")
+
+# Feedback and scan records are inserted in the background in batches
+WRITE_BEHIND = WriteBehindBuffer(
+    db,
+    spool_path=os.getenv('WRITE_BEHIND_SPOOL', os.path.join(app.root_path, 'spool', 'write_behind.jsonl')),
+    max_batch=int(os.getenv('WRITE_BEHIND_MAX_BATCH', '500')),
+    flush_interval=float(os.getenv('WRITE_BEHIND_FLUSH_SECONDS', '1.0')),
+    write_concern=os.getenv('WRITE_BEHIND_W', '1'),
+    journal=os.getenv('WRITE_BEHIND_JOURNAL', '0') == '1',
+    fsync=os.getenv('WRITE_BEHIND_FSYNC', 'always')
+)
+atexit.register(WRITE_BEHIND.close)
+
+# Outgoing email is queued in MongoDB and sent by a background sender over a reused SMTP session
+EMAIL_OUTBOX = EmailOutbox(
+    db.email_outbox,
+    SMTPConnection(
+        host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+        port=int(os.getenv('SMTP_PORT', '465')),
+        use_ssl=os.getenv('SMTP_SSL', '1') == '1',
+        starttls=os.getenv('SMTP_STARTTLS', '0') == '1',
+        username=os.getenv('EMAIL_SENDER'),
+        password=os.getenv('EMAIL_PASSWORD')
+    ),
+    sender=os.getenv('EMAIL_SENDER'),
+    batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', '20')),
+    max_attempts=int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5')),
+    backoff_seconds=float(os.getenv('OUTBOX_BACKOFF_SECONDS', '30'))
+)
+EMAIL_OUTBOX.start()
 
 # Load Hugging Face model once during startup
 AUDIO_CLASSIFIER = None
 MODEL_LOAD_ERROR = None
 TARGET_SAMPLE_RATE = 16000
+CLASSIFIER_ATTENTION_MASK = False   # padding is masked, so clips of different lengths may share a batch
+
+# With MODEL_SERVER_ADDRESS set, inference runs in the shared model server instead of this worker
+MODEL_SERVER_ADDRESS = os.getenv('MODEL_SERVER_ADDRESS')
+MODEL_CLIENT = None
 
 try:
-    AUDIO_CLASSIFIER = pipeline("audio-classification", model=DEEPFAKE_MODEL_ID)
-    TARGET_SAMPLE_RATE = getattr(
-        getattr(AUDIO_CLASSIFIER, "feature_extractor", None),
-        "sampling_rate",
-        TARGET_SAMPLE_RATE
-    )
+    if MODEL_SERVER_ADDRESS:
+        MODEL_CLIENT = ModelClient(MODEL_SERVER_ADDRESS, authkey_from_env())
+        MODEL_SERVER_INFO = MODEL_CLIENT.wait_ready(timeout=float(os.getenv('MODEL_SERVER_START_TIMEOUT', '600')))
+        TARGET_SAMPLE_RATE = MODEL_SERVER_INFO['sampling_rate']
+        CLASSIFIER_ATTENTION_MASK = MODEL_SERVER_INFO.get('attention_mask', False)
+    else:
+        configure_torch(RUNTIME_CONFIG)
+        AUDIO_CLASSIFIER = pipeline("audio-classification", model=DEEPFAKE_MODEL_ID)
+        TARGET_SAMPLE_RATE = getattr(
+            getattr(AUDIO_CLASSIFIER, "feature_extractor", None),
+            "sampling_rate",
+            TARGET_SAMPLE_RATE
+        )
+        CLASSIFIER_ATTENTION_MASK = bool(getattr(
+            getattr(AUDIO_CLASSIFIER, "feature_extractor", None),
+            "return_attention_mask",
+            False
+        ))
 except Exception as pipeline_error:
+    MODEL_CLIENT = None
     MODEL_LOAD_ERROR = str(pipeline_error)
 
+def run_classifier(waveforms):
+    """Scores and embeddings for a batch of waveforms, in-process or via the model server."""
+    if MODEL_CLIENT is not None:
+        return MODEL_CLIENT.classify(waveforms, TARGET_SAMPLE_RATE)
+    return classify_waveforms(AUDIO_CLASSIFIER, waveforms, TARGET_SAMPLE_RATE)
+
+# Acoustic fingerprint index of registered clips (provenance survives renames and re-encodes)
+try:
+    # The base file plus the shards every worker saves its own registrations to
+    FINGERPRINT_INDEX = FingerprintIndex.load(FINGERPRINT_INDEX_PATH)
+except Exception as index_error:
+    print(f"Error loading fingerprint index: {index_error}")
+    FINGERPRINT_INDEX = FingerprintIndex()
+
+# Embeddings of every analyzed clip, for near-duplicate lookup of known deepfakes
+try:
+    KNOWN_CLIPS_INDEX = (EmbeddingIndex.load(KNOWN_CLIPS_INDEX_PATH, ivf_threshold=KNOWN_CLIPS_IVF_THRESHOLD)
+                         if os.path.exists(KNOWN_CLIPS_INDEX_PATH)
+                         else EmbeddingIndex(ivf_threshold=KNOWN_CLIPS_IVF_THRESHOLD))
+except Exception as index_error:
+    print(f"Error loading known clips index: {index_error}")
+    KNOWN_CLIPS_INDEX = EmbeddingIndex(ivf_threshold=KNOWN_CLIPS_IVF_THRESHOLD)
+
+def persist_indexes():
+    """Write new fingerprint and embedding entries to disk; called periodically and at shutdown."""
+    if FINGERPRINT_INDEX.dirty:
+        FINGERPRINT_INDEX.save_shard(FINGERPRINT_INDEX_PATH)
+    if KNOWN_CLIPS_INDEX.dirty:
+        KNOWN_CLIPS_INDEX.save(KNOWN_CLIPS_INDEX_PATH)
+
+def _index_saver():
+    while True:
+        time.sleep(FINGERPRINT_SAVE_INTERVAL)
+        try:
+            persist_indexes()
+        except Exception as save_error:
+            print(f"Error saving indexes: {save_error}")
+
+threading.Thread(target=_index_saver, daemon=True).start()
+atexit.register(persist_indexes)
+
 #for audio files
 ALLOWED_EXTENSIONS = {
     'mp3', 'wav', 'webm', 'ogg', 'aac', 'flac', 'm4a'
@@ -70,10 +266,106 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def probe_upload(file):
+    """
+    Read the container header of an upload without decoding it.
+    Returns (probe, None) or (None, error response) for corrupt, video or over-long files.
+    """
+    try:
+        probe = probe_stream(file.stream)
+    except ProbeError as probe_error:
+        return None, (jsonify({'error': 'Unsupported or corrupt audio file', 'details': str(probe_error)}), 415)
+
+    if probe.has_video:
+        return None, (jsonify({'error': 'Video files are not supported, upload the audio track only'}), 415)
+    if probe.duration > MAX_AUDIO_SECONDS:
+        return None, (jsonify({
+            'error': f'Audio is longer than the {int(MAX_AUDIO_SECONDS)} second limit',
+            'duration': round(probe.duration, 3)
+        }), 413)
+    return probe, None
+
+def require_admin(view):
+    """Allow the request only with the configured X-Admin-Token header."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+            return jsonify({'error': 'Admin access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def optional_user_id():
+    """The JWT identity when a valid token is sent, else None."""
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+def request_user_key():
+    """Concurrency key: the JWT identity when a valid token is sent, else the client address."""
+    identity = optional_user_id()
+    return f"user:{identity}" if identity else f"ip:{request.remote_addr}"
+
+def admission_controlled(view=None, *, max_seconds=ANALYZE_MAX_SECONDS):
+    """
+    Probe, then admit or shed an upload by its estimated work before any decoding happens.
+    Work is the duration capped at `max_seconds` (None: the whole clip is decoded).
+    """
+    if view is None:
+        return lambda view: admission_controlled(view, max_seconds=max_seconds)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        upload = request.files.get('audio')
+        if upload is None or upload.filename == '' or not allowed_file(upload.filename):
+            return view(*args, **kwargs)
+
+        probe, error_response = probe_upload(upload)
+        if error_response:
+            return error_response
+        g.audio_probe = probe
+
+        # Only the decoded prefix costs work, so route by the capped duration
+        duration = probe.duration if max_seconds is None else min(probe.duration, max_seconds)
+        try:
+            ticket = ADMISSION.acquire(request_user_key(), duration)
+        except AdmissionRejected as rejected:
+            response = jsonify({'error': 'Server is busy, please retry later', 'reason': rejected.reason})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(rejected.retry_after)
+            return response
+
+        try:
+            return view(*args, **kwargs)
+        finally:
+            ADMISSION.release(ticket)
+    return wrapper
+
+def memory_section(name):
+    """tracemalloc growth of a code section in a profiled request; a no-op otherwise."""
+    if PROFILER is None or g.get('profile_token') is None:
+        return nullcontext()
+    return PROFILER.memory_section(name)
+
+if PROFILER is not None:
+    @app.before_request
+    def start_profiling():
+        forced = (request.headers.get('X-Profile') == '1' and ADMIN_TOKEN
+                  and request.headers.get('X-Admin-Token') == ADMIN_TOKEN)
+        if PROFILER.should_profile(forced=bool(forced)):
+            g.profile_token = PROFILER.start(request.endpoint)
+
+    @app.teardown_request
+    def stop_profiling(error=None):
+        token = g.pop('profile_token', None)
+        if token is not None:
+            PROFILER.stop(token)
+
 class AudioFile:
     @staticmethod
-    def create(file, user_id):
-        """Create and save an audio file entry"""
+    def create(file, user_id, **fields):
+        """Queue an audio file entry for insertion; returns its ObjectId"""
         audio_data = {
             'filename': file.filename,
             'contentType': file.content_type,
@@ -82,7 +374,8 @@ class AudioFile:
             'confidence': None,
             'result': None
         }
-        return db.audio_files.insert_one(audio_data)
+        audio_data.update(fields)
+        return WRITE_BEHIND.enqueue('audio_files', audio_data)
 
 class UserAuth:
     @staticmethod
@@ -174,9 +467,9 @@ def receive_feedback():
             "message": message,
             "rating": rating
         }
-        result = db.Feedback.insert_one(feedback_data)  # Insert into MongoDB
+        feedback_id = WRITE_BEHIND.enqueue('Feedback', feedback_data)  # Spooled, inserted in the background
 
-        return jsonify({"message": "Feedback saved successfully", "id": str(result.inserted_id)}), 201
+        return jsonify({"message": "Feedback saved successfully", "id": str(feedback_id)}), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -200,6 +493,54 @@ def find_hex_code(filename):
     return None
 
 
+def resolve_verification_code(filename, waveform, sample_rate, watermark_code=None):
+    """
+    Find the verification code for an upload by acoustic fingerprint, whatever its filename.
+
+    Falls back to the code carried by a detected watermark, then the CSV filename lookup (or a
+    fresh code), and registers the clip, so later renamed or re-encoded copies resolve to the same code.
+
+    Returns:
+        tuple: (hex_code, fingerprint match dict or None)
+    """
+    hashes = anchors = None
+    try:
+        hashes, anchors = compute_hashes(waveform, sample_rate)
+        match = FINGERPRINT_INDEX.query(hashes, anchors)
+        if match:
+            return match['hex_code'], match
+    except Exception as fingerprint_error:
+        print(f"Fingerprint error: {fingerprint_error}")
+
+    hex_code = watermark_code or find_hex_code(filename)
+    if hex_code is None:
+        hex_code = secrets.token_hex(8)
+        try:
+            watermark.register(db.provenance, hex_code, filename=filename, source='upload')
+        except Exception as provenance_error:
+            print(f"Error registering provenance: {provenance_error}")
+    if hashes is not None and len(hashes):
+        FINGERPRINT_INDEX.add(hashes, anchors, hex_code, name=filename)
+    return hex_code, None
+
+
+def detect_spread_spectrum(waveform):
+    """
+    Spread-spectrum watermark in a canonical-rate waveform, with the provenance code it points to.
+    Returns None when no key is configured or detection fails.
+    """
+    if not WATERMARK_KEY:
+        return None
+    try:
+        result = spread_spectrum.detect(waveform, WATERMARK_KEY, sr=CANONICAL_SAMPLE_RATE)
+        record = watermark.lookup_prefix(db.provenance, result['code']) if result['detected'] else None
+    except Exception as watermark_error:
+        print(f"Watermark detection error: {watermark_error}")
+        return None
+    result['hex_code'] = record['_id'] if record else None
+    return result
+
+
 def ensure_qr_code(code_value: str):
     """Return the public path to the QR code, generating it if needed."""
     safe_code = code_value.strip() or secrets.token_hex(8)
@@ -227,6 +568,7 @@ def ensure_qr_code(code_value: str):
 # Audio Upload and Analysis Routes
 @app.route('/api/audio/upload', methods=['POST'])
 @jwt_required()
+@admission_controlled(max_seconds=None)
 def upload_audio():
     user_id = get_jwt_identity()
 
@@ -241,35 +583,109 @@ def upload_audio():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type'}), 400
 
+    probe = g.audio_probe
+
     try:
+        audio_bytes = file.read()
+        filename = secure_filename(file.filename)
+
+        # One decode on ingest, before anything is stored, so an undecodable file leaves no orphan behind
+        try:
+            flac_bytes, canonical_waveform = transcode(audio_bytes)
+        except Exception as decode_error:
+            print(f"Error decoding upload: {decode_error}")
+            return jsonify({'error': 'Unable to decode audio file', 'audio': probe.to_dict()}), 422
+
         # Store file in GridFS
         file_id = fs.put(
-            file.read(), 
-            filename=secure_filename(file.filename),
+            audio_bytes, 
+            filename=filename,
             content_type=file.content_type,
             user_id=user_id
         )
-        
-        # Find or generate verification code
-        filename = secure_filename(file.filename)
-        hex_code = find_hex_code(filename) or secrets.token_hex(8)
+
+        # The canonical 16 kHz mono FLAC is stored next to the original
+        canonical_id = store_canonical(fs, audio_files_index, file_id, flac_bytes, canonical_waveform,
+                                       filename, user_id=user_id)
+        store_pyramid(db.waveform_peaks, file_id,
+                      build_pyramid(canonical_waveform, CANONICAL_SAMPLE_RATE, bits=PEAK_BITS))
+
+        # A spread-spectrum watermark anywhere in the clip names its verification code
+        watermark_result = detect_spread_spectrum(canonical_waveform)
+
+        # Find or generate verification code from the audio content
+        fingerprint_waveform = librosa.resample(canonical_waveform, orig_sr=CANONICAL_SAMPLE_RATE,
+                                                target_sr=FINGERPRINT_SAMPLE_RATE)
+        hex_code, provenance_match = resolve_verification_code(
+            filename, fingerprint_waveform, FINGERPRINT_SAMPLE_RATE,
+            watermark_code=watermark_result.get('hex_code') if watermark_result else None
+        )
 
         qr_code_url = ensure_qr_code(hex_code)
         if not qr_code_url:
             return jsonify({'error': 'Unable to generate QR code'}), 500
 
+        scan_id = AudioFile.create(file, user_id, file_id=file_id, hex_code=hex_code)
+
         # Return the QR code URL and basic file info
         return jsonify({
             'message': 'File uploaded successfully',
             'file_id': str(file_id),
+            'canonical_file_id': str(canonical_id),
+            'scan_id': str(scan_id),
             'qr_code_url': qr_code_url,
             'filename': filename,
-            'hex_code': hex_code
+            'hex_code': hex_code,
+            'provenance_match': provenance_match,
+            'watermark': watermark_result,
+            'audio': probe.to_dict()
         }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/watermark/verify', methods=['POST'])
+def verify_watermark():
+    """Read the embedded verification code from the leading samples and look it up, ignoring the filename."""
+    if 'audio' not in request.files:
+        return jsonify({'error': 'Audio file is required'}), 400
+
+    file = request.files['audio']
+    probe, error_response = probe_upload(file)
+    if error_response:
+        return error_response
+    if probe.format not in watermark.LOSSLESS_FORMATS:
+        return jsonify({
+            'error': 'Watermarks can only be read from lossless WAV or FLAC files',
+            'audio': probe.to_dict()
+        }), 415
+
+    try:
+        codes = watermark.candidate_codes(watermark.extract_bits(
+            watermark.read_leading_samples(file.stream, watermark.PAYLOAD_BITS)))
+        record = watermark.lookup(db.provenance, codes)
+    except Exception as e:
+        print(f"Error verifying watermark: {e}")
+        return jsonify({'error': 'Unable to read watermark'}), 500
+
+    if record is None:
+        return jsonify({'watermarked': False, 'audio': probe.to_dict()}), 200
+
+    # Cross-check the embedded code with the filename lookup and any code the client claims
+    filename_code = find_hex_code(file.filename) if file.filename else None
+    claimed_code = (request.form.get('hex_code') or '').strip().lower() or None
+    return jsonify({
+        'watermarked': True,
+        'hex_code': record['_id'],
+        'label': record.get('label'),
+        'original_filename': record.get('filename'),
+        'source': record.get('source'),
+        'matches_filename': None if filename_code is None else filename_code.lower() == record['_id'],
+        'matches_claimed_code': None if claimed_code is None else claimed_code == record['_id'],
+        'qr_code_url': ensure_qr_code(record['_id']),
+        'audio': probe.to_dict()
+    }), 200
+
 @app.route('/QR_images/<hex_code>.png')
 def get_qr_image(hex_code):
     """Serve the QR code image."""
@@ -280,62 +696,142 @@ def get_qr_image(hex_code):
     return send_from_directory(QR_IMAGES_FOLDER, f"{hex_code}.png", mimetype='image/png')
 
 # 3. Endpoint to download analysis reports
-# @app.route('/download-report', methods=['GET'])
-# def download_report():
-#     filename = request.args.get("filename")
-    
-#     if not filename:
-#         return jsonify({"error": "Filename is required"}), 400
+def find_analysis(analysis_id):
+    """Stored analysis document, or None for unknown/invalid ids."""
+    try:
+        object_id = ObjectId(analysis_id)
+    except Exception:
+        return None
 
-#     # Prevent directory traversal attacks
-#     safe_filename = os.path.basename(filename)
-#     report_path = os.path.join(REPORTS_FOLDER, safe_filename)
+    return db.analyses.find_one({'_id': object_id})
 
-#     if not os.path.exists(report_path):
-#         return jsonify({"error": "Report not found"}), 404
+@app.route('/api/reports/<analysis_id>', methods=['GET'])
+@app.route('/download-report', methods=['GET'])
+def download_report(analysis_id=None):
+    analysis_id = analysis_id or request.args.get("analysis_id")
+    if not analysis_id:
+        return jsonify({"error": "analysis_id is required"}), 400
 
-#     return send_file(report_path, as_attachment=True, download_name=safe_filename)
+    analysis = find_analysis(analysis_id)
+    if not analysis:
+        return jsonify({"error": "Report not found"}), 404
+
+    try:
+        report = get_report(analysis, REPORT_CACHE, QR_IMAGES_FOLDER)
+    except Exception as e:
+        print(f"Report rendering error: {e}")
+        return jsonify({"error": "Failed to render report"}), 500
+
+    return send_file(
+        io.BytesIO(report),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"voice_guard_report_{analysis_id}.pdf"
+    )
 
 @app.route("/share-report", methods=["POST"])
 def share_report():
-    data = request.json
+    data = request.json or {}
     method = data.get("method")
     recipient = data.get("recipient")
+    analysis_id = data.get("analysis_id")
     
-    if not method or not recipient:
+    if not method or not recipient or not analysis_id:
         return jsonify({"error": "Invalid request"}), 400
-    
-    report_path = "reports/analysis_report.pdf"  # Ensure report is saved here
+
+    analysis = find_analysis(analysis_id)
+    if not analysis:
+        return jsonify({"error": "Report not found"}), 404
 
     if method == "email":
         try:
-            email_sender = os.getenv("EMAIL_SENDER")
-            email_password = os.getenv("EMAIL_PASSWORD")
-
-            msg = EmailMessage()
-            msg["Subject"] = "Voice Analysis Report"
-            msg["From"] = email_sender
-            msg["To"] = recipient
-            msg.set_content("Attached is your requested voice analysis report.")
-
-            with open(report_path, "rb") as file:
-                msg.add_attachment(file.read(), maintype="application", subtype="pdf", filename="analysis_report.pdf")
-
-            with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-                server.login(email_sender, email_password)
-                server.send_message(msg)
-
-            return jsonify({"message": "Report shared via email successfully!"})
+            report_path = get_report_path(analysis, REPORT_CACHE, QR_IMAGES_FOLDER)
+            message_id = EMAIL_OUTBOX.enqueue(
+                recipient,
+                "Voice Analysis Report",
+                "Attached is your requested voice analysis report.",
+                attachments=[report_path],
+                metadata={'analysis_id': str(analysis['_id'])}
+            )
+            return jsonify({
+                "message": "Report queued for email delivery",
+                "message_id": str(message_id),
+                "status_url": f"/api/outbox/{message_id}"
+            }), 202
 
         except Exception as e:
-            return jsonify({"error": f"Failed to send email: {str(e)}"}), 500
+            return jsonify({"error": f"Failed to queue email: {str(e)}"}), 500
 
     elif method == "whatsapp":
-        whatsapp_link = f"https://api.whatsapp.com/send?phone={recipient}&text=Your%20analysis%20report%20is%20ready!%20Download%20it%20here:%20http://localhost:5000/download-report"
+        report_link = f"{request.host_url}download-report?analysis_id={analysis_id}"
+        whatsapp_text = quote(f"Your analysis report is ready! Download it here: {report_link}")
+        whatsapp_link = f"https://api.whatsapp.com/send?phone={recipient}&text={whatsapp_text}"
         return jsonify({"message": "WhatsApp link generated", "link": whatsapp_link})
 
     return jsonify({"error": "Invalid method"}), 400
 
+REPORT_BATCH_PROCESS = None
+REPORT_BATCH_LOCK = threading.Lock()
+
+def run_backend_cli(script, *args):
+    """
+    Start one of the backend CLIs as a separate process, with this app's database settings.
+    Process pools must not be created in the API process: spawned children would re-run this
+    module (model load, index load, background threads) when the app is started as a script.
+    """
+    env = dict(os.environ, MONGODB_URI=MONGODB_URI, MONGODB_DB_NAME=MONGODB_DB_NAME,
+               MONGODB_AUDIO_COLLECTION_NAME=MONGODB_AUDIO_COLLECTION_NAME, DEEPFAKE_MODEL_ID=DEEPFAKE_MODEL_ID)
+    return subprocess.Popen([sys.executable, os.path.join(app.root_path, script), *map(str, args)], env=env)
+
+@app.route('/api/admin/reports/batch', methods=['POST'])
+@require_admin
+def render_reports():
+    """Queue pre-rendering of reports for the given analysis ids (or the latest N) in parallel processes."""
+    data = request.json or {}
+    try:
+        if data.get('analysis_ids'):
+            if len(data['analysis_ids']) > REPORT_BATCH_MAX:
+                return jsonify({'error': f'At most {REPORT_BATCH_MAX} analyses per batch'}), 400
+            query = {'_id': {'$in': [ObjectId(value) for value in data['analysis_ids']]}}
+            analyses = list(db.analyses.find(query))
+        else:
+            latest = max(1, min(int(data.get('latest', 100)), REPORT_BATCH_MAX))
+            analyses = list(db.analyses.find().sort('created_at', -1).limit(latest))
+    except Exception:
+        return jsonify({'error': 'Invalid analysis ids'}), 400
+
+    # Rendering runs in the reports CLI, whose process pool never imports this module
+    global REPORT_BATCH_PROCESS
+    analysis_ids = [str(analysis['_id']) for analysis in analyses]
+    with REPORT_BATCH_LOCK:
+        if REPORT_BATCH_PROCESS is not None and REPORT_BATCH_PROCESS.poll() is None:
+            return jsonify({'error': 'A report batch is already running'}), 409
+        if analysis_ids:
+            worker_args = ['--workers', REPORT_RENDER_WORKERS] if REPORT_RENDER_WORKERS else []
+            REPORT_BATCH_PROCESS = run_backend_cli('reports.py', *analysis_ids, *worker_args,
+                                                   '--reports-dir', REPORTS_FOLDER, '--qr-dir', QR_IMAGES_FOLDER)
+    return jsonify({'queued': analysis_ids}), 202
+
+@app.route('/api/outbox/<message_id>', methods=['GET'])
+def outbox_status(message_id):
+    """Delivery status of a queued email."""
+    try:
+        item = EMAIL_OUTBOX.status(ObjectId(message_id))
+    except Exception:
+        return jsonify({'error': 'Invalid message id'}), 400
+
+    if not item:
+        return jsonify({'error': 'Message not found'}), 404
+
+    return jsonify({
+        'message_id': message_id,
+        'status': item['status'],
+        'attempts': item.get('attempts', 0),
+        'created_at': item['created_at'].isoformat(),
+        'sent_at': item['sent_at'].isoformat() if item.get('sent_at') else None,
+        'last_error': item.get('last_error')
+    }), 200
+
 @app.route('/api/audio/recent-scans', methods=['GET'])
 @jwt_required()
 def get_recent_scans():
@@ -387,7 +883,7 @@ def generate_audio_url(scan):
 @jwt_required()
 def serve_audio_file(file_id):
     try:
-        # Retrieve file from GridFS
+        # Retrieve file from GridFS, or from cold storage (promoting it back)
         file_obj = fs.get(ObjectId(file_id))
         
         # Create in-memory bytes buffer
@@ -403,10 +899,51 @@ def serve_audio_file(file_id):
     
     except Exception as e:
         return jsonify({'error': 'Unable to serve audio file'}), 500
+
+@app.route('/api/audio/file/<file_id>/peaks', methods=['GET'])
+@jwt_required()
+def audio_peaks(file_id):
+    """Min/max peaks for drawing the waveform: ?width=<pixels>&start=<s>&end=<s>."""
+    try:
+        object_id = ObjectId(file_id)
+    except Exception:
+        return jsonify({'error': 'Invalid file id'}), 400
+
+    width = min(max(request.args.get('width', 1000, type=int), 1), PEAK_MAX_WIDTH)
+    start = request.args.get('start', 0.0, type=float)
+    end = request.args.get('end', type=float)
+
+    try:
+        document = db.waveform_peaks.find_one({'_id': object_id})
+        if document is None:
+            # Files stored before pyramids existed get one on first request
+            waveform = load_waveform(fs, audio_files_index, object_id)
+            store_pyramid(db.waveform_peaks, object_id,
+                          build_pyramid(waveform, CANONICAL_SAMPLE_RATE, bits=PEAK_BITS))
+            document = db.waveform_peaks.find_one({'_id': object_id})
+    except FileNotFoundError:
+        return jsonify({'error': 'Audio file not found'}), 404
+    except Exception as e:
+        print(f"Error building waveform peaks: {e}")
+        return jsonify({'error': 'Unable to compute waveform peaks'}), 500
+
+    peaks, seconds_per_peak, peaks_start = select_peaks(document, width, start, end)
+    response = jsonify({
+        'file_id': file_id,
+        'duration': document['duration'],
+        'bits': document['bits'],
+        'start': peaks_start,
+        'seconds_per_peak': seconds_per_peak,
+        'peaks': peaks.tolist()
+    })
+    # Pyramids never change once built
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response, 200
     
 @app.route('/api/audio/analyze', methods=['POST'])
+@admission_controlled
 def analyze_audio():
-    if AUDIO_CLASSIFIER is None:
+    if AUDIO_CLASSIFIER is None and MODEL_CLIENT is None:
         return jsonify({
             'error': 'Deepfake model is not available',
             'details': MODEL_LOAD_ERROR
@@ -425,48 +962,271 @@ def analyze_audio():
 
     try:
         filename = secure_filename(file.filename)
-        hex_code = find_hex_code(filename) or secrets.token_hex(8)
-        qr_code_url = ensure_qr_code(hex_code)
-        verification_id = hex_code.upper()
 
+        probe = g.audio_probe
         audio_bytes = file.read()
         audio_buffer = io.BytesIO(audio_bytes)
-        waveform, _ = librosa.load(audio_buffer, sr=TARGET_SAMPLE_RATE, mono=True)
-
-        predictions = AUDIO_CLASSIFIER({
-            "array": waveform,
-            "sampling_rate": TARGET_SAMPLE_RATE
-        })
+        with memory_section('decode'):
+            waveform, _ = librosa.load(audio_buffer, sr=TARGET_SAMPLE_RATE, mono=True, duration=ANALYZE_MAX_SECONDS)
 
-        formatted_scores = [
-            {
-                'label': score.get('label', '').lower(),
-                'score': round(float(score.get('score', 0.0)), 6)
-            } for score in predictions
-        ]
+        hex_code, provenance_match = resolve_verification_code(filename, waveform, TARGET_SAMPLE_RATE)
+        qr_code_url = ensure_qr_code(hex_code)
+        verification_id = hex_code.upper()
 
+        # Score only the speech; keep the full clip when too little speech is found
+        model_waveform = waveform
+        speech_segments = []
+        speech_duration = len(waveform) / TARGET_SAMPLE_RATE
+        if VAD_ENABLED:
+            trimmed, speech_segments, speech_duration = trim_silence(waveform, TARGET_SAMPLE_RATE)
+            if speech_duration >= VAD_MIN_SPEECH_SECONDS:
+                model_waveform = trimmed
+
+        analysis_mode = 'adaptive' if request.args.get('mode') == 'adaptive' else 'full'
+        window_analysis = None
+        embedding = None
+        nearest_clips = []
+
+        # A fingerprint match to a reviewed fake needs no model run at all
+        if provenance_match and KNOWN_CLIPS_INDEX.known_label(hex_code) == 'fake':
+            formatted_scores = [{'label': 'fake', 'score': 1.0}]
+            verdict_source = 'known_clip'
+        elif analysis_mode == 'adaptive':
+            # Windows over the full clip; silent ones are skipped rather than cut out
+            window = int(ADAPTIVE_WINDOW_SECONDS * TARGET_SAMPLE_RATE)
+            window_starts = (speech_windows(speech_segments, len(waveform), window, window)
+                             if speech_segments else None)
+
+            def score_batch(batch):
+                with memory_section('inference'):
+                    score_lists, batch_embeddings = run_classifier(batch)
+                return [fake_probability(scores) for scores in score_lists], batch_embeddings
+
+            window_analysis = adaptive_classify(
+                score_batch, waveform, TARGET_SAMPLE_RATE,
+                window_seconds=ADAPTIVE_WINDOW_SECONDS,
+                batch_size=ADAPTIVE_BATCH_SIZE,
+                confidence=ADAPTIVE_CONFIDENCE,
+                min_windows=ADAPTIVE_MIN_WINDOWS,
+                window_starts=window_starts
+            )
+            fake = window_analysis.pop('fake_probability')
+            formatted_scores = sorted([
+                {'label': 'fake', 'score': round(fake, 6)},
+                {'label': 'real', 'score': round(1.0 - fake, 6)}
+            ], key=lambda item: item['score'], reverse=True)
+            embedding = window_analysis.pop('embedding')
+            window_analysis.pop('label')
+            nearest_clips = KNOWN_CLIPS_INDEX.search(embedding, k=KNOWN_CLIPS_NEIGHBORS)
+            verdict_source = 'model'
+        else:
+            with memory_section('inference'):
+                score_lists, embeddings = run_classifier([model_waveform])
+            formatted_scores = score_lists[0]
+            embedding = embeddings[0]
+            nearest_clips = KNOWN_CLIPS_INDEX.search(embedding, k=KNOWN_CLIPS_NEIGHBORS)
+            verdict_source = 'model'
+
+        # Scores from this run of the model; `scores` below always agrees with the returned verdict
+        model_scores = formatted_scores if verdict_source == 'model' else None
         best_score = max(formatted_scores, key=lambda item: item['score']) if formatted_scores else {
             'label': 'fake',
             'score': 0.0
         }
 
         normalized_label = best_score['label']
+        confidence = round(best_score['score'] * 100, 2)
+
+        # Near-duplicates of a reviewed fake keep the campaign's verdict consistent. Neighbours labeled
+        # only by the model stay informational, or one wrong verdict would copy itself onto every re-upload
+        closest = next((clip for clip in nearest_clips if clip.get('verified')), None)
+        if closest and closest['similarity'] >= KNOWN_FAKE_SIMILARITY and closest.get('label') == 'fake':
+            normalized_label = 'fake'
+            confidence = round(closest['similarity'] * 100, 2)
+            formatted_scores = [
+                {'label': 'fake', 'score': round(closest['similarity'], 6)},
+                {'label': 'real', 'score': round(1.0 - closest['similarity'], 6)}
+            ]
+            verdict_source = 'known_fake_match'
+
+        # Inserted inline: the response's analysis_id is fetched right away for reports, possibly by another worker
+        analysis_id = db.analyses.insert_one({
+            'hex_code': hex_code,
+            'filename': filename,
+            'label': normalized_label,
+            'confidence': confidence,
+            'scores': formatted_scores,
+            'model_scores': model_scores,
+            'verdict_source': verdict_source,
+            'analysis_mode': analysis_mode,
+            'total_duration': round(probe.duration, 3),
+            'speech_duration': round(speech_duration, 3),
+            'speech_segments': [
+                [round(start / TARGET_SAMPLE_RATE, 3), round(end / TARGET_SAMPLE_RATE, 3)]
+                for start, end in speech_segments
+            ],
+            'window_scores': window_analysis['window_scores'] if window_analysis else None,
+            'created_at': datetime.datetime.utcnow()
+        }).inserted_id
+
+        # Signed-in users get the result in their recent scans
+        user_id = optional_user_id()
+        if user_id:
+            AudioFile.create(file, user_id, hex_code=hex_code, result=normalized_label, confidence=confidence,
+                             analysis_id=analysis_id)
+
+        if embedding is not None:
+            KNOWN_CLIPS_INDEX.add(embedding, {
+                'hex_code': hex_code,
+                'filename': filename,
+                'label': normalized_label,
+                'confidence': confidence / 100,
+                'verified': False,
+                'analyzed_at': datetime.datetime.utcnow().isoformat()
+            })
 
         return jsonify({
+            'analysis_id': str(analysis_id),
+            'report_url': f'/api/reports/{analysis_id}',
             'label': normalized_label,
-            'confidence': round(best_score['score'] * 100, 2),
+            'confidence': confidence,
             'scores': formatted_scores,
+            'model_scores': model_scores,
+            'verdict_source': verdict_source,
+            'nearest_known_clips': nearest_clips,
             'authenticity': 'authentic' if normalized_label == 'real' else 'deepfake',
             'verification_id': verification_id,
             'hex_code': hex_code,
             'qr_code_url': qr_code_url,
-            'filename': filename
+            'filename': filename,
+            'provenance_match': provenance_match,
+            'audio': probe.to_dict(),
+            'analyzed_seconds': round(len(waveform) / TARGET_SAMPLE_RATE, 3),
+            'speech_duration': round(speech_duration, 3),
+            'total_duration': round(probe.duration, 3),
+            'truncated': probe.duration > ANALYZE_MAX_SECONDS,
+            'analysis_mode': analysis_mode,
+            'window_analysis': window_analysis
         })
 
     except Exception as e:
         print(f"Analysis error: {str(e)}")
         return jsonify({'error': 'Failed to analyze audio'}), 500
     
+@app.route('/api/admin/admission', methods=['GET'])
+@require_admin
+def admission_status():
+    return jsonify(ADMISSION.snapshot()), 200
+
+@app.route('/api/admin/known-clips/<hex_code>/label', methods=['POST'])
+@require_admin
+def label_known_clip(hex_code):
+    """Record a reviewed real/fake label for every stored embedding of a clip."""
+    data = request.json or {}
+    label = str(data.get('label', '')).lower()
+
+    if label not in ('real', 'fake'):
+        return jsonify({'error': "Label must be 'real' or 'fake'"}), 400
+
+    updated = KNOWN_CLIPS_INDEX.set_label(hex_code, label)
+    if not updated:
+        return jsonify({'error': 'No analyzed clip with this code'}), 404
+
+    return jsonify({'message': 'Label saved', 'hex_code': hex_code, 'updated': updated}), 200
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_admin
+def profile_summary():
+    if PROFILER is None:
+        return jsonify({'error': 'Profiling is disabled (set PROFILING_ENABLED=1)'}), 404
+    return jsonify(PROFILER.summary()), 200
+
+@app.route('/api/admin/profiles/collapsed', methods=['GET'])
+@require_admin
+def download_profile():
+    """Collapsed stacks for flamegraph.pl / speedscope, optionally for one endpoint or recent windows."""
+    if PROFILER is None:
+        return jsonify({'error': 'Profiling is disabled (set PROFILING_ENABLED=1)'}), 404
+
+    since = request.args.get('since_seconds', type=float)
+    collapsed = PROFILER.collapsed(
+        endpoint=request.args.get('endpoint'),
+        since=time.time() - since if since else None
+    )
+    return send_file(
+        io.BytesIO(collapsed.encode('utf-8')),
+        mimetype='text/plain',
+        as_attachment=True,
+        download_name='profile.collapsed.txt'
+    )
+
+@app.route('/api/admin/storage', methods=['GET'])
+@require_admin
+def storage_status():
+    return jsonify(fs.stats()), 200
+
+@app.route('/api/admin/storage/demote', methods=['POST'])
+@require_admin
+def demote_storage():
+    """Run one demotion sweep: move old or rarely read files out of GridFS."""
+    data = request.json or {}
+    try:
+        if data.get('register_existing'):
+            fs.register_existing()
+        moved, freed, stored = fs.sweep(limit=int(data.get('limit', 1000)))
+    except Exception as e:
+        print(f"Error demoting audio files: {e}")
+        return jsonify({'error': 'Demotion failed'}), 500
+    return jsonify({'demoted': moved, 'bytes_freed': freed, 'bytes_stored': stored}), 200
+
+# One bulk rescoring job per worker process at a time, run by the rescore CLI in its own process
+RESCORE_RUN = None      # (job name, Popen)
+RESCORE_LOCK = threading.Lock()
+
+@app.route('/api/admin/rescore', methods=['POST'])
+@require_admin
+def start_rescore():
+    """Score stored uploads without a result (or all of them with {"all": true}), resuming from the checkpoint."""
+    global RESCORE_RUN
+    data = request.json or {}
+    job = str(data.get('job', 'default'))
+    with RESCORE_LOCK:
+        if RESCORE_RUN is not None and RESCORE_RUN[1].poll() is None:
+            return jsonify({'error': 'A rescore job is already running', 'job': RESCORE_RUN[0]}), 409
+        args = ['--job', job, '--batch-size', RESCORE_BATCH_SIZE, '--max-seconds', ANALYZE_MAX_SECONDS]
+        if RESCORE_WORKERS:
+            args += ['--workers', RESCORE_WORKERS]
+        if data.get('all'):
+            args.append('--all')
+        if data.get('restart'):
+            args.append('--restart')
+        RESCORE_RUN = (job, run_backend_cli('rescore.py', *args))
+    return jsonify({'job': job, 'running': True, 'pid': RESCORE_RUN[1].pid}), 202
+
+@app.route('/api/admin/rescore', methods=['GET'])
+@require_admin
+def rescore_status():
+    """Progress of a rescore job, as recorded in its checkpoint by the rescore process."""
+    job = request.args.get('job', 'default')
+    checkpoint = db.rescore_checkpoints.find_one({'_id': job})
+    process = RESCORE_RUN[1] if RESCORE_RUN is not None and RESCORE_RUN[0] == job else None
+    if checkpoint is None:
+        if process is not None and process.poll() is None:
+            return jsonify({'job': job, 'running': True}), 200
+        return jsonify({'error': 'No rescore job has run'}), 404
+
+    status = checkpoint.get('status') or {'job': job, 'running': False}
+    if process is not None and process.poll() is not None and status.get('running'):
+        # The process ended without recording it (model load failure, killed)
+        status = dict(status, running=False, error=status.get('error') or f"Rescore process exited with code {process.returncode}")
+    last_id = checkpoint.get('last_id')
+    status['checkpoint'] = {
+        'last_id': str(last_id) if last_id is not None else None,
+        'model_id': checkpoint.get('model_id'),
+        'updated_at': checkpoint['updated_at'].isoformat() if checkpoint.get('updated_at') else None,
+    }
+    return jsonify(status), 200
+
 # Error Handlers
 @app.errorhandler(400)
 def bad_request(error):
@@ -0,0 +1,532 @@
+"""
+Lightweight container probing for uploads.
+
+Reads only the headers (and, where a container keeps its length at the end, a
+small tail) of RIFF/WAV, FLAC, Ogg (Vorbis/Opus/FLAC), MP3, ADTS AAC, MP4/M4A
+and WebM/Matroska streams. It reports format, duration, sample rate, channels
+and whether a video track is present. No samples are decoded, so the backend can
+reject, cap or route a request before librosa spends any time on it.
+"""
+import os
+import struct
+from dataclasses import asdict, dataclass
+
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 256 * 1024
+MAX_MOOV_BYTES = 16 * 1024 * 1024
+FLAC_COMPRESSION_RATIO = 0.6    # typical FLAC size relative to PCM, for streams without a sample count
+
+
+class ProbeError(Exception):
+    """The stream is not a recognizable (or is a corrupt) audio container."""
+
+
+@dataclass
+class ProbeResult:
+    format: str
+    duration: float
+    sample_rate: int = None
+    channels: int = None
+    codec: str = None
+    has_video: bool = False
+    estimated: bool = False
+
+    def to_dict(self):
+        data = asdict(self)
+        data['duration'] = round(self.duration, 3) if self.duration is not None else None
+        return data
+
+
+def _size(stream):
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+def _read_at(stream, offset, length):
+    stream.seek(offset)
+    return stream.read(length)
+
+
+def _skip_id3(stream, head):
+    """Offset of the first byte after an ID3v2 tag (0 when there is none)."""
+    if head[:3] != b'ID3' or len(head) < 10:
+        return 0
+    size = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+# RIFF / WAV
+
+def _probe_wav(stream, head, size):
+    offset = 12
+    fmt = None
+    while offset + 8 <= size:
+        chunk = _read_at(stream, offset, 8)
+        if len(chunk) < 8:
+            break
+        chunk_id, chunk_size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+        if chunk_id == b'fmt ':
+            body = _read_at(stream, offset + 8, 16)
+            if len(body) < 16:
+                raise ProbeError('Truncated WAV fmt chunk')
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = struct.unpack('<HHIIHH', body)
+            fmt = (audio_format, channels, sample_rate, byte_rate, block_align, bits)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ProbeError('WAV data chunk before fmt chunk')
+            audio_format, channels, sample_rate, byte_rate, block_align, bits = fmt
+            # Streaming writers leave the size at 0 or 0xFFFFFFFF
+            data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else size - offset - 8
+            data_size = min(data_size, size - offset - 8)
+            if byte_rate == 0:
+                raise ProbeError('WAV header has a zero byte rate')
+            return ProbeResult('wav', data_size / byte_rate, sample_rate, channels,
+                               codec='pcm' if audio_format in (1, 0xFFFE) else f'wav-{audio_format}')
+        offset += 8 + chunk_size + (chunk_size & 1)
+    raise ProbeError('WAV file has no data chunk')
+
+
+# FLAC
+
+def _parse_streaminfo(block):
+    packed = struct.unpack('>Q', block[10:18])[0]
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    bits = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & ((1 << 36) - 1)
+    if sample_rate == 0:
+        raise ProbeError('FLAC STREAMINFO has a zero sample rate')
+    return sample_rate, channels, bits, total_samples
+
+
+def _probe_flac(stream, head, start, size):
+    block_header = _read_at(stream, start + 4, 4 + 34)
+    if len(block_header) < 38 or block_header[0] & 0x7F != 0:
+        raise ProbeError('FLAC stream does not start with STREAMINFO')
+    sample_rate, channels, bits, total_samples = _parse_streaminfo(block_header[4:])
+    if total_samples == 0:
+        # Streaming encoders may leave the count unset: estimate from the size at a typical compression ratio
+        bytes_per_second = sample_rate * channels * bits / 8 * FLAC_COMPRESSION_RATIO
+        return ProbeResult('flac', (size - start) / bytes_per_second, sample_rate, channels, codec='flac',
+                           estimated=True)
+    return ProbeResult('flac', total_samples / sample_rate, sample_rate, channels, codec='flac')
+
+
+# Ogg
+
+def _probe_ogg(stream, head, size):
+    if len(head) < 28:
+        raise ProbeError('Truncated Ogg page')
+    n_segments = head[26]
+    packet = head[27 + n_segments:27 + n_segments + 64]
+
+    if packet.startswith(b'\x01vorbis'):
+        codec, channels, sample_rate = 'vorbis', packet[11], struct.unpack('<I', packet[12:16])[0]
+        granule_rate, pre_skip = sample_rate, 0
+    elif packet.startswith(b'OpusHead'):
+        codec, channels = 'opus', packet[9]
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+        sample_rate = struct.unpack('<I', packet[12:16])[0] or 48000
+        granule_rate = 48000
+    elif packet.startswith(b'\x7fFLAC'):
+        codec = 'flac'
+        sample_rate, channels, _, _ = _parse_streaminfo(packet[17:])
+        granule_rate, pre_skip = sample_rate, 0
+    elif packet.startswith(b'\x80theora'):
+        raise ProbeError('Ogg stream carries Theora video')
+    else:
+        raise ProbeError('Unsupported Ogg codec')
+
+    # Granule position of the last page is the total sample count
+    tail_start = max(0, size - TAIL_BYTES)
+    tail = _read_at(stream, tail_start, size - tail_start)
+    last_page = tail.rfind(b'OggS')
+    if last_page < 0 or last_page + 14 > len(tail):
+        raise ProbeError('Ogg stream has no final page')
+    granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+    if granule <= 0:
+        raise ProbeError('Ogg stream has no granule position')
+    return ProbeResult('ogg', max(0, granule - pre_skip) / granule_rate, sample_rate, channels, codec=codec)
+
+
+# MP3
+
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _mp3_frame(header):
+    """Decode a 4-byte MPEG audio frame header, or None if it is not one."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version_bits = (header[1] >> 3) & 0x3
+    layer_bits = (header[1] >> 1) & 0x3
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x3
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    version = 1 if version_bits == 3 else 2
+    bitrate = MP3_BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version_bits][rate_index]
+    padding = (header[2] >> 1) & 0x1
+    channels = 1 if (header[3] >> 6) == 3 else 2
+
+    if layer == 1:
+        samples, length = 384, (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {'version': version, 'layer': layer, 'bitrate': bitrate, 'sample_rate': sample_rate,
+            'channels': channels, 'samples': samples, 'length': length}
+
+
+def _probe_mp3(stream, size, start):
+    data = _read_at(stream, start, HEAD_BYTES)
+    position = data.find(b'\xff')
+    while 0 <= position < len(data) - 4:
+        frame = _mp3_frame(data[position:position + 4])
+        if frame is None:
+            position = data.find(b'\xff', position + 1)
+            continue
+        # A real sync is followed by another valid header exactly one frame later
+        following = data[position + frame['length']:position + frame['length'] + 4]
+        if len(following) == 4 and _mp3_frame(following) is None:
+            position = data.find(b'\xff', position + 1)
+            continue
+
+        # Xing/Info or VBRI headers carry the exact frame count of VBR files
+        if frame['version'] == 1:
+            side_info = 17 if frame['channels'] == 1 else 32
+        else:
+            side_info = 9 if frame['channels'] == 1 else 17
+        xing = data[position + 4 + side_info:position + 4 + side_info + 12]
+        vbri = data[position + 36:position + 36 + 18]
+        frame_count = None
+        if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 0x1:
+            frame_count = struct.unpack('>I', xing[8:12])[0]
+        elif vbri[:4] == b'VBRI':
+            frame_count = struct.unpack('>I', vbri[14:18])[0]
+
+        if frame_count:
+            duration = frame_count * frame['samples'] / frame['sample_rate']
+            estimated = False
+        else:
+            duration = (size - start - position) * 8 / frame['bitrate']
+            estimated = True
+        return ProbeResult('mp3', duration, frame['sample_rate'], frame['channels'],
+                           codec=f"mp{frame['layer']}", estimated=estimated)
+    raise ProbeError('No MPEG audio frame found')
+
+
+# ADTS AAC
+
+ADTS_SAMPLE_RATES = [96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350]
+
+
+def _probe_adts(stream, size, start):
+    # Average the first frames' sizes to estimate the bitrate
+    data = _read_at(stream, start, HEAD_BYTES)
+    position, frames, frame_bytes = 0, 0, 0
+    sample_rate = channels = None
+    while position + 7 <= len(data) and frames < 64:
+        header = data[position:position + 7]
+        if header[0] != 0xFF or header[1] & 0xF6 != 0xF0:
+            break
+        rate_index = (header[2] >> 2) & 0xF
+        if rate_index >= len(ADTS_SAMPLE_RATES):
+            raise ProbeError('Invalid ADTS sample rate')
+        sample_rate = ADTS_SAMPLE_RATES[rate_index]
+        channels = ((header[2] & 0x1) << 2) | (header[3] >> 6)
+        length = ((header[3] & 0x3) << 11) | (header[4] << 3) | (header[5] >> 5)
+        if length < 7:
+            raise ProbeError('Corrupt ADTS frame')
+        frames += 1
+        frame_bytes += length
+        position += length
+
+    if not frames:
+        raise ProbeError('No ADTS frame found')
+    bytes_per_second = frame_bytes / (frames * 1024 / sample_rate)
+    return ProbeResult('aac', (size - start) / bytes_per_second, sample_rate, channels or None,
+                       codec='aac', estimated=True)
+
+
+# MP4 / M4A
+
+def _boxes(data, offset=0, end=None):
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack('>I4s', data[offset:offset + 8])
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', data[offset + 8:offset + 16])[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header:
+            raise ProbeError('Corrupt MP4 box')
+        yield box_type, offset + header, min(offset + box_size, end)
+        offset += box_size
+
+
+def _find_moov(stream, size):
+    offset = 0
+    while offset + 8 <= size:
+        header = _read_at(stream, offset, 16)
+        box_size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < header_size:
+            raise ProbeError('Corrupt MP4 box')
+        if box_type == b'moov':
+            if box_size > MAX_MOOV_BYTES:
+                raise ProbeError('MP4 moov box too large')
+            return _read_at(stream, offset + header_size, box_size - header_size)
+        offset += box_size
+    raise ProbeError('MP4 file has no moov box')
+
+
+def _probe_mp4(stream, size):
+    moov = _find_moov(stream, size)
+    duration = None
+    audio = None
+    has_video = False
+
+    for box_type, start, end in _boxes(moov):
+        if box_type == b'mvhd':
+            version = moov[start]
+            if version == 1:
+                timescale, movie_duration = struct.unpack('>IQ', moov[start + 20:start + 32])
+            else:
+                timescale, movie_duration = struct.unpack('>II', moov[start + 12:start + 20])
+            if timescale:
+                duration = movie_duration / timescale
+        elif box_type == b'trak':
+            handler, track = None, {}
+            for mdia_type, mdia_start, mdia_end in _boxes(moov, start, end):
+                if mdia_type != b'mdia':
+                    continue
+                for child_type, child_start, child_end in _boxes(moov, mdia_start, mdia_end):
+                    if child_type == b'hdlr':
+                        handler = moov[child_start + 8:child_start + 12]
+                    elif child_type == b'mdhd':
+                        version = moov[child_start]
+                        if version == 1:
+                            scale, length = struct.unpack('>IQ', moov[child_start + 20:child_start + 32])
+                        else:
+                            scale, length = struct.unpack('>II', moov[child_start + 12:child_start + 20])
+                        track['duration'] = length / scale if scale else None
+                    elif child_type == b'minf':
+                        track.update(_mp4_sample_entry(moov, child_start, child_end))
+            if handler == b'vide':
+                has_video = True
+            elif handler == b'soun' and audio is None:
+                audio = track
+
+    if audio is None:
+        raise ProbeError('MP4 file has no audio track')
+    duration = audio.get('duration') or duration
+    if duration is None:
+        raise ProbeError('MP4 file has no duration')
+    return ProbeResult('mp4', duration, audio.get('sample_rate'), audio.get('channels'),
+                       codec=audio.get('codec'), has_video=has_video)
+
+
+def _mp4_sample_entry(data, start, end):
+    for box_type, box_start, box_end in _boxes(data, start, end):
+        if box_type == b'stbl':
+            return _mp4_sample_entry(data, box_start, box_end)
+        if box_type == b'stsd':
+            # Full box header (4) + entry count (4), then the first AudioSampleEntry
+            entry_start = box_start + 8
+            entry_type = data[entry_start + 4:entry_start + 8]
+            body = entry_start + 8
+            channels, = struct.unpack('>H', data[body + 16:body + 18])
+            sample_rate = struct.unpack('>I', data[body + 24:body + 28])[0] >> 16
+            return {'codec': entry_type.decode('latin-1').strip(), 'channels': channels,
+                    'sample_rate': sample_rate}
+    return {}
+
+
+# WebM / Matroska
+
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TRACKS = 0x1654AE6B
+EBML_CLUSTER = 0x1F43B675
+EBML_UNKNOWN_SIZE = -1
+
+
+def _read_vint(data, offset, keep_marker):
+    if offset >= len(data):
+        raise ProbeError('Truncated EBML element')
+    first = data[offset]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise ProbeError('Invalid EBML variable-length integer')
+    value = first if keep_marker else first & (0xFF >> length)
+    all_ones = value == (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if not keep_marker and all_ones:
+        value = EBML_UNKNOWN_SIZE
+    return value, offset + length
+
+
+def _ebml_elements(data, offset, end):
+    while offset < end:
+        element_id, offset = _read_vint(data, offset, keep_marker=True)
+        element_size, offset = _read_vint(data, offset, keep_marker=False)
+        element_end = end if element_size == EBML_UNKNOWN_SIZE else min(offset + element_size, end)
+        yield element_id, offset, element_end, element_size
+        if element_id == EBML_CLUSTER:
+            return
+        offset = element_end
+
+
+def _ebml_uint(data, start, end):
+    return int.from_bytes(data[start:end], 'big')
+
+
+def _ebml_float(data, start, end):
+    return struct.unpack('>f' if end - start == 4 else '>d', data[start:end])[0]
+
+
+def _probe_matroska(stream, head, size):
+    header_id, offset = _read_vint(head, 0, keep_marker=True)
+    header_size, offset = _read_vint(head, offset, keep_marker=False)
+    doc_type = 'webm' if b'webm' in head[offset:offset + header_size] else 'matroska'
+    offset += header_size
+
+    segment_id, segment_start = _read_vint(head, offset, keep_marker=True)
+    if segment_id != EBML_SEGMENT:
+        raise ProbeError('Matroska file has no Segment')
+    _, segment_start = _read_vint(head, segment_start, keep_marker=False)
+
+    timecode_scale, duration_ticks = 1000000, None
+    sample_rate = channels = codec = None
+    has_video = has_audio = False
+
+    for element_id, start, end, element_size in _ebml_elements(head, segment_start, len(head)):
+        if element_id == EBML_INFO:
+            for child_id, child_start, child_end, _ in _ebml_elements(head, start, end):
+                if child_id == 0x2AD7B1:
+                    timecode_scale = _ebml_uint(head, child_start, child_end)
+                elif child_id == 0x4489:
+                    duration_ticks = _ebml_float(head, child_start, child_end)
+        elif element_id == EBML_TRACKS:
+            for entry_id, entry_start, entry_end, _ in _ebml_elements(head, start, end):
+                if entry_id != 0xAE:
+                    continue
+                track = {}
+                for child_id, child_start, child_end, _ in _ebml_elements(head, entry_start, entry_end):
+                    if child_id == 0x83:
+                        track['type'] = _ebml_uint(head, child_start, child_end)
+                    elif child_id == 0x86:
+                        track['codec'] = head[child_start:child_end].decode('latin-1')
+                    elif child_id == 0xE1:
+                        for audio_id, audio_start, audio_end, _ in _ebml_elements(head, child_start, child_end):
+                            if audio_id == 0xB5:
+                                track['sample_rate'] = int(_ebml_float(head, audio_start, audio_end))
+                            elif audio_id == 0x9F:
+                                track['channels'] = _ebml_uint(head, audio_start, audio_end)
+                if track.get('type') == 1:
+                    has_video = True
+                elif track.get('type') == 2 and not has_audio:
+                    has_audio = True
+                    sample_rate = track.get('sample_rate')
+                    channels = track.get('channels', 1)
+                    codec = track.get('codec')
+        elif element_id == EBML_CLUSTER or end >= len(head):
+            break
+
+    if not has_audio:
+        raise ProbeError('Matroska file has no audio track')
+
+    estimated = False
+    if duration_ticks is not None:
+        duration = duration_ticks * timecode_scale / 1e9
+    else:
+        # MediaRecorder output has no Duration; use the last cluster's timecode instead
+        duration = _last_cluster_time(stream, size, timecode_scale)
+        estimated = True
+    return ProbeResult(doc_type, duration, sample_rate, channels, codec=codec,
+                       has_video=has_video, estimated=estimated)
+
+
+def _last_cluster_time(stream, size, timecode_scale):
+    tail_start = max(0, size - TAIL_BYTES)
+    tail = _read_at(stream, tail_start, size - tail_start)
+    position = tail.rfind(b'\x1f\x43\xb6\x75')
+    while position >= 0:
+        try:
+            _, child = _read_vint(tail, position + 4, keep_marker=False)
+            child_id, child = _read_vint(tail, child, keep_marker=True)
+            if child_id == 0xE7:
+                length, child = _read_vint(tail, child, keep_marker=False)
+                return _ebml_uint(tail, child, child + length) * timecode_scale / 1e9
+        except ProbeError:
+            pass
+        position = tail.rfind(b'\x1f\x43\xb6\x75', 0, position)
+    raise ProbeError('WebM file has neither a Duration nor a readable Cluster')
+
+
+# Entry points
+
+def probe_stream(stream):
+    """
+    Identify the container of an upload stream and read its audio parameters.
+
+    The stream position is restored afterwards. Raises ProbeError for unknown,
+    corrupt or video-only inputs.
+
+    Returns:
+        ProbeResult: format, duration (seconds), sample_rate, channels, codec, has_video
+    """
+    position = stream.tell()
+    try:
+        size = _size(stream)
+        head = _read_at(stream, 0, HEAD_BYTES)
+        if len(head) < 12:
+            raise ProbeError('File is too small to be audio')
+
+        if head[:4] in (b'RIFF', b'RF64') and head[8:12] == b'WAVE':
+            return _probe_wav(stream, head, size)
+        if head[:4] == b'OggS':
+            return _probe_ogg(stream, head, size)
+        if head[:4] == b'\x1a\x45\xdf\xa3':
+            return _probe_matroska(stream, head, size)
+        if head[4:8] == b'ftyp':
+            return _probe_mp4(stream, size)
+
+        start = _skip_id3(stream, head)
+        tagged = _read_at(stream, start, 4)
+        if tagged == b'fLaC':
+            return _probe_flac(stream, head, start, size)
+        if len(tagged) >= 2 and tagged[0] == 0xFF and tagged[1] & 0xF6 == 0xF0:
+            return _probe_adts(stream, size, start)
+        return _probe_mp3(stream, size, start)
+    except (struct.error, IndexError, ValueError) as parse_error:
+        raise ProbeError(f'Corrupt header: {parse_error}')
+    finally:
+        stream.seek(position)
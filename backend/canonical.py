@@ -0,0 +1,161 @@
+"""
+Canonical 16 kHz mono FLAC renditions of uploaded audio.
+
+On ingest the upload is decoded and resampled once, then stored next to the
+original in GridFS as 16-bit FLAC. The original's file document links to it
+through `canonical_id`. Later re-analysis reads the canonical copy with
+libsndfile's lossless decoder at the model rate, so it skips the
+codec-specific decode and the resampler, and storage grows predictably
+(about 0.5-1 MB per minute). `python backend/canonical.py` backfills renditions
+for files stored before this existed, in parallel.
+"""
+import argparse
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+CANONICAL_SAMPLE_RATE = 16000
+CANONICAL_CONTENT_TYPE = 'audio/flac'
+
+
+def encode_flac(waveform, sr=CANONICAL_SAMPLE_RATE):
+    import soundfile as sf
+
+    buffer = io.BytesIO()
+    sf.write(buffer, np.clip(waveform, -1.0, 1.0), sr, format='FLAC', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def transcode(audio_bytes):
+    """
+    Decode any supported upload to the canonical rendition.
+
+    Returns:
+        tuple: (flac bytes, mono float32 waveform at CANONICAL_SAMPLE_RATE)
+    """
+    import librosa
+
+    waveform, _ = librosa.load(io.BytesIO(audio_bytes), sr=CANONICAL_SAMPLE_RATE, mono=True)
+    return encode_flac(waveform), waveform
+
+
+def decode_canonical(flac_bytes, target_sr=CANONICAL_SAMPLE_RATE):
+    """Lossless decode of a canonical rendition; resamples only if the model rate differs."""
+    import soundfile as sf
+
+    waveform, sr = sf.read(io.BytesIO(flac_bytes), dtype='float32', always_2d=False)
+    if waveform.ndim > 1:
+        waveform = waveform.mean(axis=1)
+    if sr != target_sr:
+        import librosa
+        waveform = librosa.resample(waveform, orig_sr=sr, target_sr=target_sr)
+    return waveform
+
+
+def store_canonical(fs, files_collection, original_id, flac_bytes, waveform, filename, **metadata):
+    """Save the rendition in GridFS and link it from the original's file document."""
+    canonical_id = fs.put(
+        flac_bytes,
+        filename=f"{os.path.splitext(filename)[0]}.flac",
+        content_type=CANONICAL_CONTENT_TYPE,
+        canonical_of=original_id,
+        sample_rate=CANONICAL_SAMPLE_RATE,
+        channels=1,
+        duration=round(len(waveform) / CANONICAL_SAMPLE_RATE, 3),
+        **metadata
+    )
+    files_collection.update_one({'_id': original_id}, {'$set': {'canonical_id': canonical_id}})
+    return canonical_id
+
+
+def load_waveform(fs, files_collection, file_id, target_sr=CANONICAL_SAMPLE_RATE):
+    """
+    Waveform of a stored upload at `target_sr`, read from its canonical rendition.
+    Files without one are decoded from the original, and the rendition is created on the way.
+    """
+    document = files_collection.find_one({'_id': file_id}, {'canonical_id': 1, 'filename': 1, 'user_id': 1})
+    if document is None:
+        raise FileNotFoundError(f"No stored file {file_id}")
+    if document.get('canonical_id'):
+        return decode_canonical(fs.get(document['canonical_id']).read(), target_sr)
+
+    flac_bytes, waveform = transcode(fs.get(file_id).read())
+    store_canonical(fs, files_collection, file_id, flac_bytes, waveform, document.get('filename') or str(file_id),
+                    user_id=document.get('user_id'))
+    if target_sr != CANONICAL_SAMPLE_RATE:
+        import librosa
+        waveform = librosa.resample(waveform, orig_sr=CANONICAL_SAMPLE_RATE, target_sr=target_sr)
+    return waveform
+
+
+# Backfill
+
+_worker = {}
+
+
+def _init_worker(mongodb_uri, db_name, collection_name):
+    # Each process needs its own client; pymongo clients are not fork-safe
+    from pymongo import MongoClient
+    from tiered_storage import storage_from_env
+
+    client = MongoClient(mongodb_uri)
+    _worker['fs'] = storage_from_env(client[db_name], collection_name)
+    _worker['files'] = client[db_name][f"{collection_name}.files"]
+
+
+def _backfill_one(file_id):
+    fs, files = _worker['fs'], _worker['files']
+    document = files.find_one({'_id': file_id})
+    if document is None or document.get('canonical_id'):
+        return file_id, 0
+    flac_bytes, waveform = transcode(fs.get(file_id).read())
+    store_canonical(fs, files, file_id, flac_bytes, waveform, document.get('filename') or str(file_id),
+                    user_id=document.get('user_id'))
+    return file_id, len(flac_bytes)
+
+
+def backfill(mongodb_uri, db_name, collection_name, workers=None, limit=0):
+    from pymongo import MongoClient
+
+    files = MongoClient(mongodb_uri)[db_name][f"{collection_name}.files"]
+    pending = [item['_id'] for item in files.find(
+        {'canonical_id': {'$exists': False}, 'canonical_of': {'$exists': False}}, {'_id': 1}
+    ).limit(limit)]
+    print(f"{len(pending)} files without a canonical rendition")
+
+    done = failed = stored = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(mongodb_uri, db_name, collection_name)) as pool:
+        futures = {pool.submit(_backfill_one, file_id): file_id for file_id in pending}
+        for future in as_completed(futures):
+            try:
+                _, size = future.result()
+                done += 1
+                stored += size
+            except Exception as transcode_error:
+                failed += 1
+                print(f"Error transcoding {futures[future]}: {transcode_error}")
+            if (done + failed) % 100 == 0:
+                print(f"{done + failed}/{len(pending)} processed")
+    print(f"Transcoded {done} files ({stored / 1e6:.1f} MB of FLAC), {failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill canonical 16 kHz mono FLAC renditions in GridFS")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--limit', type=int, default=0, help="process at most this many files (0 = all)")
+    args = parser.parse_args()
+
+    backfill(
+        os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:27017/voice_guard'),
+        os.getenv('MONGODB_DB_NAME', 'voice_guard'),
+        os.getenv('MONGODB_AUDIO_COLLECTION_NAME', 'audio_files'),
+        workers=args.workers,
+        limit=args.limit
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+Similarity index over classifier embeddings of previously analyzed clips.
+
+Small collections are searched exactly with one NumPy matrix product. Once the
+collection grows past a threshold it is re-encoded into an IVF/PQ index: a
+coarse k-means quantizer picks a few inverted lists per query, and residuals
+are stored as 8-bit product-quantization codes, so millions of vectors fit in
+memory and are scanned with table lookups.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _grow(buffer, needed):
+    """`buffer`, or a copy with room for `needed` rows; capacity doubles, so appends are amortized O(1)."""
+    if needed <= len(buffer):
+        return buffer
+    grown = np.empty((max(needed, 2 * len(buffer), 64),) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:len(buffer)] = buffer
+    return grown
+
+
+def kmeans(vectors, n_clusters, n_iter=20, seed=0):
+    """Plain Lloyd's k-means with k-means++ seeding on a bounded sample."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n_clusters = min(n_clusters, len(vectors))
+
+    centroids = [vectors[rng.integers(len(vectors))]]
+    closest = np.sum((vectors - centroids[0]) ** 2, axis=1)
+    for _ in range(1, n_clusters):
+        probabilities = closest / closest.sum() if closest.sum() > 0 else None
+        centroids.append(vectors[rng.choice(len(vectors), p=probabilities)])
+        closest = np.minimum(closest, np.sum((vectors - centroids[-1]) ** 2, axis=1))
+    centroids = np.stack(centroids)
+
+    for _ in range(n_iter):
+        assignment = _nearest(vectors, centroids)
+        for cluster in range(n_clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+    return centroids
+
+
+def _nearest(vectors, centroids):
+    # argmin ||v - c||^2 = argmin (||c||^2 - 2 v.c)
+    distances = np.sum(centroids ** 2, axis=1)[None, :] - 2.0 * vectors @ centroids.T
+    return np.argmin(distances, axis=1)
+
+
+class BruteForceIndex:
+    """Exact cosine search over normalized vectors."""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._buffer = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self):
+        return self._buffer[:self._size]
+
+    def add(self, vectors):
+        vectors = _normalize(vectors)
+        self._buffer = _grow(self._buffer, self._size + len(vectors))
+        self._buffer[self._size:self._size + len(vectors)] = vectors
+        self._size += len(vectors)
+
+    def search(self, queries, k):
+        queries = _normalize(queries)
+        if not len(self.vectors):
+            return np.empty((len(queries), 0)), np.empty((len(queries), 0), dtype=np.int64)
+        similarities = queries @ self.vectors.T
+        k = min(k, similarities.shape[1])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1)
+        ids = np.take_along_axis(top, order, axis=1)
+        return np.take_along_axis(similarities, ids, axis=1), ids
+
+    def arrays(self):
+        return {'vectors': self.vectors}
+
+    @classmethod
+    def from_arrays(cls, dim, arrays):
+        index = cls(dim)
+        index._buffer = arrays['vectors']
+        index._size = len(index._buffer)
+        return index
+
+
+class IVFPQIndex:
+    """Inverted-file index with product-quantized residuals (8 bits per sub-vector)."""
+
+    def __init__(self, dim, n_lists=256, n_subvectors=16, n_probe=8):
+        if dim % n_subvectors:
+            raise ValueError(f"Embedding size {dim} is not divisible into {n_subvectors} sub-vectors")
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_subvectors = n_subvectors
+        self.n_probe = n_probe
+        self.sub_dim = dim // n_subvectors
+        self.coarse = None                                         # (n_lists, dim)
+        self.codebooks = None                                      # (n_subvectors, 256, sub_dim)
+        self._codes = np.empty((0, n_subvectors), dtype=np.uint8)
+        self._list_ids = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._lists = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def codes(self):
+        return self._codes[:self._size]
+
+    @property
+    def list_ids(self):
+        return self._list_ids[:self._size]
+
+    def _inverted_lists(self):
+        # Vector ids grouped by list cover the first `indexed` vectors. Later additions are scanned
+        # directly and only trigger a re-sort once they outgrow a fraction of the index.
+        if self._lists is None or self._size - self._lists[2] > max(1024, self._size // 8):
+            order = np.argsort(self.list_ids, kind='stable')
+            bounds = np.searchsorted(self.list_ids[order], np.arange(self.n_lists + 1))
+            self._lists = (order, bounds, self._size)
+        return self._lists
+
+    def train(self, vectors, max_samples=100000):
+        vectors = _normalize(vectors)
+        rng = np.random.default_rng(0)
+        if len(vectors) > max_samples:
+            vectors = vectors[rng.choice(len(vectors), max_samples, replace=False)]
+
+        self.coarse = kmeans(vectors, self.n_lists)
+        self.n_lists = len(self.coarse)
+        residuals = vectors - self.coarse[_nearest(vectors, self.coarse)]
+        self.codebooks = np.stack([
+            kmeans(residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim], 256, n_iter=10, seed=m)
+            for m in range(self.n_subvectors)
+        ])
+
+    def _encode(self, residuals):
+        codes = np.empty((len(residuals), self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            chunk = residuals[:, m * self.sub_dim:(m + 1) * self.sub_dim]
+            codes[:, m] = _nearest(chunk, self.codebooks[m])
+        return codes
+
+    def add(self, vectors):
+        vectors = _normalize(vectors)
+        list_ids = _nearest(vectors, self.coarse).astype(np.int32)
+        end = self._size + len(vectors)
+        self._codes = _grow(self._codes, end)
+        self._list_ids = _grow(self._list_ids, end)
+        self._codes[self._size:end] = self._encode(vectors - self.coarse[list_ids])
+        self._list_ids[self._size:end] = list_ids
+        self._size = end
+
+    def search(self, queries, k):
+        queries = _normalize(queries)
+        all_similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+
+        probe_order = np.argsort(
+            np.sum(self.coarse ** 2, axis=1)[None, :] - 2.0 * queries @ self.coarse.T, axis=1
+        )[:, :self.n_probe]
+
+        order, bounds, indexed = self._inverted_lists()
+        recent_ids = np.arange(indexed, self._size)
+        recent_lists = self.list_ids[indexed:]
+        for row, query in enumerate(queries):
+            candidate_ids, candidate_distances = [], []
+            for list_id in probe_order[row]:
+                members = order[bounds[list_id]:bounds[list_id + 1]]
+                if recent_ids.size:
+                    members = np.concatenate([members, recent_ids[recent_lists == list_id]])
+                if not members.size:
+                    continue
+                # Asymmetric distance: per-sub-vector lookup tables for this list's residual
+                residual = (query - self.coarse[list_id]).reshape(self.n_subvectors, 1, self.sub_dim)
+                tables = np.sum((self.codebooks - residual) ** 2, axis=2)          # (M, 256)
+                codes = self.codes[members]
+                distances = tables[np.arange(self.n_subvectors), codes].sum(axis=1)
+                candidate_ids.append(members)
+                candidate_distances.append(distances)
+
+            if not candidate_ids:
+                continue
+            ids = np.concatenate(candidate_ids)
+            distances = np.concatenate(candidate_distances)
+            top = np.argsort(distances)[:k]
+            # Unit vectors: ||q - x||^2 = 2 - 2 cos(q, x)
+            all_similarities[row, :len(top)] = 1.0 - distances[top] / 2.0
+            all_ids[row, :len(top)] = ids[top]
+        return all_similarities, all_ids
+
+    def arrays(self):
+        return {'coarse': self.coarse, 'codebooks': self.codebooks, 'codes': self.codes,
+                'list_ids': self.list_ids}
+
+    @classmethod
+    def from_arrays(cls, dim, arrays):
+        index = cls(dim, n_lists=len(arrays['coarse']), n_subvectors=arrays['codes'].shape[1])
+        index.coarse = arrays['coarse']
+        index.codebooks = arrays['codebooks']
+        index._codes = arrays['codes']
+        index._list_ids = arrays['list_ids']
+        index._size = len(index._codes)
+        return index
+
+
+class EmbeddingIndex:
+    """
+    Known-clip index with metadata (hex code, filename, label, confidence, verified).
+    Starts exact and switches to IVF/PQ once it holds `ivf_threshold` vectors.
+    """
+
+    def __init__(self, dim=None, ivf_threshold=50000):
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold
+        self.backend = None
+        self.metadata = []
+        self._lock = threading.Lock()
+        self._converting = False
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def add(self, vector, metadata):
+        vector = _normalize(vector)
+        with self._lock:
+            if self.backend is None:
+                self.dim = vector.shape[1]
+                self.backend = BruteForceIndex(self.dim)
+            self.backend.add(vector)
+            self.metadata.append(dict(metadata))
+            self.dirty = True
+
+            if (isinstance(self.backend, BruteForceIndex) and not self._converting
+                    and len(self.backend) >= self.ivf_threshold):
+                # Training takes a while, so it runs off the request path
+                self._converting = True
+                threading.Thread(target=self._convert_to_ivf, args=(self.backend.vectors,), daemon=True).start()
+            return len(self.metadata) - 1
+
+    def _convert_to_ivf(self, snapshot):
+        ivf = IVFPQIndex(self.dim)
+        ivf.train(snapshot)
+        ivf.add(snapshot)
+        with self._lock:
+            added_since = self.backend.vectors[len(snapshot):]
+            if len(added_since):
+                ivf.add(added_since)
+            self.backend = ivf
+            self._converting = False
+            self.dirty = True
+
+    def search(self, vector, k=5):
+        """Nearest known clips as metadata dicts with a `similarity` field."""
+        with self._lock:
+            if self.backend is None or not len(self.metadata):
+                return []
+            similarities, ids = self.backend.search(vector, k)
+            return [
+                dict(self.metadata[int(item_id)], similarity=round(float(similarity), 4))
+                for similarity, item_id in zip(similarities[0], ids[0]) if item_id >= 0
+            ]
+
+    def known_label(self, hex_code):
+        """Verified label recorded for a verification code, if any."""
+        with self._lock:
+            for item in reversed(self.metadata):
+                if item.get('hex_code') == hex_code and item.get('verified'):
+                    return item.get('label')
+        return None
+
+    def set_label(self, hex_code, label, verified=True):
+        """Apply a reviewed label to every stored embedding of a verification code."""
+        updated = 0
+        with self._lock:
+            for item in self.metadata:
+                if item.get('hex_code') == hex_code:
+                    item['label'] = label
+                    item['verified'] = verified
+                    updated += 1
+            self.dirty = self.dirty or updated > 0
+        return updated
+
+    def save(self, path):
+        with self._lock:
+            if self.backend is None:
+                return
+            kind = 'ivfpq' if isinstance(self.backend, IVFPQIndex) else 'brute'
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(tmp_path, kind=np.array(kind), dim=np.array(self.dim),
+                     metadata=np.array(json.dumps(self.metadata)), **self.backend.arrays())
+            os.replace(tmp_path, path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path, ivf_threshold=50000):
+        index = cls(ivf_threshold=ivf_threshold)
+        with np.load(path, allow_pickle=False) as data:
+            index.dim = int(data['dim'])
+            index.metadata = json.loads(str(data['metadata']))
+            backend_cls = IVFPQIndex if str(data['kind']) == 'ivfpq' else BruteForceIndex
+            index.backend = backend_cls.from_arrays(index.dim, {name: data[name] for name in data.files})
+        return index
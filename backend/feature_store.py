@@ -0,0 +1,354 @@
+"""
+Persistent feature store for scoring stored uploads without decoding them again.
+
+Every feature kind has its own append-only binary file of fixed-width rows:
+- `summary`: log-mel band means and standard deviations of the canonical waveform (float16)
+- `handcrafted`: the 26 features the sklearn models are trained on (float32)
+- `embedding:<model id>`: mean-pooled transformer hidden states (float16)
+
+Each kind's file is opened as a read-only memory map. A JSON index maps a
+content key (the upload's SHA-256, or its file id for files stored before
+hashing) to a row, and each file id to its content key, so duplicate uploads
+share their rows. Models are registered with the feature kind they consume and
+score the whole backlog as one matrix:
+
+    python backend/feature_store.py build --workers 8 --embeddings
+    python backend/feature_store.py score --artifact model.joblib --output scores.csv
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+INDEX_VERSION = 1
+SUMMARY_MELS = 64
+EMBEDDING_SECONDS = 30.0
+
+# Handcrafted features are computed by the ML tooling the models were trained with
+ML_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ML', 'New')
+
+
+def summary_features(waveform, sr):
+    """Log-mel band means and standard deviations over the clip, shape (2 * SUMMARY_MELS,)."""
+    import librosa
+
+    mel = librosa.feature.melspectrogram(y=np.asarray(waveform, dtype=np.float32), sr=sr, n_mels=SUMMARY_MELS)
+    log_mel = np.log(mel + 1e-10)
+    return np.concatenate([log_mel.mean(axis=1), log_mel.std(axis=1)])
+
+
+def handcrafted_features(waveform, sr):
+    """The 26 training features, from the clip's first FEATURE_SPEC['duration'] seconds."""
+    import librosa
+
+    if ML_DIR not in sys.path:
+        sys.path.insert(0, ML_DIR)
+    from batch_features import batch_extract_features
+    from inference_pipeline import FEATURE_SPEC
+
+    clip = librosa.resample(np.asarray(waveform[:int(FEATURE_SPEC['duration'] * sr)], dtype=np.float32),
+                            orig_sr=sr, target_sr=FEATURE_SPEC['sr'])
+    return batch_extract_features([clip], sr=FEATURE_SPEC['sr'])[0]
+
+
+class FeatureStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.kinds = {}         # kind -> {'dim', 'dtype', 'rows': {content key: row}}
+        self.files = {}         # file id -> content key
+        self._lock = threading.Lock()
+        self._maps = {}
+        os.makedirs(directory, exist_ok=True)
+
+        index_path = os.path.join(directory, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            if index.get('version') != INDEX_VERSION:
+                raise ValueError(f"{index_path} is not a version {INDEX_VERSION} feature index")
+            self.kinds, self.files = index['kinds'], index['files']
+            self._reconcile()
+
+    def _row_bytes(self, spec):
+        return spec['dim'] * np.dtype(spec['dtype']).itemsize
+
+    def _reconcile(self):
+        """
+        Make every data file match the index after a crash between appending rows and saving the index.
+        Rows written after the last save are cut off (their files are featurized again), and index
+        entries pointing past the end of a data file are dropped.
+        """
+        for kind, spec in self.kinds.items():
+            path = self._data_path(kind)
+            available = os.path.getsize(path) // self._row_bytes(spec) if os.path.exists(path) else 0
+            rows = spec['rows']
+            if len(rows) > available:
+                spec['rows'] = rows = {key: row for key, row in rows.items() if row < available}
+                print(f"Feature store: dropped index entries past the end of {path}")
+            indexed = max(rows.values(), default=-1) + 1
+            if os.path.exists(path) and os.path.getsize(path) != indexed * self._row_bytes(spec):
+                with open(path, 'r+b') as file:
+                    file.truncate(indexed * self._row_bytes(spec))
+
+    def _data_path(self, kind):
+        return os.path.join(self.directory, f"{kind.replace(':', '__').replace('/', '_')}.bin")
+
+    def has(self, kind, file_id):
+        key = self.files.get(str(file_id))
+        return key is not None and key in self.kinds.get(kind, {}).get('rows', {})
+
+    def put(self, file_id, content_key, kind, vector, dtype='float32'):
+        """Append one row; a content key already stored for this kind is only linked, not rewritten."""
+        vector = np.asarray(vector, dtype=dtype).ravel()
+        with self._lock:
+            spec = self.kinds.setdefault(kind, {'dim': int(vector.size), 'dtype': dtype, 'rows': {}})
+            if vector.size != spec['dim'] or dtype != spec['dtype']:
+                raise ValueError(f"{kind} rows are {spec['dim']} x {spec['dtype']}, got {vector.size} x {dtype}")
+            self.files[str(file_id)] = content_key
+            if content_key not in spec['rows']:
+                path = self._data_path(kind)
+                with open(path, 'ab') as file:
+                    file.write(vector.tobytes())
+                    # The row number comes from the file itself, so it always points at what was written
+                    row = file.tell() // self._row_bytes(spec) - 1
+                spec['rows'][content_key] = row
+                self._maps.pop(kind, None)
+
+    def save(self):
+        """Sync the data files, then atomically replace the index, so the index never references unwritten rows."""
+        with self._lock:
+            for kind in self.kinds:
+                if os.path.exists(self._data_path(kind)):
+                    with open(self._data_path(kind), 'rb') as file:
+                        os.fsync(file.fileno())
+            path = os.path.join(self.directory, 'index.json')
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': INDEX_VERSION, 'kinds': self.kinds, 'files': self.files}, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+
+    def matrix(self, kind):
+        """All rows of a kind as a read-only memory map, shape (rows, dim)."""
+        with self._lock:
+            if kind not in self._maps:
+                spec = self.kinds[kind]
+                self._maps[kind] = np.memmap(self._data_path(kind), dtype=spec['dtype'], mode='r',
+                                             shape=(max(spec['rows'].values(), default=-1) + 1, spec['dim']))
+            return self._maps[kind]
+
+    def get(self, kind, file_id):
+        key = self.files.get(str(file_id))
+        row = self.kinds.get(kind, {}).get('rows', {}).get(key)
+        return None if row is None else np.asarray(self.matrix(kind)[row])
+
+    def rows_for_files(self, kind):
+        """(file ids, feature matrix) for every file with a row of this kind."""
+        rows = self.kinds.get(kind, {}).get('rows', {})
+        file_ids = [file_id for file_id, key in self.files.items() if key in rows]
+        if not file_ids:
+            return [], np.empty((0, self.kinds.get(kind, {}).get('dim', 0)), dtype=np.float32)
+        return file_ids, self.matrix(kind)[[rows[self.files[file_id]] for file_id in file_ids]]
+
+
+# Model registry: name -> (feature kind, scorer taking a feature matrix and returning (labels, confidences))
+
+MODELS = {}
+
+
+def register_model(name, kind, scorer):
+    MODELS[name] = (kind, scorer)
+
+
+def register_artifact(path, name=None):
+    """Register a single-file sklearn inference artifact (ML/New/inference_pipeline.py) on handcrafted features."""
+    if ML_DIR not in sys.path:
+        sys.path.insert(0, ML_DIR)
+    from inference_pipeline import load_artifact, predict_features
+
+    artifact = load_artifact(path)
+
+    def scorer(features):
+        results = predict_features(artifact, features)
+        return results['label'].tolist(), results['confidence'].to_numpy()
+
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    register_model(name, 'handcrafted', scorer)
+    return name
+
+
+def score(store, model_name):
+    """
+    Score every stored file that has the model's feature kind.
+
+    Returns:
+        list[dict]: file_id, label, confidence
+    """
+    kind, scorer = MODELS[model_name]
+    file_ids, features = store.rows_for_files(kind)
+    if not file_ids:
+        return []
+    labels, confidences = scorer(np.asarray(features, dtype=np.float32))
+    return [{'file_id': file_id, 'label': label, 'confidence': float(confidence)}
+            for file_id, label, confidence in zip(file_ids, labels, confidences)]
+
+
+# Building the store from GridFS
+
+_worker = {}
+
+
+def _init_worker(mongodb_uri, db_name, collection_name):
+    from pymongo import MongoClient
+    from tiered_storage import storage_from_env
+
+    client = MongoClient(mongodb_uri)
+    _worker['fs'] = storage_from_env(client[db_name], collection_name)
+    _worker['files'] = client[db_name][f"{collection_name}.files"]
+
+
+def _decode_and_featurize(file_id, sr, keep_waveform):
+    from canonical import load_waveform
+
+    waveform = load_waveform(_worker['fs'], _worker['files'], file_id, sr)
+    # The waveform only travels back to the parent when it is needed for embeddings
+    head = waveform[:int(EMBEDDING_SECONDS * sr)] if keep_waveform else None
+    return file_id, head, summary_features(waveform, sr), handcrafted_features(waveform, sr)
+
+
+def build(store, mongodb_uri, db_name, collection_name, workers=None, limit=0, model_id=None, batch_size=8):
+    """
+    Decode and featurize every original upload missing from the store, in parallel processes.
+    With `model_id`, transformer embeddings are computed too, batched in this process.
+    """
+    from pymongo import MongoClient
+
+    from canonical import CANONICAL_SAMPLE_RATE
+
+    database = MongoClient(mongodb_uri)[db_name]
+    embedding_kind = f"embedding:{model_id}" if model_id else None
+    content_keys = {entry['_id']: entry.get('sha256') for entry in
+                    database[f"{collection_name}.tiers"].find({}, {'sha256': 1})}
+    pending = [
+        document['_id'] for document in
+        database[f"{collection_name}.files"].find({'canonical_of': {'$exists': False}}, {'_id': 1}).limit(limit)
+        if not store.has('handcrafted', document['_id'])
+        or (embedding_kind and not store.has(embedding_kind, document['_id']))
+    ]
+    print(f"{len(pending)} files to featurize")
+
+    classifier = None
+    if model_id:
+        from transformers import pipeline
+        classifier = pipeline("audio-classification", model=model_id)
+        if getattr(classifier.feature_extractor, 'sampling_rate', CANONICAL_SAMPLE_RATE) != CANONICAL_SAMPLE_RATE:
+            raise ValueError(f"{model_id} does not take {CANONICAL_SAMPLE_RATE} Hz input")
+
+    batch = []
+
+    def flush_embeddings():
+        from inference import classify_waveforms
+
+        if batch:
+            _, embeddings = classify_waveforms(classifier, [waveform for _, _, waveform in batch],
+                                               CANONICAL_SAMPLE_RATE)
+            for (file_id, key, _), embedding in zip(batch, embeddings):
+                store.put(file_id, key, embedding_kind, embedding, dtype='float16')
+            batch.clear()
+
+    done = failed = 0
+    # Spawned workers: forking after torch has started its thread pools can deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn'), initializer=_init_worker,
+                             initargs=(mongodb_uri, db_name, collection_name)) as pool:
+        # Keep a bounded number of files in flight so decoded results do not pile up in memory
+        window = 4 * (workers or os.cpu_count() or 1)
+        remaining = iter(pending)
+        in_flight = deque()
+        while True:
+            for file_id in remaining:
+                in_flight.append(pool.submit(_decode_and_featurize, file_id, CANONICAL_SAMPLE_RATE,
+                                             classifier is not None))
+                if len(in_flight) >= window:
+                    break
+            if not in_flight:
+                break
+            try:
+                file_id, waveform, summary, handcrafted = in_flight.popleft().result()
+            except Exception as featurize_error:
+                failed += 1
+                print(f"Error featurizing: {featurize_error}")
+                continue
+            key = content_keys.get(file_id) or str(file_id)
+            store.put(file_id, key, 'summary', summary, dtype='float16')
+            store.put(file_id, key, 'handcrafted', handcrafted)
+            if classifier is not None:
+                batch.append((file_id, key, waveform))
+                if len(batch) >= batch_size:
+                    flush_embeddings()
+            done += 1
+            if done % 100 == 0:
+                store.save()        # resumable: featurized files are skipped on the next run
+                print(f"{done + failed}/{len(pending)} processed")
+        if classifier is not None:
+            flush_embeddings()
+    store.save()
+    print(f"Featurized {done} files, {failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the feature store and score stored uploads from it")
+    parser.add_argument('--store', default=os.getenv('FEATURE_STORE_DIR', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'feature_store')))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build')
+    build_parser.add_argument('--workers', type=int, default=None)
+    build_parser.add_argument('--limit', type=int, default=0)
+    build_parser.add_argument('--embeddings', action='store_true',
+                              help="also store embeddings of DEEPFAKE_MODEL_ID")
+    build_parser.add_argument('--batch-size', type=int, default=8)
+
+    score_parser = subparsers.add_parser('score')
+    score_parser.add_argument('--artifact', required=True, help="sklearn inference artifact to register and run")
+    score_parser.add_argument('--output', default=None, help="CSV path (default: print a label count)")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store)
+    if args.command == 'build':
+        build(
+            store,
+            os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:27017/voice_guard'),
+            os.getenv('MONGODB_DB_NAME', 'voice_guard'),
+            os.getenv('MONGODB_AUDIO_COLLECTION_NAME', 'audio_files'),
+            workers=args.workers,
+            limit=args.limit,
+            model_id=os.getenv('DEEPFAKE_MODEL_ID', 'MelodyMachine/Deepfake-audio-detection-V2')
+            if args.embeddings else None,
+            batch_size=args.batch_size
+        )
+        return
+
+    results = score(store, register_artifact(args.artifact))
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=['file_id', 'label', 'confidence'])
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Scored {len(results)} files -> {args.output}")
+    else:
+        counts = {}
+        for result in results:
+            counts[result['label']] = counts.get(result['label'], 0) + 1
+        print(f"Scored {len(results)} files: {counts}")
+
+
+if __name__ == '__main__':
+    main()
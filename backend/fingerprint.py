@@ -0,0 +1,337 @@
+"""
+Landmark (spectral peak pair) audio fingerprinting with an inverted hash index.
+
+A clip is reduced to constellation peaks of its log spectrogram. Nearby peaks are
+paired into 24-bit hashes (anchor bin, target bin, time delta) that survive
+re-encoding, resampling and trimming. The index keeps every hash sorted in flat
+arrays, so a lookup costs one vectorized searchsorted over the query hashes no
+matter how many clips are registered.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from scipy.ndimage import maximum_filter
+
+FINGERPRINT_SAMPLE_RATE = 8000
+N_FFT = 512
+HOP_LENGTH = 256
+PEAK_NEIGHBORHOOD = (15, 15)   # (time frames, frequency bins)
+PEAKS_PER_SECOND = 30
+FAN_OUT = 5
+MAX_DELTA_FRAMES = 63          # fits in 6 bits
+MIN_MATCHES = 12
+COMPACT_THRESHOLD = 200000     # hashes registered since the last merge before a background merge
+
+
+def compute_hashes(waveform, sr=FINGERPRINT_SAMPLE_RATE):
+    """
+    Return (hashes, anchor_frames) for a mono waveform sampled at FINGERPRINT_SAMPLE_RATE
+    """
+    if sr != FINGERPRINT_SAMPLE_RATE:
+        import librosa
+        waveform = librosa.resample(np.asarray(waveform, dtype=np.float32), orig_sr=sr,
+                                    target_sr=FINGERPRINT_SAMPLE_RATE)
+
+    waveform = np.asarray(waveform, dtype=np.float32)
+    if len(waveform) < N_FFT:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+
+    # Log-magnitude spectrogram, shape (frames, bins)
+    frames = np.lib.stride_tricks.sliding_window_view(waveform, N_FFT)[::HOP_LENGTH]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(N_FFT).astype(np.float32), axis=-1))
+    log_spec = np.log(spectrum + 1e-6)
+
+    # Constellation: local maxima that stand out from the clip's background level
+    is_peak = (log_spec == maximum_filter(log_spec, size=PEAK_NEIGHBORHOOD)) & \
+              (log_spec > np.median(log_spec) + 2.0)
+    peak_times, peak_bins = np.nonzero(is_peak)
+    if peak_times.size < 2:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+
+    # Keep the strongest peaks so dense passages do not flood the index
+    duration = len(waveform) / FINGERPRINT_SAMPLE_RATE
+    max_peaks = max(2, int(duration * PEAKS_PER_SECOND))
+    if peak_times.size > max_peaks:
+        strongest = np.argpartition(log_spec[peak_times, peak_bins], -max_peaks)[-max_peaks:]
+        peak_times, peak_bins = peak_times[strongest], peak_bins[strongest]
+    order = np.lexsort((peak_bins, peak_times))
+    peak_times, peak_bins = peak_times[order], peak_bins[order]
+
+    # Pair each anchor with the next FAN_OUT peaks in time order
+    hashes, anchors = [], []
+    for step in range(1, FAN_OUT + 1):
+        anchor_t, target_t = peak_times[:-step], peak_times[step:]
+        delta = target_t - anchor_t
+        valid = (delta > 0) & (delta <= MAX_DELTA_FRAMES)
+        hashes.append((peak_bins[:-step][valid].astype(np.uint32) << 15)
+                      | (peak_bins[step:][valid].astype(np.uint32) << 6)
+                      | delta[valid].astype(np.uint32))
+        anchors.append(anchor_t[valid].astype(np.uint32))
+
+    return np.concatenate(hashes), np.concatenate(anchors)
+
+
+def _empty_segment():
+    empty = np.empty(0, dtype=np.uint32)
+    return empty, empty, empty
+
+
+def _sort_segment(hashes, track_ids, times):
+    order = np.argsort(hashes, kind='stable')
+    return hashes[order], track_ids[order], times[order]
+
+
+def _merge_segments(big, small):
+    """Merge a small sorted (hashes, track_ids, times) segment into a big one in O(len(big))."""
+    positions = np.searchsorted(big[0], small[0], side='right')
+    return tuple(np.insert(column, positions, values) for column, values in zip(big, small))
+
+
+def _postings(segment, hashes, anchor_frames):
+    """(track ids, time offsets) of every (query hash -> posting) pair in one sorted segment."""
+    db_hashes, db_tracks, db_times = segment
+    starts = np.searchsorted(db_hashes, hashes, side='left')
+    ends = np.searchsorted(db_hashes, hashes, side='right')
+    counts = ends - starts
+    if counts.sum() == 0:
+        return None
+
+    # Expand every pair without a Python loop
+    query_idx = np.repeat(np.arange(hashes.size), counts)
+    postings = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    return (db_tracks[postings].astype(np.int64),
+            db_times[postings].astype(np.int64) - anchor_frames[query_idx])
+
+
+def shard_paths(path):
+    """Per-process shards saved next to the base index file."""
+    return sorted(glob.glob(f"{glob.escape(path)}.*.npz"))
+
+
+class FingerprintIndex:
+    """
+    Inverted hash index over registered clips.
+
+    New clips go to a small sorted delta that queries search next to the main
+    arrays. Once the delta holds `compact_threshold` hashes it is merged into the
+    main arrays in a background thread, so registering a clip on the request
+    path never re-sorts the whole index. The CLI writes the base .npz file; each
+    API process saves the clips it registered to its own `<path>.<pid>.npz` shard,
+    and loading merges the base file with every shard.
+    """
+
+    def __init__(self, compact_threshold=COMPACT_THRESHOLD):
+        self.tracks = []   # [{'hex_code': ..., 'name': ...}]
+        self.compact_threshold = compact_threshold
+        self._main = _empty_segment()
+        self._merging = None            # former delta being merged into the main arrays
+        self._delta = _empty_segment()
+        self._pending = []
+        self._own_start = 0             # tracks from here on were registered by this process
+        self._shard_claimed = False
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def add(self, hashes, anchor_frames, hex_code, name=None):
+        """
+        Register a clip's hashes under its verification code
+        """
+        with self._lock:
+            track_id = len(self.tracks)
+            self.tracks.append({'hex_code': hex_code, 'name': name})
+            self._pending.append((np.asarray(hashes, dtype=np.uint32),
+                                  np.full(len(hashes), track_id, dtype=np.uint32),
+                                  np.asarray(anchor_frames, dtype=np.uint32)))
+            self.dirty = True
+            return track_id
+
+    def _flush_pending(self):
+        # Sort pending registrations into the delta (caller holds the lock); only the delta is re-sorted
+        if not self._pending:
+            return
+        self._delta = _sort_segment(*(np.concatenate([column] + [item[i] for item in self._pending])
+                                      for i, column in enumerate(self._delta)))
+        self._pending = []
+        if self._merging is None and self._delta[0].size >= self.compact_threshold:
+            self._merging, self._delta = self._delta, _empty_segment()
+            threading.Thread(target=self._compact, name='fingerprint-compact', daemon=True).start()
+
+    def _compact(self):
+        # Only this thread replaces the main arrays, so they can be merged outside the lock
+        merged = _merge_segments(self._main, self._merging)
+        with self._lock:
+            self._main, self._merging = merged, None
+
+    def _segments(self):
+        with self._lock:
+            self._flush_pending()
+            return [segment for segment in (self._main, self._merging, self._delta) if segment is not None]
+
+    def query(self, hashes, anchor_frames, min_matches=MIN_MATCHES):
+        """
+        Find the registered clip whose hashes line up with the query at a consistent time offset.
+        Returns {'hex_code', 'name', 'matches', 'offset_seconds'} or None.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        anchor_frames = np.asarray(anchor_frames, dtype=np.int64)
+        if hashes.size == 0:
+            return None
+
+        pairs = [found for found in (_postings(segment, hashes, anchor_frames) for segment in self._segments())
+                 if found is not None]
+        if not pairs:
+            return None
+        tracks = np.concatenate([found[0] for found in pairs])
+        offsets = np.concatenate([found[1] for found in pairs])
+
+        # Vote on (track, offset); true matches pile up on a single offset
+        keys, votes = np.unique(tracks * (1 << 32) + (offsets + (1 << 31)), return_counts=True)
+        best = np.argmax(votes)
+        if votes[best] < min_matches:
+            return None
+
+        track_id = int(keys[best] >> 32)
+        offset_frames = int(keys[best] & 0xFFFFFFFF) - (1 << 31)
+        track = self.tracks[track_id]
+        return {
+            'hex_code': track['hex_code'],
+            'name': track['name'],
+            'matches': int(votes[best]),
+            'offset_seconds': round(offset_frames * HOP_LENGTH / FINGERPRINT_SAMPLE_RATE, 3),
+        }
+
+    def _snapshot(self, first_track):
+        # Sorted arrays and track list of the tracks from `first_track` on, with ids rebased to 0
+        with self._lock:
+            self._flush_pending()
+            segments = [segment for segment in (self._main, self._merging, self._delta) if segment is not None]
+            tracks = self.tracks[first_track:]
+            self.dirty = False
+        hashes, track_ids, times = (np.concatenate(columns) for columns in zip(*segments))
+        keep = track_ids >= first_track
+        return _sort_segment(hashes[keep], track_ids[keep] - first_track, times[keep]), tracks
+
+    @staticmethod
+    def _write(path, segment, tracks):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, hashes=segment[0], track_ids=segment[1], times=segment[2],
+                     tracks=np.array(json.dumps(tracks)))
+        os.replace(tmp_path, path)
+
+    def save(self, path):
+        """Write the whole index as a base file (CLI builds)."""
+        try:
+            self._write(path, *self._snapshot(0))
+        except Exception:
+            self.dirty = True
+            raise
+
+    def save_shard(self, path):
+        """Write the clips this process registered to its own shard of the index at `path`."""
+        shard_path = f"{path}.{os.getpid()}.npz"
+        if not self._shard_claimed:
+            # A shard with our pid was left by an earlier process; it was loaded, so keep it aside
+            if os.path.exists(shard_path):
+                os.replace(shard_path, f"{path}.{os.getpid()}-{time.time_ns()}.npz")
+            self._shard_claimed = True
+        try:
+            self._write(shard_path, *self._snapshot(self._own_start))
+        except Exception:
+            self.dirty = True
+            raise
+
+    @classmethod
+    def load(cls, path, shards=True):
+        """The base file at `path` (if any) merged with every shard next to it."""
+        index = cls()
+        files = ([path] if os.path.exists(path) else []) + (shard_paths(path) if shards else [])
+
+        columns = ([], [], [])
+        for file_path in files:
+            with np.load(file_path, allow_pickle=False) as data:
+                columns[0].append(data['hashes'])
+                columns[1].append(data['track_ids'] + np.uint32(len(index.tracks)))
+                columns[2].append(data['times'])
+                index.tracks.extend(json.loads(str(data['tracks'])))
+        if files:
+            index._main = _sort_segment(*(np.concatenate(column) for column in columns))
+        index._own_start = len(index.tracks)
+        return index
+
+
+def build_from_csv(csv_path, audio_dir, index_path):
+    """
+    Register every clip listed in the provenance CSV (audio_file_name -> unique_hex_code)
+    """
+    import librosa
+
+    # Shards belong to the API processes; the build only rewrites the base file
+    index = FingerprintIndex.load(index_path, shards=False)
+    known = {track['hex_code'] for track in index.tracks}
+
+    with open(csv_path, 'r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            hex_code = row['unique_hex_code']
+            audio_path = os.path.join(audio_dir, os.path.basename(row['audio_file_name']))
+            if hex_code in known or not os.path.exists(audio_path):
+                continue
+            waveform, _ = librosa.load(audio_path, sr=FINGERPRINT_SAMPLE_RATE, mono=True)
+            hashes, anchors = compute_hashes(waveform)
+            index.add(hashes, anchors, hex_code, name=row['audio_file_name'])
+            known.add(hex_code)
+            print(f"Registered {row['audio_file_name']} ({len(hashes)} hashes)")
+
+    index.save(index_path)
+    print(f"Index with {len(index)} clips saved to {index_path}")
+
+
+def merge_shards(index_path):
+    """Fold the API processes' shards into the base file; run it while the API is stopped."""
+    shards = shard_paths(index_path)
+    index = FingerprintIndex.load(index_path)
+    index.save(index_path)
+    for shard in shards:
+        os.remove(shard)
+    print(f"Merged {len(shards)} shards; index with {len(index)} clips saved to {index_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the provenance fingerprint index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Register the clips listed in the provenance CSV")
+    build_parser.add_argument('csv_path')
+    build_parser.add_argument('audio_dir', help="Folder holding the files named in audio_file_name")
+    build_parser.add_argument('--index', default='fingerprints.npz')
+
+    merge_parser = subparsers.add_parser('merge', help="Fold per-process shards into the base index file")
+    merge_parser.add_argument('--index', default='fingerprints.npz')
+
+    query_parser = subparsers.add_parser('query', help="Match an audio file against the index")
+    query_parser.add_argument('audio_path')
+    query_parser.add_argument('--index', default='fingerprints.npz')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        build_from_csv(args.csv_path, args.audio_dir, args.index)
+    elif args.command == 'merge':
+        merge_shards(args.index)
+    else:
+        import librosa
+
+        waveform, _ = librosa.load(args.audio_path, sr=FINGERPRINT_SAMPLE_RATE, mono=True)
+        print(FingerprintIndex.load(args.index).query(*compute_hashes(waveform)))
+
+
+if __name__ == '__main__':
+    main()
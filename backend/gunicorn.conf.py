@@ -0,0 +1,56 @@
+"""
+Gunicorn settings for the Flask detector:
+    gunicorn -c backend/gunicorn.conf.py backend.app:app
+
+When MODEL_SERVER_ADDRESS is set, the model server is started before the HTTP
+workers fork and stopped with the arbiter. HTTP workers then stay small (no model
+in memory), so GUNICORN_WORKERS / GUNICORN_THREADS only size I/O concurrency
+while MODEL_SERVER_WORKERS / MODEL_SERVER_THREADS size inference.
+"""
+import os
+import secrets
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+from runtime_config import load_runtime_config
+
+# Without a model server each HTTP worker runs inference, so the tuned worker count applies
+_tuned_workers = None if os.getenv('MODEL_SERVER_ADDRESS') else load_runtime_config().get('workers')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', _tuned_workers or '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+_model_server = None
+
+
+def on_starting(server):
+    global _model_server
+    address = os.getenv('MODEL_SERVER_ADDRESS')
+    if not address or os.getenv('MODEL_SERVER_AUTOSTART', '1') != '1':
+        return
+
+    from model_server import ModelClient
+
+    # A fresh key per deployment unless one is configured; the server and the forked workers inherit it
+    if not os.getenv('MODEL_SERVER_AUTHKEY'):
+        os.environ['MODEL_SERVER_AUTHKEY'] = secrets.token_hex(32)
+    _model_server = subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'model_server.py'),
+                                      '--address', address])
+    server.log.info("Waiting for the model server on %s", address)
+    ModelClient(address, os.environ['MODEL_SERVER_AUTHKEY']).wait_ready(
+        timeout=float(os.getenv('MODEL_SERVER_START_TIMEOUT', '600')))
+    server.log.info("Model server ready")
+
+
+def on_exit(server):
+    if _model_server is not None and _model_server.poll() is None:
+        _model_server.terminate()
+        try:
+            _model_server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _model_server.kill()
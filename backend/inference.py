@@ -0,0 +1,80 @@
+"""
+Batched forward pass of the Hugging Face audio classifier.
+
+Scores match what the `audio-classification` pipeline returns for each clip on
+its own. That holds only where padding cannot leak into the scores: clips of
+different lengths share a forward pass only when the feature extractor returns
+an attention mask. Otherwise each distinct length gets its own pass. The same
+forward pass also yields a mean-pooled last-hidden-state embedding per clip,
+which is used by the known-clip similarity index.
+"""
+import numpy as np
+
+
+def format_scores(probabilities, id2label):
+    """Pipeline-style [{'label', 'score'}] list, best score first."""
+    scores = [
+        {'label': str(id2label[index]).lower(), 'score': round(float(probability), 6)}
+        for index, probability in enumerate(probabilities)
+    ]
+    return sorted(scores, key=lambda item: item['score'], reverse=True)
+
+
+def classify_waveforms(classifier, waveforms, sampling_rate):
+    """
+    Run the classifier on a batch of mono waveforms in one forward pass.
+
+    Args:
+        classifier: transformers audio-classification pipeline
+        waveforms (list[np.ndarray]): mono float waveforms at `sampling_rate`
+        sampling_rate (int): sample rate expected by the feature extractor
+
+    Returns:
+        tuple: (list of formatted score lists, (batch, hidden) float32 L2-normalized embeddings)
+    """
+    import torch
+
+    extractor = classifier.feature_extractor
+    model = classifier.model
+    use_mask = bool(getattr(extractor, 'return_attention_mask', False))
+
+    lengths = [len(waveform) for waveform in waveforms]
+    if not use_mask and len(set(lengths)) > 1:
+        # Unmasked padding changes the scores, so every length is classified separately
+        score_lists, embeddings = [None] * len(waveforms), [None] * len(waveforms)
+        for length in dict.fromkeys(lengths):
+            members = [position for position, other in enumerate(lengths) if other == length]
+            group_scores, group_embeddings = classify_waveforms(
+                classifier, [waveforms[position] for position in members], sampling_rate)
+            for position, scores, embedding in zip(members, group_scores, group_embeddings):
+                score_lists[position], embeddings[position] = scores, embedding
+        return score_lists, np.stack(embeddings)
+
+    inputs = extractor(
+        [np.asarray(waveform, dtype=np.float32) for waveform in waveforms],
+        sampling_rate=sampling_rate,
+        return_tensors='pt',
+        padding=True,
+        return_attention_mask=use_mask
+    )
+    inputs = {name: tensor.to(model.device) for name, tensor in inputs.items()}
+
+    with torch.inference_mode():
+        outputs = model(**inputs, output_hidden_states=True)
+
+    probabilities = outputs.logits.float().softmax(dim=-1).cpu().numpy()
+    hidden = outputs.hidden_states[-1].float()
+
+    # Mean-pool over real (non-padded) frames when the extractor provides a mask
+    if use_mask and hasattr(model, '_get_feature_vector_attention_mask'):
+        frame_mask = model._get_feature_vector_attention_mask(hidden.shape[1], inputs['attention_mask'])
+        frame_mask = frame_mask.unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * frame_mask).sum(dim=1) / frame_mask.sum(dim=1).clamp(min=1.0)
+    else:
+        pooled = hidden.mean(dim=1)
+
+    embeddings = pooled.cpu().numpy().astype(np.float32)
+    embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    id2label = model.config.id2label
+    return [format_scores(row, id2label) for row in probabilities], embeddings
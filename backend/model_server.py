@@ -0,0 +1,350 @@
+"""
+Local model server shared by all HTTP workers.
+
+One process pool holds the audio classifier; each inference process is pinned
+to its own cores and runs a fixed number of torch threads. HTTP workers copy a
+decoded waveform once into a `multiprocessing.shared_memory` block and send
+only its name and lengths over a `multiprocessing.connection` channel. The
+inference process maps the same block without copying, and the scores and
+embeddings come back on the channel. HTTP concurrency and inference capacity
+can then be sized independently.
+
+The channel is authenticated with MODEL_SERVER_AUTHKEY, which must be set
+(the gunicorn config generates one per deployment when it starts the server).
+
+Run it next to the API (the gunicorn config starts it automatically):
+    MODEL_SERVER_AUTHKEY=... python backend/model_server.py --address 127.0.0.1:6010 --workers 2 --threads 4
+"""
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+DEFAULT_ADDRESS = '127.0.0.1:6010'
+MAX_BATCH_REQUESTS = 8
+MAX_LENGTH_RATIO = 1.5     # only batch clips of similar length, padding is real compute
+REQUEST_TIMEOUT = 300.0    # seconds a request may wait for an inference worker
+
+
+def parse_address(value):
+    """'host:port' -> (host, port); anything else is a Unix socket path."""
+    host, _, port = value.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return value
+
+
+def _attach(name):
+    # Attaching must not register the block with this process's resource tracker,
+    # or the tracker would unlink the client's memory when the worker exits
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def _pin(worker_id, threads):
+    if not hasattr(os, 'sched_setaffinity'):
+        return None
+    cores = sorted(os.sched_getaffinity(0))
+    start = (worker_id * threads) % len(cores)
+    pinned = {cores[(start + offset) % len(cores)] for offset in range(min(threads, len(cores)))}
+    os.sched_setaffinity(0, pinned)
+    return sorted(pinned)
+
+
+def _worker_main(worker_id, model_id, threads, tasks, results, ready):
+    """Inference process: load the model once, then serve batches from the task queue."""
+    cores = _pin(worker_id, threads)
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+
+    import torch
+    from transformers import pipeline
+    from inference import classify_waveforms
+
+    torch.set_num_threads(threads)
+    classifier = pipeline("audio-classification", model=model_id)
+    sampling_rate = getattr(classifier.feature_extractor, 'sampling_rate', 16000)
+    # Without an attention mask, padding changes the scores, so only equal lengths may share a batch
+    masked = bool(getattr(classifier.feature_extractor, 'return_attention_mask', False))
+    ready.put((worker_id, sampling_rate, cores, masked))
+
+    deferred = []
+    while True:
+        task = deferred.pop(0) if deferred else tasks.get()
+        if task is None:
+            break
+
+        # Opportunistically batch queued requests of similar length (equal length without a mask)
+        batch = [task]
+        longest = max(task[2])
+        uniform = min(task[2]) == longest
+        while len(batch) < MAX_BATCH_REQUESTS:
+            try:
+                extra = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if extra is None:
+                deferred.append(extra)
+                break
+            extra_longest = max(extra[2])
+            if masked:
+                compatible = max(longest, extra_longest) <= MAX_LENGTH_RATIO * min(longest, extra_longest)
+            else:
+                compatible = uniform and min(extra[2]) == extra_longest == longest
+            if compatible:
+                batch.append(extra)
+            else:
+                deferred.append(extra)
+
+        blocks, waveforms, flat = [], [], None
+        try:
+            for request_id, name, lengths, sr in batch:
+                shm = _attach(name)
+                blocks.append(shm)
+                flat = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+                offsets = np.cumsum([0] + list(lengths))
+                waveforms.extend(flat[offsets[i]:offsets[i + 1]] for i in range(len(lengths)))
+            score_lists, embeddings = classify_waveforms(classifier, waveforms, batch[0][3])
+
+            position = 0
+            for request_id, _, lengths, _ in batch:
+                count = len(lengths)
+                results.put((request_id, 'ok', (score_lists[position:position + count],
+                                                embeddings[position:position + count])))
+                position += count
+        except Exception as inference_error:
+            for request_id, *_ in batch:
+                results.put((request_id, 'error', str(inference_error)))
+        finally:
+            # Views into the shared blocks must be dropped before the blocks can close
+            waveforms = flat = None
+            for shm in blocks:
+                shm.close()
+
+
+class ModelServer:
+    def __init__(self, address, authkey, model_id=None, workers=1, threads=None, request_timeout=REQUEST_TIMEOUT):
+        if not authkey:
+            raise ValueError('The model server needs an authkey')
+        self.address = parse_address(address)
+        self.authkey = authkey.encode()
+        self.model_id = model_id
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.request_timeout = request_timeout
+        self.sampling_rate = None
+        self.attention_mask = False
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def serve_forever(self):
+        # Spawned children do not inherit torch/OpenMP state from this process
+        self._context = mp.get_context('spawn')
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._ready = self._context.Queue()
+        self._processes = [self._start_worker(worker_id) for worker_id in range(self.workers)]
+        for _ in self._processes:
+            worker_id, self.sampling_rate, cores, self.attention_mask = self._ready.get()
+            print(f"Inference worker {worker_id} ready ({self.threads} threads, cores {cores})")
+
+        threading.Thread(target=self._route_results, daemon=True).start()
+        threading.Thread(target=self._watch_workers, daemon=True).start()
+
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Model server listening on {self.address}")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as accept_error:
+                    print(f"Error accepting model client: {accept_error}")
+                    continue
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True).start()
+
+    def _start_worker(self, worker_id):
+        process = self._context.Process(target=_worker_main, daemon=True, args=(
+            worker_id, self.model_id, self.threads, self._tasks, self._results, self._ready))
+        process.start()
+        return process
+
+    def _watch_workers(self, interval=1.0):
+        # A crashed worker takes its in-flight batch with it: fail what is pending and replace the worker
+        while True:
+            time.sleep(interval)
+            for worker_id, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                print(f"Inference worker {worker_id} exited with code {process.exitcode}, restarting it")
+                self._fail_pending(f'Inference worker exited with code {process.exitcode}')
+                self._processes[worker_id] = self._start_worker(worker_id)
+
+    def _fail_pending(self, message):
+        with self._pending_lock:
+            slots, self._pending = list(self._pending.values()), {}
+        for slot in slots:
+            slot['response'] = ('error', message)
+            slot['done'].set()
+
+    def _route_results(self):
+        while True:
+            request_id, status, payload = self._results.get()
+            with self._pending_lock:
+                slot = self._pending.pop(request_id, None)
+            if slot is not None:
+                slot['response'] = (status, payload)
+                slot['done'].set()
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+
+                if message[0] == 'info':
+                    connection.send(('ok', {'model_id': self.model_id, 'sampling_rate': self.sampling_rate,
+                                            'attention_mask': self.attention_mask,
+                                            'workers': self.workers, 'threads': self.threads}))
+                    continue
+                if message[0] != 'classify':
+                    connection.send(('error', f'Unknown command {message[0]!r}'))
+                    continue
+
+                _, name, lengths, sr = message
+                request_id = next(self._ids)
+                slot = {'done': threading.Event(), 'response': None}
+                with self._pending_lock:
+                    self._pending[request_id] = slot
+                self._tasks.put((request_id, name, lengths, sr))
+                if not slot['done'].wait(self.request_timeout):
+                    with self._pending_lock:
+                        self._pending.pop(request_id, None)
+                    if slot['response'] is None:
+                        slot['response'] = ('error', f'No inference result within {self.request_timeout:.0f}s')
+                connection.send(slot['response'])
+
+
+class ModelServerError(Exception):
+    """The model server reported a failure or could not be reached."""
+
+
+def authkey_from_env():
+    """MODEL_SERVER_AUTHKEY; there is no default, a known key would let any local process use the channel."""
+    authkey = os.getenv('MODEL_SERVER_AUTHKEY')
+    if not authkey:
+        raise ModelServerError('MODEL_SERVER_AUTHKEY is not set')
+    return authkey
+
+
+class ModelClient:
+    """
+    Per-HTTP-worker handle to the model server. Connections are kept per thread,
+    so concurrent requests in one worker never share a channel.
+    """
+
+    def __init__(self, address, authkey):
+        if not authkey:
+            raise ModelServerError('MODEL_SERVER_AUTHKEY is not set')
+        self.address = parse_address(address)
+        self.authkey = authkey.encode()
+        self._local = threading.local()
+
+    def _call(self, message):
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            try:
+                if connection is None:
+                    connection = self._local.connection = Client(self.address, authkey=self.authkey)
+                connection.send(message)
+                status, payload = connection.recv()
+                break
+            except (EOFError, OSError) as channel_error:
+                # Server restarted or the channel broke: reconnect once
+                self._local.connection = None
+                if attempt:
+                    raise ModelServerError(f'Model server unavailable: {channel_error}')
+        if status != 'ok':
+            raise ModelServerError(payload)
+        return payload
+
+    def info(self):
+        return self._call(('info',))
+
+    def wait_ready(self, timeout=300.0, interval=1.0):
+        """Block until the server answers (its workers have loaded the model)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.info()
+            except ModelServerError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(interval)
+
+    def classify(self, waveforms, sampling_rate):
+        """
+        Same contract as inference.classify_waveforms, executed in the model server.
+
+        Returns:
+            tuple: (list of formatted score lists, (batch, hidden) float32 embeddings)
+        """
+        waveforms = [np.asarray(waveform, dtype=np.float32) for waveform in waveforms]
+        lengths = [len(waveform) for waveform in waveforms]
+        shm = SharedMemory(create=True, size=max(1, sum(lengths) * 4))
+        try:
+            flat = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+            position = 0
+            for waveform in waveforms:
+                flat[position:position + len(waveform)] = waveform
+                position += len(waveform)
+            del flat
+            score_lists, embeddings = self._call(('classify', shm.name, lengths, sampling_rate))
+        finally:
+            shm.close()
+            shm.unlink()
+        return score_lists, embeddings
+
+
+def main():
+    from runtime_config import load_runtime_config
+
+    tuned = load_runtime_config()
+    parser = argparse.ArgumentParser(description="Serve the audio classifier to local HTTP workers")
+    parser.add_argument('--address', default=os.getenv('MODEL_SERVER_ADDRESS', DEFAULT_ADDRESS),
+                        help="host:port or a Unix socket path")
+    parser.add_argument('--model', default=os.getenv('DEEPFAKE_MODEL_ID', 'MelodyMachine/Deepfake-audio-detection-V2'))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('MODEL_SERVER_WORKERS', tuned.get('workers', 1))))
+    parser.add_argument('--threads', type=int,
+                        default=int(os.getenv('MODEL_SERVER_THREADS', tuned.get('torch_threads', 0))) or None,
+                        help="torch threads per inference worker (default: cores / workers)")
+    parser.add_argument('--request-timeout', type=float,
+                        default=float(os.getenv('MODEL_SERVER_REQUEST_TIMEOUT', REQUEST_TIMEOUT)))
+    args = parser.parse_args()
+
+    authkey = os.getenv('MODEL_SERVER_AUTHKEY')
+    if not authkey:
+        parser.error("set MODEL_SERVER_AUTHKEY")
+    ModelServer(args.address, authkey, args.model, args.workers, args.threads,
+                request_timeout=args.request_timeout).serve_forever()
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
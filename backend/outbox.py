@@ -0,0 +1,212 @@
+"""
+Email outbox backed by a MongoDB collection.
+
+Requests only insert a queued message and return. A background sender in each
+worker process claims due messages atomically (so several workers can share
+the outbox), sends them over one long-lived authenticated SMTP connection,
+retries transient failures with exponential backoff, and records the delivery
+status on the message document.
+"""
+import datetime
+import mimetypes
+import os
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+from pymongo import ASCENDING, ReturnDocument
+
+QUEUED, SENDING, SENT, FAILED = 'queued', 'sending', 'sent', 'failed'
+
+
+class SMTPConnection:
+    """One reusable SMTP session: connects lazily, re-checks when idle, reconnects on failure."""
+
+    def __init__(self, host, port, use_ssl=True, starttls=False, username=None, password=None,
+                 timeout=30.0, idle_check_seconds=60.0, idle_close_seconds=300.0):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self.idle_close_seconds = idle_close_seconds
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server_cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = server_cls(self.host, self.port, timeout=self.timeout)
+        if self.starttls and not self.use_ssl:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def session(self):
+        idle = time.monotonic() - self._last_used
+        if self._server is not None and idle > self.idle_check_seconds:
+            try:
+                if self._server.noop()[0] != 250:
+                    self.close()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._server is None:
+            self._server = self._connect()
+        self._last_used = time.monotonic()
+        return self._server
+
+    def send(self, message):
+        try:
+            self.session().send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle session; one fresh connection, then give up
+            self.close()
+            self.session().send_message(message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_close_seconds:
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+class EmailOutbox:
+    def __init__(self, collection, connection, sender, batch_size=20, poll_interval=5.0,
+                 max_attempts=5, backoff_seconds=30.0, max_backoff_seconds=3600.0, lease_seconds=300.0):
+        self.collection = collection
+        self.connection = connection
+        self.sender = sender
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self._wake = threading.Event()
+        self._thread = None
+
+        try:
+            collection.create_index([('status', ASCENDING), ('next_attempt_at', ASCENDING)])
+        except Exception as index_error:
+            print(f"Error creating outbox index: {index_error}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, recipient, subject, body, attachments=None, metadata=None):
+        """
+        Queue an email; attachments are file paths read at send time.
+
+        Returns:
+            ObjectId: outbox message id, for status lookups
+        """
+        now = datetime.datetime.utcnow()
+        result = self.collection.insert_one({
+            'to': recipient,
+            'subject': subject,
+            'body': body,
+            'attachments': list(attachments or []),
+            'metadata': metadata or {},
+            'status': QUEUED,
+            'attempts': 0,
+            'created_at': now,
+            'next_attempt_at': now,
+        })
+        self._wake.set()
+        return result.inserted_id
+
+    def status(self, message_id):
+        return self.collection.find_one({'_id': message_id}, {
+            'to': 1, 'status': 1, 'attempts': 1, 'created_at': 1, 'sent_at': 1, 'last_error': 1
+        })
+
+    def _claim(self):
+        # Queued messages that are due, or 'sending' ones whose worker died mid-send
+        now = datetime.datetime.utcnow()
+        return self.collection.find_one_and_update(
+            {'$or': [
+                {'status': QUEUED, 'next_attempt_at': {'$lte': now}},
+                {'status': SENDING, 'lease_until': {'$lte': now}},
+            ]},
+            {'$set': {'status': SENDING, 'lease_until': now + datetime.timedelta(seconds=self.lease_seconds)},
+             '$inc': {'attempts': 1}},
+            sort=[('next_attempt_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _build(self, item):
+        message = EmailMessage()
+        message['Subject'] = item['subject']
+        message['From'] = self.sender
+        message['To'] = item['to']
+        message.set_content(item['body'])
+        for path in item.get('attachments', []):
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            maintype, subtype = content_type.split('/', 1)
+            with open(path, 'rb') as file:
+                message.add_attachment(file.read(), maintype=maintype, subtype=subtype,
+                                       filename=os.path.basename(path))
+        return message
+
+    def _deliver(self, item):
+        try:
+            self.connection.send(self._build(item))
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, FileNotFoundError) as permanent:
+            self._finish(item, FAILED, error=str(permanent))
+            return
+        except (smtplib.SMTPException, OSError) as transient:
+            self.connection.close()
+            if isinstance(transient, smtplib.SMTPResponseException) and 500 <= transient.smtp_code < 600:
+                self._finish(item, FAILED, error=str(transient))
+            elif item['attempts'] >= self.max_attempts:
+                self._finish(item, FAILED, error=str(transient))
+            else:
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (item['attempts'] - 1))
+                self.collection.update_one({'_id': item['_id']}, {'$set': {
+                    'status': QUEUED,
+                    'last_error': str(transient),
+                    'next_attempt_at': datetime.datetime.utcnow() + datetime.timedelta(seconds=delay),
+                }})
+            return
+        self._finish(item, SENT)
+
+    def _finish(self, item, status, error=None):
+        update = {'status': status, 'last_error': error}
+        if status == SENT:
+            update['sent_at'] = datetime.datetime.utcnow()
+        self.collection.update_one({'_id': item['_id']}, {'$set': update, '$unset': {'lease_until': ''}})
+
+    def send_due(self):
+        """Send up to one batch of due messages over the shared connection; returns how many were tried."""
+        sent = 0
+        while sent < self.batch_size:
+            item = self._claim()
+            if item is None:
+                break
+            self._deliver(item)
+            sent += 1
+        return sent
+
+    def _run(self):
+        while True:
+            try:
+                if self.send_due() == self.batch_size:
+                    continue        # more may be waiting
+                self.connection.close_if_idle()
+            except Exception as outbox_error:
+                print(f"Error in email outbox: {outbox_error}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
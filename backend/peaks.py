@@ -0,0 +1,98 @@
+"""
+Multi-resolution min/max peak pyramids for drawing waveforms.
+
+Level 0 holds the min and max of every `samples_per_peak` samples, computed in
+one vectorized pass over the waveform. Each further level halves the previous
+one by pairwise min/max, so the samples are not read again. Levels are
+quantized to int8 (or int16) and stored interleaved (min, max, min, max, ...)
+in one small document per file. A client asks for a time range and a pixel
+width and gets the coarsest level that still has a peak per pixel, usually a
+few KB however long the file is.
+"""
+import datetime
+
+import numpy as np
+from bson import Binary
+
+PEAK_SAMPLES = 256          # samples per peak at level 0 (16 ms at 16 kHz)
+MIN_LEVEL_PEAKS = 64        # stop halving below this many peaks
+DTYPES = {8: np.int8, 16: np.int16}
+
+
+def build_pyramid(waveform, sr, samples_per_peak=PEAK_SAMPLES, bits=8):
+    """
+    Args:
+        waveform (np.ndarray): mono float waveform in [-1, 1]
+        sr (int): sample rate of `waveform`
+        samples_per_peak (int): level 0 resolution
+        bits (int): 8 or 16, storage precision of each peak
+
+    Returns:
+        dict: sample_rate, samples_per_peak, bits, duration, and levels as
+            int arrays of interleaved min/max pairs (finest first)
+    """
+    waveform = np.asarray(waveform, dtype=np.float32)
+    n_peaks = max(1, -(-len(waveform) // samples_per_peak))
+    padded = np.zeros(n_peaks * samples_per_peak, dtype=np.float32)
+    padded[:len(waveform)] = waveform
+    frames = padded.reshape(n_peaks, samples_per_peak)
+    mins, maxs = frames.min(axis=1), frames.max(axis=1)
+
+    scale = 2 ** (bits - 1) - 1
+    levels = []
+    while True:
+        pairs = np.stack([mins, maxs], axis=1).ravel()
+        levels.append(np.clip(np.round(pairs * scale), -scale, scale).astype(DTYPES[bits]))
+        if len(mins) <= MIN_LEVEL_PEAKS:
+            break
+        if len(mins) % 2:
+            mins, maxs = np.append(mins, mins[-1]), np.append(maxs, maxs[-1])
+        mins = np.minimum(mins[0::2], mins[1::2])
+        maxs = np.maximum(maxs[0::2], maxs[1::2])
+
+    return {
+        'sample_rate': sr,
+        'samples_per_peak': samples_per_peak,
+        'bits': bits,
+        'duration': len(waveform) / sr,
+        'levels': levels,
+    }
+
+
+def store_pyramid(collection, file_id, pyramid):
+    collection.replace_one({'_id': file_id}, {
+        '_id': file_id,
+        'sample_rate': pyramid['sample_rate'],
+        'samples_per_peak': pyramid['samples_per_peak'],
+        'bits': pyramid['bits'],
+        'duration': pyramid['duration'],
+        'levels': [Binary(level.tobytes()) for level in pyramid['levels']],
+        'created_at': datetime.datetime.utcnow(),
+    }, upsert=True)
+
+
+def select_peaks(document, width, start=0.0, end=None):
+    """
+    Peaks for [start, end) seconds at the coarsest stored level with at least `width` peaks.
+
+    Returns:
+        tuple: (interleaved min/max int array, seconds per peak, actual start seconds)
+    """
+    dtype = DTYPES[document['bits']]
+    end = document['duration'] if end is None else min(end, document['duration'])
+    start = max(0.0, min(start, end))
+    span = max(end - start, 1e-9)
+
+    # Level k has one peak per samples_per_peak * 2**k samples; stored levels go finest to coarsest
+    level = 0
+    for candidate in range(len(document['levels']) - 1, -1, -1):
+        seconds_per_peak = document['samples_per_peak'] * 2 ** candidate / document['sample_rate']
+        if span / seconds_per_peak >= width:
+            level = candidate
+            break
+
+    seconds_per_peak = document['samples_per_peak'] * 2 ** level / document['sample_rate']
+    first = int(start / seconds_per_peak)
+    last = int(np.ceil(end / seconds_per_peak))
+    peaks = np.frombuffer(document['levels'][level], dtype=dtype)[2 * first:2 * last]
+    return peaks, seconds_per_peak, first * seconds_per_peak
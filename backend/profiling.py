@@ -0,0 +1,166 @@
+"""
+Opt-in sampling profiler for Flask requests.
+
+While at least one request is being profiled, a single sampler thread reads
+`sys._current_frames()` every few milliseconds and records the collapsed stack
+of each profiled request thread under its endpoint. Counts are aggregated into
+fixed time windows and exported in the collapsed format that flamegraph.pl,
+speedscope and inferno read directly. When nothing is profiled the sampler
+sleeps. When profiling is disabled the app never registers the hooks, so the
+disabled cost is zero.
+
+An optional tracemalloc mode records allocation growth per named code section
+(decode, inference, ...) of profiled requests. Tracing is switched on only
+while a profiled request is running, so unprofiled traffic does not pay for it.
+"""
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+_NULL_CONTEXT = nullcontext()
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, window_seconds=300, max_windows=12, sample_rate=0.0,
+                 trace_memory=False, memory_top=15):
+        self.interval = interval
+        self.window_seconds = window_seconds
+        self.sample_rate = sample_rate
+        self.trace_memory = trace_memory
+        self.memory_top = memory_top
+        self.windows = deque(maxlen=max_windows)     # (window_start, {endpoint: Counter(stack)})
+        self.memory = defaultdict(Counter)          # section -> Counter(traceback line -> bytes)
+        self._active = {}                           # thread id -> endpoint
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._labels = {}
+        self._sampler = None
+        self._tracing = 0                            # profiled requests that need tracemalloc
+        self._owns_tracing = False                   # tracing was started here, not by someone else
+
+    def should_profile(self, forced=False):
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self, endpoint):
+        """Begin sampling the calling thread; returns a token for stop()."""
+        token = threading.get_ident()
+        with self._lock:
+            counted = token in self._active
+            self._active[token] = endpoint or 'unknown'
+            if self.trace_memory and not counted:
+                self._tracing += 1
+                if self._tracing == 1 and not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                    self._owns_tracing = True
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._sampler.start()
+        self._wake.set()
+        return token
+
+    def stop(self, token):
+        with self._lock:
+            if self._active.pop(token, None) is not None and self.trace_memory:
+                self._tracing -= 1
+                if self._tracing == 0 and self._owns_tracing:
+                    tracemalloc.stop()
+                    self._owns_tracing = False
+            if not self._active:
+                self._wake.clear()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            # ';' separates frames in the collapsed format
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def _window(self, now):
+        start = int(now // self.window_seconds * self.window_seconds)
+        if not self.windows or self.windows[-1][0] != start:
+            self.windows.append((start, defaultdict(Counter)))
+        return self.windows[-1][1]
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+
+            frames = sys._current_frames()
+            samples = []
+            for thread_id, endpoint in active.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    samples.append((endpoint, ';'.join(reversed(stack))))
+            del frames
+
+            with self._lock:
+                window = self._window(time.time())
+                for endpoint, stack in samples:
+                    window[endpoint][stack] += 1
+
+    def memory_section(self, name, enabled=True):
+        """Context manager recording allocation growth of a code section (no-op unless tracing)."""
+        if not (self.trace_memory and enabled and tracemalloc.is_tracing()):
+            return _NULL_CONTEXT
+        return self._trace_section(name)
+
+    @contextmanager
+    def _trace_section(self, name):
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            after = tracemalloc.take_snapshot()
+            growth = after.compare_to(before, 'traceback')
+            with self._lock:
+                for stat in growth[:self.memory_top]:
+                    if stat.size_diff > 0:
+                        where = stat.traceback[-1]
+                        line = f"{os.path.basename(where.filename)}:{where.lineno}"
+                        self.memory[name][line] += stat.size_diff
+
+    def collapsed(self, endpoint=None, since=None):
+        """Collapsed stacks ('endpoint;frame;frame count' lines) over the retained windows."""
+        totals = Counter()
+        with self._lock:
+            for start, endpoints in self.windows:
+                if since is not None and start + self.window_seconds <= since:
+                    continue
+                for name, stacks in endpoints.items():
+                    if endpoint and name != endpoint:
+                        continue
+                    for stack, count in stacks.items():
+                        totals[f"{name};{stack}"] += count
+        return '\n'.join(f"{stack} {count}" for stack, count in sorted(totals.items())) + '\n'
+
+    def summary(self):
+        with self._lock:
+            return {
+                'interval_ms': self.interval * 1000,
+                'window_seconds': self.window_seconds,
+                'sample_rate': self.sample_rate,
+                'active_requests': len(self._active),
+                'windows': [
+                    {'start': start, 'samples': {name: sum(stacks.values()) for name, stacks in endpoints.items()}}
+                    for start, endpoints in self.windows
+                ],
+                'memory': {
+                    section: [{'location': line, 'bytes': size} for line, size in lines.most_common(self.memory_top)]
+                    for section, lines in self.memory.items()
+                },
+            }
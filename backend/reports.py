@@ -0,0 +1,245 @@
+"""
+PDF analysis reports rendered from stored analysis documents.
+
+A report shows the verdict, class scores, the verification QR code and a
+timeline of the analyzed clip (speech regions from the VAD, and per-window fake
+probabilities in adaptive mode). Rendered bytes are cached in an in-memory LRU
+backed by a disk directory and keyed by analysis id and template version, so
+repeat downloads and email shares never re-render. `render_batch` renders many
+analyses in parallel worker processes.
+"""
+import argparse
+import io
+import multiprocessing as mp
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+REPORT_VERSION = 1
+
+
+def report_key(analysis):
+    return f"{analysis['_id']}-v{REPORT_VERSION}"
+
+
+def render_report(analysis, qr_images_folder):
+    """
+    Render one analysis document to PDF bytes.
+
+    Args:
+        analysis (dict): stored analysis (label, confidence, scores, hex_code, filename,
+            total_duration, speech_segments, window_scores, created_at)
+        qr_images_folder (str): folder holding <hex_code>.png verification QR codes
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    left, top = 20 * mm, height - 25 * mm
+
+    fake = analysis.get('label') == 'fake'
+    pdf.setTitle(f"Voice Guard report {analysis['_id']}")
+    pdf.setFont('Helvetica-Bold', 18)
+    pdf.drawString(left, top, "Voice Guard Analysis Report")
+
+    pdf.setFont('Helvetica-Bold', 14)
+    pdf.setFillColor(colors.HexColor('#c0392b') if fake else colors.HexColor('#27ae60'))
+    verdict = 'Likely deepfake' if fake else 'Likely authentic'
+    pdf.drawString(left, top - 14 * mm, f"{verdict} ({analysis.get('confidence', 0):.2f}% confidence)")
+    pdf.setFillColor(colors.black)
+
+    pdf.setFont('Helvetica', 10)
+    created_at = analysis.get('created_at')
+    details = [
+        ('File', analysis.get('filename', '')),
+        ('Verification ID', str(analysis.get('hex_code', '')).upper()),
+        ('Analysis ID', str(analysis['_id'])),
+        ('Analyzed at', created_at.strftime('%Y-%m-%d %H:%M UTC') if created_at else ''),
+        ('Verdict source', analysis.get('verdict_source', 'model')),
+        ('Duration', f"{analysis.get('total_duration', 0):.1f}s "
+                     f"({analysis.get('speech_duration', 0):.1f}s speech)"),
+    ]
+    y = top - 26 * mm
+    for label, value in details:
+        pdf.drawString(left, y, f"{label}:")
+        pdf.drawString(left + 35 * mm, y, str(value))
+        y -= 6 * mm
+
+    # Class scores as a small bar chart
+    y -= 4 * mm
+    pdf.setFont('Helvetica-Bold', 11)
+    pdf.drawString(left, y, "Scores")
+    pdf.setFont('Helvetica', 10)
+    for item in analysis.get('scores', []):
+        y -= 7 * mm
+        pdf.drawString(left, y, item['label'])
+        pdf.setFillColor(colors.HexColor('#dddddd'))
+        pdf.rect(left + 25 * mm, y - 1, 90 * mm, 4 * mm, stroke=0, fill=1)
+        pdf.setFillColor(colors.HexColor('#34495e'))
+        pdf.rect(left + 25 * mm, y - 1, 90 * mm * float(item['score']), 4 * mm, stroke=0, fill=1)
+        pdf.setFillColor(colors.black)
+        pdf.drawString(left + 118 * mm, y, f"{float(item['score']) * 100:.1f}%")
+
+    qr_path = os.path.join(qr_images_folder, f"{analysis.get('hex_code', '')}.png")
+    if analysis.get('hex_code') and os.path.exists(qr_path):
+        pdf.drawImage(qr_path, width - 60 * mm, top - 45 * mm, 40 * mm, 40 * mm)
+
+    _draw_timeline(pdf, analysis, left, y - 20 * mm, width - 2 * left, colors, mm)
+
+    pdf.setFont('Helvetica-Oblique', 8)
+    pdf.drawString(left, 15 * mm, "Scan the QR code or use the verification ID to check this clip's provenance.")
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def _draw_timeline(pdf, analysis, x, y, width, colors, mm):
+    total = float(analysis.get('total_duration') or 0.0)
+    pdf.setFont('Helvetica-Bold', 11)
+    pdf.drawString(x, y + 10 * mm, "Timeline")
+    if total <= 0:
+        return
+
+    scale = width / total
+    bar_height = 8 * mm
+    pdf.setFillColor(colors.HexColor('#eeeeee'))
+    pdf.rect(x, y, width, bar_height, stroke=0, fill=1)
+
+    # Speech regions found by the VAD
+    pdf.setFillColor(colors.HexColor('#95a5a6'))
+    for start, end in analysis.get('speech_segments', []):
+        pdf.rect(x + start * scale, y, max(0.5, (end - start) * scale), bar_height, stroke=0, fill=1)
+
+    # Per-window fake probability, shaded green (real) to red (fake)
+    for window in analysis.get('window_scores') or []:
+        probability = float(window['fake_probability'])
+        pdf.setFillColor(colors.Color(probability, 1.0 - probability, 0.2))
+        pdf.rect(x + window['start'] * scale, y - 6 * mm, max(0.5, (window['end'] - window['start']) * scale),
+                 5 * mm, stroke=0, fill=1)
+
+    pdf.setFillColor(colors.black)
+    pdf.setFont('Helvetica', 8)
+    pdf.drawString(x, y - 10 * mm, "0s")
+    pdf.drawRightString(x + width, y - 10 * mm, f"{total:.1f}s")
+    legend = "grey: speech"
+    if analysis.get('window_scores'):
+        legend += ", lower band: per-window fake probability (green = real, red = fake)"
+    pdf.drawString(x + 20 * mm, y - 10 * mm, legend)
+
+
+class ReportCache:
+    """Rendered report bytes: in-memory LRU in front of a directory of PDF files."""
+
+    def __init__(self, directory, max_items=64):
+        self.directory = directory
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        try:
+            with open(self.path(key), 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        tmp_path = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, self.path(key))
+        self._remember(key, data)
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+def get_report(analysis, cache, qr_images_folder):
+    """Cached PDF bytes for an analysis, rendering on the first request."""
+    key = report_key(analysis)
+    data = cache.get(key)
+    if data is None:
+        data = render_report(analysis, qr_images_folder)
+        cache.put(key, data)
+    return data
+
+
+def get_report_path(analysis, cache, qr_images_folder):
+    """Disk path of the cached PDF (for email attachments), rendering if needed."""
+    get_report(analysis, cache, qr_images_folder)
+    return cache.path(report_key(analysis))
+
+
+def _render_to_disk(analysis, qr_images_folder, directory):
+    cache = ReportCache(directory, max_items=0)
+    cache.put(report_key(analysis), render_report(analysis, qr_images_folder))
+    return str(analysis['_id'])
+
+
+def render_batch(analyses, cache, qr_images_folder, workers=None):
+    """
+    Render every analysis without a cached report in parallel processes.
+
+    Returns:
+        dict: rendered and already-cached analysis ids
+    """
+    missing, cached, rendered = [], [], []
+    for analysis in analyses:
+        if os.path.exists(cache.path(report_key(analysis))):
+            cached.append(str(analysis['_id']))
+        else:
+            missing.append(analysis)
+    if missing:
+        # Spawned workers: the API process forks with MongoDB clients and torch threads already running
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('spawn')) as pool:
+            futures = [pool.submit(_render_to_disk, analysis, qr_images_folder, cache.directory)
+                       for analysis in missing]
+            rendered = [future.result() for future in futures]
+    return {'rendered': rendered, 'cached': cached}
+
+
+def main():
+    from bson import ObjectId
+    from pymongo import MongoClient
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Render analysis reports in parallel")
+    parser.add_argument('analysis_ids', nargs='*', help="analysis ids (default: the --latest analyses)")
+    parser.add_argument('--latest', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--reports-dir', default=os.getenv('REPORTS_FOLDER', os.path.join(backend_dir, 'reports')))
+    parser.add_argument('--qr-dir', default=os.path.join(backend_dir, 'public', 'QR_images'))
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:27017/voice_guard'))
+    analyses = client[os.getenv('MONGODB_DB_NAME', 'voice_guard')].analyses
+    if args.analysis_ids:
+        documents = list(analyses.find({'_id': {'$in': [ObjectId(value) for value in args.analysis_ids]}}))
+    else:
+        documents = list(analyses.find().sort('created_at', -1).limit(args.latest))
+
+    result = render_batch(documents, ReportCache(args.reports_dir), args.qr_dir, args.workers)
+    print(f"Rendered {len(result['rendered'])} reports, {len(result['cached'])} already cached")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Bulk scoring of stored uploads, for the backlog and after a model change.
+
+Scan records (`audio_files`) are read page by page in `_id` order. Their
+uploads are decoded from the canonical renditions in spawned worker processes,
+with a bounded number in flight. The decoded audio goes through the classifier
+in batches of equal-length clips (any lengths when the feature extractor returns
+an attention mask, since only then does padding leave the scores unchanged), and results are written back with one unordered `bulk_write` per
+batch. After every page the last `_id` is saved in `rescore_checkpoints`, so an
+interrupted job resumes where it stopped. Time and item counts are recorded per
+stage (read, decode, classify, write), which shows where throughput is lost. The
+checkpoint also carries the job's current status, so other processes (the admin
+API) can report progress of a run started from this CLI.
+
+    python backend/rescore.py --workers 8 --batch-size 16
+    python backend/rescore.py --all --restart      # rescore everything with the current model
+"""
+import argparse
+import datetime
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pymongo import MongoClient, UpdateMany
+
+CHECKPOINT_COLLECTION = 'rescore_checkpoints'
+
+_worker = {}
+
+
+def _init_worker(mongodb_uri, db_name, collection_name):
+    from tiered_storage import storage_from_env
+
+    client = MongoClient(mongodb_uri)
+    _worker['fs'] = storage_from_env(client[db_name], collection_name)
+    _worker['files'] = client[db_name][f"{collection_name}.files"]
+
+
+def _decode(file_id, sr, max_seconds):
+    from canonical import load_waveform
+
+    started = time.perf_counter()
+    waveform = load_waveform(_worker['fs'], _worker['files'], file_id, sr)[:int(max_seconds * sr)]
+    return file_id, waveform, time.perf_counter() - started
+
+
+class RescoreJob:
+    def __init__(self, mongodb_uri, db_name, audio_collection, model_id, job='default', workers=None,
+                 batch_size=8, page_size=500, max_seconds=300.0, rescore_all=False):
+        self.mongodb_uri = mongodb_uri
+        self.db_name = db_name
+        self.audio_collection = audio_collection
+        self.model_id = model_id
+        self.job = job
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.max_seconds = max_seconds
+        self.rescore_all = rescore_all
+
+        database = MongoClient(mongodb_uri)[db_name]
+        self.scans = database.audio_files
+        self.checkpoints = database[CHECKPOINT_COLLECTION]
+        self.stages = {name: {'seconds': 0.0, 'items': 0} for name in ('read', 'decode', 'classify', 'write')}
+        self.counts = {'scans': 0, 'scored': 0, 'failed': 0}
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def _record(self, stage, seconds, items):
+        with self._lock:
+            self.stages[stage]['seconds'] += seconds
+            self.stages[stage]['items'] += items
+
+    def _query(self, after):
+        query = {'file_id': {'$exists': True}}
+        if self.rescore_all:
+            query['model_id'] = {'$ne': self.model_id}
+        else:
+            query['result'] = None
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        return query
+
+    def run(self, classify, sr, restart=False, attention_mask=False):
+        """
+        Score every matching scan.
+
+        Args:
+            classify: callable taking a list of waveforms and returning (score lists, embeddings),
+                like inference.classify_waveforms or ModelClient.classify
+            sr (int): sample rate `classify` expects
+            restart (bool): ignore the saved checkpoint and start from the first scan
+            attention_mask (bool): the feature extractor masks padding, so clips of any length may share a batch
+        """
+        self.started_at = datetime.datetime.utcnow()
+        checkpoint = None if restart else self.checkpoints.find_one({'_id': self.job})
+        after = checkpoint.get('last_id') if checkpoint and checkpoint.get('model_id') == self.model_id else None
+        self._save_status()
+        try:
+            self._run_pages(after, classify, sr, attention_mask)
+        except Exception as run_error:
+            self.error = str(run_error)
+            self._save_status()
+            raise
+
+        self.finished_at = datetime.datetime.utcnow()
+        self._save_status()
+        return self.snapshot()
+
+    def _save_status(self, **fields):
+        fields['status'] = self.snapshot()
+        fields['updated_at'] = datetime.datetime.utcnow()
+        self.checkpoints.update_one({'_id': self.job}, {'$set': fields}, upsert=True)
+
+    def _run_pages(self, after, classify, sr, attention_mask):
+        # Spawned workers: forking after torch has started its thread pools can deadlock
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(self.mongodb_uri, self.db_name, self.audio_collection)) as pool:
+            while True:
+                # Keyset pages instead of one long cursor, which the server would time out between slow batches
+                started = time.perf_counter()
+                page = list(self.scans.find(self._query(after), {'file_id': 1}).sort('_id', 1).limit(self.page_size))
+                self._record('read', time.perf_counter() - started, len(page))
+                if not page:
+                    break
+
+                file_ids = list(dict.fromkeys(scan['file_id'] for scan in page))
+                self._score_files(pool, file_ids, classify, sr, attention_mask)
+                after = page[-1]['_id']
+                with self._lock:
+                    self.counts['scans'] += len(page)
+                self._save_status(last_id=after, model_id=self.model_id, counts=dict(self.counts))
+
+    def _score_files(self, pool, file_ids, classify, sr, attention_mask):
+        window = 4 * self.workers
+        remaining = iter(file_ids)
+        in_flight = deque()
+        # Unmasked padding shifts the scores, so clips are bucketed by exact length
+        buckets = defaultdict(list)
+        held = 0
+        while True:
+            for file_id in remaining:
+                in_flight.append(pool.submit(_decode, file_id, sr, self.max_seconds))
+                if len(in_flight) >= window:
+                    break
+            if not in_flight:
+                break
+            try:
+                file_id, waveform, decode_seconds = in_flight.popleft().result()
+            except Exception as decode_error:
+                with self._lock:
+                    self.counts['failed'] += 1
+                print(f"Error decoding for rescore: {decode_error}")
+                continue
+            # Time spent inside the workers, summed over processes
+            self._record('decode', decode_seconds, 1)
+            key = None if attention_mask else len(waveform)
+            buckets[key].append((file_id, waveform))
+            held += 1
+            if len(buckets[key]) < self.batch_size:
+                if held < 4 * self.batch_size:
+                    continue
+                # Too many decoded clips held back waiting for one of the same length
+                key = max(buckets, key=lambda length: len(buckets[length]))
+            batch = buckets.pop(key)
+            held -= len(batch)
+            self._classify_and_write(batch, classify)
+        for batch in buckets.values():
+            self._classify_and_write(batch, classify)
+
+    def _classify_and_write(self, batch, classify):
+        started = time.perf_counter()
+        score_lists, _ = classify([waveform for _, waveform in batch])
+        self._record('classify', time.perf_counter() - started, len(batch))
+
+        now = datetime.datetime.utcnow()
+        operations = []
+        for (file_id, _), scores in zip(batch, score_lists):
+            best = max(scores, key=lambda item: item['score'])
+            operations.append(UpdateMany({'file_id': file_id}, {'$set': {
+                'result': best['label'],
+                'confidence': round(best['score'] * 100, 2),
+                'scores': scores,
+                'model_id': self.model_id,
+                'scored_at': now,
+            }}))
+
+        started = time.perf_counter()
+        self.scans.bulk_write(operations, ordered=False)
+        self._record('write', time.perf_counter() - started, len(operations))
+        with self._lock:
+            self.counts['scored'] += len(batch)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                name: dict(stage, per_second=round(stage['items'] / stage['seconds'], 2) if stage['seconds'] else None)
+                for name, stage in self.stages.items()
+            }
+            # Decode time is summed over workers, so its wall-clock rate is roughly per_second * workers
+            stages['decode']['workers'] = self.workers
+            return {
+                'job': self.job,
+                'model_id': self.model_id,
+                'running': self.started_at is not None and self.finished_at is None and self.error is None,
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'error': self.error,
+                'counts': dict(self.counts),
+                'stages': stages,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score or rescore stored uploads in bulk")
+    parser.add_argument('--job', default='default', help="checkpoint name")
+    parser.add_argument('--workers', type=int, default=None, help="decode processes")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-seconds', type=float, default=float(os.getenv('ANALYZE_MAX_SECONDS', '300')))
+    parser.add_argument('--all', action='store_true', help="rescore files scored by another model too")
+    parser.add_argument('--restart', action='store_true', help="ignore the saved checkpoint")
+    args = parser.parse_args()
+
+    model_id = os.getenv('DEEPFAKE_MODEL_ID', 'MelodyMachine/Deepfake-audio-detection-V2')
+    model_server_address = os.getenv('MODEL_SERVER_ADDRESS')
+    if model_server_address:
+        from model_server import ModelClient, authkey_from_env
+
+        client = ModelClient(model_server_address, authkey_from_env())
+        info = client.wait_ready(timeout=600)
+        sr, attention_mask = info['sampling_rate'], info.get('attention_mask', False)
+
+        def classify(waveforms):
+            return client.classify(waveforms, sr)
+    else:
+        from transformers import pipeline
+        from inference import classify_waveforms
+
+        classifier = pipeline("audio-classification", model=model_id)
+        sr = getattr(classifier.feature_extractor, 'sampling_rate', 16000)
+        attention_mask = bool(getattr(classifier.feature_extractor, 'return_attention_mask', False))
+
+        def classify(waveforms):
+            return classify_waveforms(classifier, waveforms, sr)
+
+    job = RescoreJob(
+        os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:27017/voice_guard'),
+        os.getenv('MONGODB_DB_NAME', 'voice_guard'),
+        os.getenv('MONGODB_AUDIO_COLLECTION_NAME', 'audio_files'),
+        model_id,
+        job=args.job,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_seconds=args.max_seconds,
+        rescore_all=args.all
+    )
+    result = job.run(classify, sr, restart=args.restart, attention_mask=attention_mask)
+    print(f"Scored {result['counts']['scored']} files ({result['counts']['failed']} failed) "
+          f"across {result['counts']['scans']} scans")
+    for name, stage in result['stages'].items():
+        print(f"  {name:<8} {stage['items']:>8} items  {stage['seconds']:8.1f}s  {stage['per_second'] or 0:8.1f}/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Host-specific runtime settings written by tune_threads.py.
+
+Thread counts have to be in the environment before numpy/torch load their
+OpenMP/BLAS runtimes, so app.py applies the file before any heavy import.
+Variables that are already set in the environment always win.
+"""
+import json
+import os
+
+RUNTIME_CONFIG_PATH = os.getenv(
+    'RUNTIME_CONFIG_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runtime_config.json')
+)
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def load_runtime_config(path=RUNTIME_CONFIG_PATH):
+    """The tuned settings, or {} when no (readable) file exists."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError) as config_error:
+        print(f"Error reading runtime config {path}: {config_error}")
+        return {}
+
+
+def apply_thread_env(config):
+    """Export the tuned intra-op thread count for OpenMP/BLAS (call before importing numpy/torch)."""
+    threads = config.get('torch_threads')
+    if threads:
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, str(threads))
+
+
+def configure_torch(config):
+    """Apply the tuned torch thread pools; a no-op without a config."""
+    threads = int(os.getenv('TORCH_NUM_THREADS', config.get('torch_threads') or 0))
+    interop = int(os.getenv('TORCH_NUM_INTEROP_THREADS', config.get('interop_threads') or 0))
+    if not threads and not interop:
+        return
+
+    import torch
+
+    if threads:
+        torch.set_num_threads(threads)
+    if interop:
+        try:
+            torch.set_num_interop_threads(interop)
+        except RuntimeError:
+            # Only settable before the first parallel op in the process
+            pass
@@ -0,0 +1,309 @@
+"""
+Two-tier audio storage behind the GridFS put/get interface.
+
+New files land in the hot tier (GridFS). Files that are old and rarely read,
+or not read for a long time, are demoted. Their bytes go to a local
+content-addressed store (zlib-compressed objects named by SHA-256, so duplicate
+uploads share one object), and their GridFS chunks are deleted. The GridFS file
+document stays in place, so metadata lookups (filename, canonical_id, ...)
+keep working while the database size stays bounded. A read of a cold file
+rewrites its chunks and marks it hot again. Tier, hash and access statistics
+live in a separate index collection.
+
+Each move is claimed with a compare-and-set on the tier (hot -> demoting,
+cold -> promoting), so concurrent sweeps and readers never move the same file
+twice. Chunks are deleted only after the cold copy is recorded. While a file is
+moving, readers serve whichever copy is complete. Moves left half-done by a
+crash are rolled back by the next sweep.
+
+    python backend/tiered_storage.py register   # index files stored before tiering
+    python backend/tiered_storage.py demote     # one demotion sweep
+    python backend/tiered_storage.py stats
+"""
+import argparse
+import datetime
+import hashlib
+import io
+import os
+import zlib
+
+from bson import Binary
+from pymongo import ASCENDING
+
+HOT, COLD = 'hot', 'cold'
+DEMOTING, PROMOTING = 'demoting', 'promoting'
+
+
+class ColdFile:
+    """Read-only stand-in for a GridOut whose bytes came from the cold tier."""
+
+    def __init__(self, document, data):
+        self._id = document['_id']
+        self.filename = document.get('filename')
+        self.content_type = document.get('contentType')
+        self.length = len(data)
+        self.upload_date = document.get('uploadDate')
+        self._buffer = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+
+class TieredStorage:
+    def __init__(self, fs, database, collection_name, cold_dir, demote_after_days=30, idle_days=7,
+                 hot_min_reads=3, compression_level=6, promote_on_read=True, read_grace_seconds=300,
+                 stalled_move_seconds=3600):
+        self.fs = fs
+        self.files = database[f"{collection_name}.files"]
+        self.chunks = database[f"{collection_name}.chunks"]
+        self.index = database[f"{collection_name}.tiers"]
+        self.cold_dir = cold_dir
+        self.demote_after_days = demote_after_days
+        self.idle_days = idle_days
+        self.hot_min_reads = hot_min_reads
+        self.compression_level = compression_level
+        self.promote_on_read = promote_on_read
+        self.read_grace_seconds = read_grace_seconds          # files read this recently are not demoted
+        self.stalled_move_seconds = stalled_move_seconds      # moves older than this are rolled back
+        os.makedirs(cold_dir, exist_ok=True)
+
+        try:
+            self.index.create_index([('tier', ASCENDING), ('last_access', ASCENDING)])
+        except Exception as index_error:
+            print(f"Error creating storage index: {index_error}")
+
+    # GridFS-compatible interface
+
+    def put(self, data, **kwargs):
+        file_id = self.fs.put(data, **kwargs)
+        now = datetime.datetime.utcnow()
+        self.index.insert_one({
+            '_id': file_id,
+            'tier': HOT,
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'created_at': now,
+            'tier_since': now,
+            'last_access': now,
+            'access_count': 0,
+        })
+        return file_id
+
+    def get(self, file_id):
+        entry = self.index.find_one_and_update(
+            {'_id': file_id},
+            {'$set': {'last_access': datetime.datetime.utcnow()}, '$inc': {'access_count': 1}}
+        )
+        if entry is None or entry['tier'] == HOT:
+            # Files stored before tiering have no entry and are always hot
+            return self.fs.get(file_id)
+
+        document = self.files.find_one({'_id': file_id})
+        if document is None:
+            raise FileNotFoundError(f"No stored file {file_id}")
+        if entry['tier'] == DEMOTING:
+            # The chunks are deleted only once the cold copy is recorded; read them eagerly while they exist
+            try:
+                return ColdFile(document, self.fs.get(file_id).read())
+            except Exception:
+                entry = self.index.find_one({'_id': file_id})
+                if entry['tier'] == HOT:
+                    return self.fs.get(file_id)     # the demotion was rolled back
+        data = self._read_object(entry['sha256'])
+        # A file another reader is already promoting is served from the cold copy
+        if self.promote_on_read and entry['tier'] == COLD:
+            self._promote(document, data)
+        return ColdFile(document, data)
+
+    # Cold object store
+
+    def _object_path(self, sha256):
+        return os.path.join(self.cold_dir, sha256[:2], sha256[2:4], f"{sha256}.z")
+
+    def _write_object(self, sha256, data):
+        path = self._object_path(sha256)
+        if os.path.exists(path):
+            return os.path.getsize(path)        # content-addressed: already stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(zlib.compress(data, self.compression_level))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def _read_object(self, sha256):
+        with open(self._object_path(sha256), 'rb') as file:
+            data = zlib.decompress(file.read())
+        if hashlib.sha256(data).hexdigest() != sha256:
+            raise IOError(f"Cold object {sha256} is corrupt")
+        return data
+
+    # Tier moves
+
+    def _claim(self, file_id, tier, moving, **conditions):
+        now = datetime.datetime.utcnow()
+        return self.index.find_one_and_update(dict(conditions, _id=file_id, tier=tier),
+                                              {'$set': {'tier': moving, 'moving_since': now}})
+
+    def _finish(self, file_id, moving, tier, fields=None):
+        """Complete a claimed move; False when the claim was rolled back meanwhile."""
+        result = self.index.update_one({'_id': file_id, 'tier': moving}, {
+            '$set': dict(fields or {}, tier=tier, tier_since=datetime.datetime.utcnow()),
+            '$unset': {'moving_since': ''},
+        })
+        return result.modified_count == 1
+
+    def demote(self, file_id):
+        """
+        Move one file's bytes to the cold tier and drop its GridFS chunks.
+        Returns (bytes, bytes on disk), or None when the file is not hot or was read recently.
+        """
+        now = datetime.datetime.utcnow()
+        if self._claim(file_id, HOT, DEMOTING,
+                       last_access={'$lt': now - datetime.timedelta(seconds=self.read_grace_seconds)}) is None:
+            return None
+        try:
+            data = self.fs.get(file_id).read()
+            sha256 = hashlib.sha256(data).hexdigest()
+            stored_size = self._write_object(sha256, data)
+            self._read_object(sha256)     # verify before deleting the only other copy
+        except Exception:
+            self._finish(file_id, DEMOTING, HOT)
+            raise
+
+        if not self._finish(file_id, DEMOTING, COLD, {'sha256': sha256, 'size': len(data),
+                                                      'stored_size': stored_size, 'demoted_at': now}):
+            return None
+        self.chunks.delete_many({'files_id': file_id})
+        return len(data), stored_size
+
+    def _promote(self, document, data):
+        file_id = document['_id']
+        if self._claim(file_id, COLD, PROMOTING) is None:
+            return False
+        chunk_size = document.get('chunkSize', 255 * 1024)
+        try:
+            # Leftovers of an interrupted promotion are replaced
+            self.chunks.delete_many({'files_id': file_id})
+            self.chunks.insert_many([
+                {'files_id': file_id, 'n': n, 'data': Binary(data[offset:offset + chunk_size])}
+                for n, offset in enumerate(range(0, len(data), chunk_size))
+            ] or [{'files_id': file_id, 'n': 0, 'data': Binary(b'')}])
+        except Exception as promote_error:
+            print(f"Error promoting {file_id}: {promote_error}")
+            self._finish(file_id, PROMOTING, COLD)
+            return False
+        # tier_since restarts the demotion age, so a file that is read again is not demoted right away
+        self.index.update_one({'_id': file_id, 'tier': PROMOTING}, {
+            '$set': {'tier': HOT, 'tier_since': datetime.datetime.utcnow(), 'access_count': 1},
+            '$unset': {'demoted_at': '', 'moving_since': ''},
+        })
+        return True
+
+    def recover_stalled(self):
+        """
+        Roll back moves interrupted by a crash. A demotion deletes chunks only after the file is cold, so
+        it goes back to hot; a promotion may have partial chunks, so it goes back to cold.
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.stalled_move_seconds)
+        recovered = 0
+        for moving, tier in ((DEMOTING, HOT), (PROMOTING, COLD)):
+            recovered += self.index.update_many({'tier': moving, 'moving_since': {'$lt': cutoff}}, {
+                '$set': {'tier': tier}, '$unset': {'moving_since': ''},
+            }).modified_count
+        return recovered
+
+    def demotion_candidates(self, now=None):
+        """Hot files that are old and rarely read, or idle for longer than `idle_days`."""
+        now = now or datetime.datetime.utcnow()
+        aged = now - datetime.timedelta(days=self.demote_after_days)
+        return self.index.find({'tier': HOT, '$or': [
+            # Entries written before tier_since existed are aged by created_at
+            {'tier_since': {'$lt': aged}, 'access_count': {'$lt': self.hot_min_reads}},
+            {'tier_since': {'$exists': False}, 'created_at': {'$lt': aged},
+             'access_count': {'$lt': self.hot_min_reads}},
+            {'last_access': {'$lt': now - datetime.timedelta(days=self.idle_days)}},
+        ]}, {'_id': 1})
+
+    def register_existing(self):
+        """Index files uploaded before tiering so the sweep can consider them."""
+        indexed = 0
+        for document in self.files.find({}, {'_id': 1, 'length': 1, 'uploadDate': 1}):
+            result = self.index.update_one({'_id': document['_id']}, {'$setOnInsert': {
+                'tier': HOT,
+                'size': document.get('length', 0),
+                'created_at': document.get('uploadDate'),
+                'last_access': document.get('uploadDate'),
+                'access_count': 0,
+            }}, upsert=True)
+            indexed += int(result.upserted_id is not None)
+        return indexed
+
+    def sweep(self, limit=1000):
+        """Demote up to `limit` candidates; returns (files, bytes freed in MongoDB, bytes on disk)."""
+        recovered = self.recover_stalled()
+        if recovered:
+            print(f"Rolled back {recovered} interrupted tier moves")
+        moved = freed = stored = 0
+        for entry in self.demotion_candidates().limit(limit):
+            try:
+                result = self.demote(entry['_id'])
+            except Exception as demote_error:
+                print(f"Error demoting {entry['_id']}: {demote_error}")
+                continue
+            if result is None:
+                continue        # claimed by another sweep, or read since it was listed
+            size, stored_size = result
+            moved += 1
+            freed += size
+            stored += stored_size
+        return moved, freed, stored
+
+    def stats(self):
+        totals = {HOT: {'files': 0, 'bytes': 0}, COLD: {'files': 0, 'bytes': 0, 'stored_bytes': 0}}
+        for row in self.index.aggregate([{'$group': {
+            '_id': '$tier', 'files': {'$sum': 1}, 'bytes': {'$sum': '$size'}, 'stored_bytes': {'$sum': '$stored_size'}
+        }}]):
+            tier = totals.setdefault(row['_id'], {'files': 0, 'bytes': 0})
+            tier.update({key: row[key] for key in tier})
+        return totals
+
+
+def storage_from_env(database, collection_name):
+    """Storage configured from the same environment variables the app reads, for scripts and workers."""
+    from gridfs import GridFS
+
+    return TieredStorage(
+        GridFS(database, collection=collection_name), database, collection_name,
+        os.getenv('COLD_STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cold_storage')),
+        demote_after_days=float(os.getenv('STORAGE_DEMOTE_AFTER_DAYS', '30')),
+        idle_days=float(os.getenv('STORAGE_IDLE_DAYS', '7')),
+        hot_min_reads=int(os.getenv('STORAGE_HOT_MIN_READS', '3'))
+    )
+
+
+def main():
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Tiered audio storage maintenance")
+    parser.add_argument('command', choices=['demote', 'register', 'stats'])
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    database = MongoClient(os.getenv('MONGODB_URI', 'mongodb://127.0.0.1:27017/voice_guard'))[
+        os.getenv('MONGODB_DB_NAME', 'voice_guard')]
+    storage = storage_from_env(database, os.getenv('MONGODB_AUDIO_COLLECTION_NAME', 'audio_files'))
+
+    if args.command == 'register':
+        print(f"Indexed {storage.register_existing()} existing files")
+    elif args.command == 'demote':
+        moved, freed, stored = storage.sweep(args.limit)
+        print(f"Demoted {moved} files: {freed / 1e6:.1f} MB freed in MongoDB, {stored / 1e6:.1f} MB on disk")
+    else:
+        print(storage.stats())
+
+
+if __name__ == '__main__':
+    main()
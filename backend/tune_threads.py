@@ -0,0 +1,183 @@
+"""
+Find torch thread, worker and batch settings for this host.
+
+Every (workers x intra-op threads x batch size) combination runs the analyze
+workload (a batched classifier forward pass over synthetic speech-like clips) in
+`workers` concurrent processes, the way gunicorn workers would share the CPU.
+Throughput and p95 request latency are measured. The best configuration that
+meets the latency budget is written to runtime_config.json, which the backend
+applies at startup.
+
+    python backend/tune_threads.py --workers 1 2 4 --threads 1 2 4 8 --batch-sizes 1 4
+"""
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from runtime_config import RUNTIME_CONFIG_PATH, THREAD_ENV_VARS
+
+
+def synthetic_clips(count, durations, sr, seed=0):
+    """Voiced-like clips: harmonic stacks with vibrato, syllable envelopes and noise."""
+    rng = np.random.default_rng(seed)
+    clips = []
+    for index in range(count):
+        duration = durations[index % len(durations)]
+        t = np.arange(int(duration * sr)) / sr
+        f0 = rng.uniform(90, 220) * (1 + 0.03 * np.sin(2 * np.pi * rng.uniform(3, 6) * t))
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+        clip = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+        clips.append(clip.astype(np.float32))
+    return clips
+
+
+def _benchmark_worker(model_id, threads, batch_size, requests, durations, barrier, results):
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+
+    import torch
+    from transformers import pipeline
+    from inference import classify_waveforms
+
+    torch.set_num_threads(threads)
+    classifier = pipeline("audio-classification", model=model_id)
+    sr = getattr(classifier.feature_extractor, 'sampling_rate', 16000)
+    clips = synthetic_clips(requests * batch_size, durations, sr, seed=os.getpid())
+
+    classify_waveforms(classifier, clips[:batch_size], sr)    # warm-up
+    barrier.wait()
+
+    latencies = []
+    started = time.perf_counter()
+    for position in range(0, len(clips), batch_size):
+        request_started = time.perf_counter()
+        classify_waveforms(classifier, clips[position:position + batch_size], sr)
+        latencies.append(time.perf_counter() - request_started)
+    results.put((time.perf_counter() - started, len(clips), latencies))
+
+
+def measure(model_id, workers, threads, batch_size, requests, durations, timeout=1800.0):
+    """
+    Run one grid point; returns throughput (clips/s) and latency percentiles (s).
+    Raises RuntimeError when a worker crashes (e.g. out of memory) or the point exceeds `timeout` seconds.
+    """
+    context = mp.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_benchmark_worker,
+                        args=(model_id, threads, batch_size, requests, durations, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    outcomes = []
+    deadline = time.monotonic() + timeout
+    try:
+        while len(outcomes) < workers:
+            try:
+                outcomes.append(results.get(timeout=1.0))
+                continue
+            except queue.Empty:
+                pass
+            crashed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+            if crashed:
+                raise RuntimeError(f"benchmark worker exited with code {crashed[0]}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"no result within {timeout:.0f}s")
+    finally:
+        # The surviving workers of a failed point would otherwise wait on the barrier forever
+        for process in processes:
+            if len(outcomes) < workers and process.is_alive():
+                process.terminate()
+            process.join()
+
+    wall = max(elapsed for elapsed, _, _ in outcomes)
+    clips = sum(count for _, count, _ in outcomes)
+    latencies = np.concatenate([latency for _, _, latency in outcomes])
+    return {
+        'workers': workers,
+        'threads': threads,
+        'batch_size': batch_size,
+        'throughput': round(clips / wall, 3),
+        'p50_latency': round(float(np.percentile(latencies, 50)), 4),
+        'p95_latency': round(float(np.percentile(latencies, 95)), 4),
+    }
+
+
+def recommend(results, max_p95=None):
+    """Highest throughput within the p95 budget, or the lowest p95 if none fits."""
+    eligible = [item for item in results if max_p95 is None or item['p95_latency'] <= max_p95]
+    if eligible:
+        return max(eligible, key=lambda item: (item['throughput'], -item['p95_latency']))
+    return min(results, key=lambda item: item['p95_latency'])
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Tune torch threads, worker count and batch size for this host")
+    parser.add_argument('--model', default=os.getenv('DEEPFAKE_MODEL_ID', 'MelodyMachine/Deepfake-audio-detection-V2'))
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, cpu_count])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--requests', type=int, default=8, help="requests per worker per grid point")
+    parser.add_argument('--durations', type=float, nargs='+', default=[4.0, 10.0],
+                        help="synthetic clip lengths in seconds (cycled)")
+    parser.add_argument('--max-p95', type=float, default=None, help="p95 latency budget in seconds")
+    parser.add_argument('--timeout', type=float, default=1800.0, help="seconds allowed per grid point")
+    parser.add_argument('--output', default=RUNTIME_CONFIG_PATH)
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        for threads in sorted(set(args.threads)):
+            if workers * threads > cpu_count:
+                continue    # oversubscribed by construction
+            for batch_size in args.batch_sizes:
+                try:
+                    result = measure(args.model, workers, threads, batch_size, args.requests, args.durations,
+                                     timeout=args.timeout)
+                except RuntimeError as measure_error:
+                    print(f"workers={workers} threads={threads} batch={batch_size}: skipped ({measure_error})")
+                    continue
+                results.append(result)
+                print(f"workers={workers} threads={threads} batch={batch_size}: "
+                      f"{result['throughput']:.2f} clips/s, p95 {result['p95_latency']:.3f}s")
+
+    if not results:
+        print("No grid point fits on this host")
+        return
+
+    best = recommend(results, args.max_p95)
+    config = {
+        'torch_threads': best['threads'],
+        'interop_threads': 1,
+        'workers': best['workers'],
+        'batch_size': best['batch_size'],
+        'measured': best,
+        'host': {'cpu_count': cpu_count, 'machine': platform.machine(), 'processor': platform.processor()},
+        'model_id': args.model,
+        'max_p95': args.max_p95,
+        'tuned_at': datetime.datetime.utcnow().isoformat(),
+        'grid': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(config, file, indent=2)
+    print(f"Recommended workers={best['workers']} threads={best['threads']} batch={best['batch_size']} "
+          f"-> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Energy / spectral-flux voice activity detection.
+
+Frames are flagged as speech when their log energy clears an adaptive noise
+floor, with spectral flux lowering the bar for onsets that energy alone would
+miss. A hysteresis state machine (separate on/off thresholds, minimum segment
+length and hangover) turns the frame flags into segments, so the classifier can
+skip silence and steady room noise.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+FRAME_MS = 25
+HOP_MS = 10
+ABSOLUTE_FLOOR_DB = -60.0     # frames quieter than this are never speech
+ON_MARGIN_DB = 9.0            # above the noise floor to open a segment
+OFF_MARGIN_DB = 5.0           # below this (over the floor) the segment may close
+FLUX_BONUS_DB = 3.0           # on-threshold relief for strong spectral change
+MIN_SPEECH_MS = 120
+HANGOVER_MS = 200
+PAD_MS = 50
+
+
+def frame_features(waveform, sr, frame_ms=FRAME_MS, hop_ms=HOP_MS):
+    """
+    Per-frame log energy (dBFS) and normalized positive spectral flux.
+
+    Returns:
+        tuple: (energy_db, flux) float32 arrays of equal length, and the hop in samples
+    """
+    waveform = np.asarray(waveform, dtype=np.float32)
+    frame = max(1, int(sr * frame_ms / 1000))
+    hop = max(1, int(sr * hop_ms / 1000))
+    if len(waveform) < frame:
+        waveform = np.pad(waveform, (0, frame - len(waveform)))
+
+    frames = np.lib.stride_tricks.sliding_window_view(waveform, frame)[::hop]
+    energy_db = 10.0 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame).astype(np.float32), axis=1))
+    spectrum /= np.maximum(spectrum.sum(axis=1, keepdims=True), 1e-10)
+    flux = np.zeros(len(frames), dtype=np.float32)
+    flux[1:] = np.maximum(np.diff(spectrum, axis=0), 0.0).sum(axis=1)
+    return energy_db.astype(np.float32), flux, hop
+
+
+def detect_speech(waveform, sr, on_margin_db=ON_MARGIN_DB, off_margin_db=OFF_MARGIN_DB,
+                  min_speech_ms=MIN_SPEECH_MS, hangover_ms=HANGOVER_MS, pad_ms=PAD_MS):
+    """
+    Speech segments of a mono waveform as a list of (start_sample, end_sample).
+    """
+    energy_db, flux, hop = frame_features(waveform, sr)
+    noise_floor = max(float(np.percentile(energy_db, 10)), ABSOLUTE_FLOOR_DB)
+
+    # Flux is scale-free; frames well above its median get a lower on-threshold
+    flux_high = flux > 2.0 * np.median(flux) + 1e-6
+    on_threshold = noise_floor + on_margin_db - FLUX_BONUS_DB * flux_high
+    off_threshold = noise_floor + off_margin_db
+    audible = energy_db > ABSOLUTE_FLOOR_DB
+
+    start_frames = energy_db > on_threshold
+    keep_frames = energy_db > off_threshold
+    hangover = max(1, int(round(hangover_ms / HOP_MS)))
+    min_frames = max(1, int(round(min_speech_ms / HOP_MS)))
+
+    segments = []
+    active, start, quiet = False, 0, 0
+    for index in range(len(energy_db)):
+        if not active:
+            if start_frames[index] and audible[index]:
+                active, start, quiet = True, index, 0
+        elif keep_frames[index] and audible[index]:
+            quiet = 0
+        else:
+            quiet += 1
+            if quiet > hangover:
+                end = index - quiet + 1
+                if end - start >= min_frames:
+                    segments.append((start, end))
+                active = False
+    if active and len(energy_db) - start >= min_frames:
+        segments.append((start, len(energy_db)))
+
+    # Frames -> padded sample ranges, merging ranges that touch after padding
+    pad = int(sr * pad_ms / 1000)
+    frame = int(sr * FRAME_MS / 1000)
+    samples = []
+    for start, end in segments:
+        begin = max(0, start * hop - pad)
+        finish = min(len(waveform), (end - 1) * hop + frame + pad)
+        if samples and begin <= samples[-1][1]:
+            samples[-1] = (samples[-1][0], max(samples[-1][1], finish))
+        else:
+            samples.append((begin, finish))
+    return samples
+
+
+def trim_silence(waveform, sr, **options):
+    """
+    Concatenate the speech segments of a waveform.
+
+    Returns:
+        tuple: (trimmed waveform, segments, speech seconds). When no speech is found
+        the original waveform is returned with an empty segment list.
+    """
+    waveform = np.asarray(waveform, dtype=np.float32)
+    segments = detect_speech(waveform, sr, **options)
+    if not segments:
+        return waveform, [], 0.0
+    trimmed = np.concatenate([waveform[start:end] for start, end in segments])
+    return trimmed, segments, len(trimmed) / sr
+
+
+def speech_windows(segments, n_samples, window, hop, min_speech_ratio=0.3):
+    """
+    Start offsets of fixed windows that contain at least `min_speech_ratio` speech.
+    Used by chunked analysis to skip silent windows instead of cutting them out.
+    """
+    starts = np.arange(0, max(1, n_samples - window + 1), hop)
+    if n_samples > window and starts[-1] != n_samples - window:
+        starts = np.append(starts, n_samples - window)      # the tail gets a window aligned to the end
+    ends = np.minimum(starts + window, n_samples)
+    if not segments:
+        return starts[:0]
+    segment_starts = np.array([start for start, _ in segments])
+    segment_lengths = np.array([end - start for start, end in segments])
+
+    def covered(points):
+        # Speech samples before each point
+        return np.clip(points[:, None] - segment_starts[None, :], 0, segment_lengths[None, :]).sum(axis=1)
+
+    ratio = (covered(ends) - covered(starts)) / np.maximum(ends - starts, 1)
+    return starts[ratio >= min_speech_ratio]
+
+
+def benchmark(audio_dir, sr=16000, model_id=None):
+    """
+    Report how much audio (and, with a model, inference time) the VAD removes
+    over a folder of recordings.
+    """
+    import librosa
+
+    paths = sorted(
+        os.path.join(audio_dir, name) for name in os.listdir(audio_dir)
+        if name.lower().endswith(('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.webm', '.aac'))
+    )
+    classifier = None
+    if model_id:
+        from transformers import pipeline
+        from inference import classify_waveforms
+        classifier = pipeline("audio-classification", model=model_id)
+
+    totals = {'audio': 0.0, 'speech': 0.0, 'vad': 0.0, 'full_inference': 0.0, 'trimmed_inference': 0.0}
+    for path in paths:
+        waveform, _ = librosa.load(path, sr=sr, mono=True)
+        started = time.perf_counter()
+        trimmed, _, speech_seconds = trim_silence(waveform, sr)
+        totals['vad'] += time.perf_counter() - started
+        totals['audio'] += len(waveform) / sr
+        totals['speech'] += speech_seconds
+
+        if classifier is not None:
+            started = time.perf_counter()
+            classify_waveforms(classifier, [waveform], sr)
+            totals['full_inference'] += time.perf_counter() - started
+            started = time.perf_counter()
+            classify_waveforms(classifier, [trimmed], sr)
+            totals['trimmed_inference'] += time.perf_counter() - started
+
+    if not paths:
+        print(f"No audio files in {audio_dir}")
+        return totals
+    print(f"Files: {len(paths)}")
+    print(f"Audio: {totals['audio']:.1f}s, speech: {totals['speech']:.1f}s "
+          f"({100 * (1 - totals['speech'] / max(totals['audio'], 1e-9)):.1f}% removed)")
+    print(f"VAD time: {totals['vad']:.3f}s ({totals['audio'] / max(totals['vad'], 1e-9):.0f}x realtime)")
+    if classifier is not None:
+        print(f"Inference: full {totals['full_inference']:.2f}s, trimmed {totals['trimmed_inference']:.2f}s "
+              f"({100 * (1 - totals['trimmed_inference'] / max(totals['full_inference'], 1e-9)):.1f}% saved)")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how much silence the VAD trims from recordings")
+    parser.add_argument('audio_dir')
+    parser.add_argument('--sr', type=int, default=16000)
+    parser.add_argument('--model', default=None, help="Hugging Face model id to also time inference")
+    args = parser.parse_args()
+    benchmark(args.audio_dir, args.sr, args.model)
+
+
+if __name__ == '__main__':
+    main()
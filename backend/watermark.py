@@ -0,0 +1,96 @@
+"""
+Reading back the LSB watermark written by ML/New/watermarking.py.
+
+The embedder writes the bits of `unique_hex_code` (4 per hex digit, most
+significant first) into the least significant bits of the first interleaved
+16-bit samples. Only those leading frames are needed, so verification reads at
+most PAYLOAD_BITS samples: a seek and a short read for WAV, and one
+libsndfile block for FLAC. Bits are pulled out with one mask and packed with
+`np.packbits`. Codes are 128 bits (CSV dataset) or 64 bits (codes generated by
+the app), so both the full payload and its 64-bit prefix are looked up in the
+`provenance` collection, which is keyed by hex code.
+"""
+import datetime
+import io
+
+import numpy as np
+from pymongo import UpdateOne
+
+PAYLOAD_BITS = 128
+CODE_BITS = (128, 64)
+LOSSLESS_FORMATS = ('wav', 'flac')
+
+
+def read_leading_samples(stream, n_samples):
+    """
+    First `n_samples` interleaved int16 samples of a WAV/FLAC stream, without decoding the rest.
+    The stream position is restored afterwards.
+    """
+    import soundfile as sf
+
+    position = stream.tell()
+    try:
+        with sf.SoundFile(stream) as audio:
+            frames = -(-n_samples // audio.channels)
+            samples = audio.read(frames, dtype='int16', always_2d=True)
+    finally:
+        stream.seek(position)
+    # (frames, channels) in C order is the interleaved sample order
+    return samples.ravel()[:n_samples]
+
+
+def extract_bits(samples, n_bits=PAYLOAD_BITS):
+    return (np.asarray(samples[:n_bits]).astype(np.int16) & 1).astype(np.uint8)
+
+
+def candidate_codes(bits):
+    """Hex codes the payload could hold, longest first."""
+    return [np.packbits(bits[:n_bits]).tobytes().hex() for n_bits in CODE_BITS if len(bits) >= n_bits]
+
+
+def extract_codes(audio_bytes):
+    """Candidate codes from the raw bytes of a WAV/FLAC file."""
+    samples = read_leading_samples(io.BytesIO(audio_bytes), PAYLOAD_BITS)
+    return candidate_codes(extract_bits(samples))
+
+
+def lookup(collection, codes):
+    """The provenance record of the first candidate code that is registered, or None."""
+    if not codes:
+        return None
+    found = {record['_id']: record for record in collection.find({'_id': {'$in': codes}})}
+    for code in codes:
+        if code in found:
+            return found[code]
+    return None
+
+
+def register(collection, hex_code, **fields):
+    collection.update_one({'_id': hex_code}, {'$setOnInsert': dict(
+        fields, created_at=datetime.datetime.utcnow())}, upsert=True)
+
+
+def sync_from_csv(collection, csv_path):
+    """Upsert every row of the provenance CSV; existing records are left as they are."""
+    import csv
+
+    operations = []
+    with open(csv_path, 'r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            operations.append(UpdateOne({'_id': row['unique_hex_code'].lower()}, {'$setOnInsert': {
+                'filename': row.get('audio_file_name'),
+                'name': row.get('name'),
+                'label': row.get('label'),
+                'source': 'csv',
+                'created_at': datetime.datetime.utcnow(),
+            }}, upsert=True))
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def lookup_prefix(collection, prefix):
+    """The provenance record whose code starts with `prefix` (spread-spectrum payloads carry a prefix)."""
+    if not prefix:
+        return None
+    return collection.find_one({'_id': {'$regex': f"^{prefix.lower()}"}})
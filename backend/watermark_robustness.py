@@ -0,0 +1,283 @@
+"""
+Watermark robustness matrix: every scheme against every attack across a corpus.
+
+Each corpus clip is watermarked once per scheme, as 16 kHz mono 16-bit WAV.
+Every marked clip then goes through each attack: a codec round trip through
+ffmpeg at several bitrates, resampling, additive noise at a fixed SNR, or
+trimming the start. The payload is read back, and the bit error rate and
+detection time are recorded. Work items run in a process pool. Each one uses
+its own temporary directory, so ffmpeg outputs never collide. Marked and
+attacked clips are cached by content hash, so re-running after changing only
+the detector does not transcode again.
+
+    python backend/watermark_robustness.py ML/New/Data/REAL --workers 8 --output robustness.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import spread_spectrum
+import watermark
+
+SR = 16000
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.webm', '.aac')
+
+# name -> (kind, parameters)
+ATTACKS = {
+    'none': ('none', {}),
+    'mp3_64k': ('codec', {'codec': 'libmp3lame', 'ext': 'mp3', 'bitrate': '64k'}),
+    'mp3_128k': ('codec', {'codec': 'libmp3lame', 'ext': 'mp3', 'bitrate': '128k'}),
+    'mp3_192k': ('codec', {'codec': 'libmp3lame', 'ext': 'mp3', 'bitrate': '192k'}),
+    'aac_64k': ('codec', {'codec': 'aac', 'ext': 'm4a', 'bitrate': '64k'}),
+    'aac_128k': ('codec', {'codec': 'aac', 'ext': 'm4a', 'bitrate': '128k'}),
+    'opus_24k': ('codec', {'codec': 'libopus', 'ext': 'ogg', 'bitrate': '24k'}),
+    'opus_48k': ('codec', {'codec': 'libopus', 'ext': 'ogg', 'bitrate': '48k'}),
+    'resample_8k': ('resample', {'rate': 8000}),
+    'resample_22k': ('resample', {'rate': 22050}),
+    'noise_30db': ('noise', {'snr_db': 30.0}),
+    'noise_20db': ('noise', {'snr_db': 20.0}),
+    'trim_0.5s': ('trim', {'seconds': 0.5}),
+    'trim_1.37s': ('trim', {'seconds': 1.37}),
+}
+
+
+def payload_code(content_hash):
+    """Deterministic 128-bit test code per clip content."""
+    return hashlib.sha256(f"payload-{content_hash}".encode('utf-8')).hexdigest()[:32]
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _write_atomic(path, samples):
+    import soundfile as sf
+
+    tmp_path = f"{path}.{os.getpid()}.tmp.wav"
+    sf.write(tmp_path, samples, SR, subtype='PCM_16')
+    os.replace(tmp_path, path)
+
+
+def _read_int16(path):
+    import soundfile as sf
+
+    samples, _ = sf.read(path, dtype='int16', always_2d=True)
+    return samples.mean(axis=1).astype(np.int16) if samples.shape[1] > 1 else samples[:, 0]
+
+
+# Schemes: embed(float waveform, code, key) -> int16 samples;
+# extract(int16 samples, key, code) -> (bits or None, detected, detail). `code` is the embedded
+# code and stands in for the provenance registry the deployed lookup would consult.
+
+def _lsb_embed(waveform, code, key):
+    samples = np.clip(np.round(waveform * 32767), -32768, 32767).astype(np.int16)
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(code), dtype=np.uint8))
+    samples[:len(bits)] = (samples[:len(bits)] & ~np.int16(1)) | bits
+    return samples
+
+
+def _lsb_extract(samples, key, code):
+    # LSBs always read as some bits; like watermark.lookup, only a code that resolves counts
+    bits = watermark.extract_bits(samples)
+    codes = watermark.candidate_codes(bits)
+    return bits, code in codes, {'code': codes[0] if codes else None}
+
+
+def _ss_embed(waveform, code, key):
+    marked = spread_spectrum.embed(waveform, key, code)
+    return np.clip(np.round(marked * 32767), -32768, 32767).astype(np.int16)
+
+
+def _ss_extract(samples, key, code):
+    result = spread_spectrum.detect(samples.astype(np.float32) / 32768.0, key)
+    bits = spread_spectrum.code_to_bits(result['code']) if result['detected'] else None
+    return bits, result['detected'], {'z_score': result['z_score'], 'offset_seconds': result['offset_seconds'],
+                  'min_bit_margin': result['min_bit_margin']}
+
+
+SCHEMES = {
+    'lsb': (_lsb_embed, _lsb_extract, watermark.PAYLOAD_BITS),
+    'spread_spectrum': (_ss_embed, _ss_extract, spread_spectrum.PAYLOAD_BITS),
+}
+
+
+def _expected_bits(code, n_bits):
+    return np.unpackbits(np.frombuffer(bytes.fromhex(code), dtype=np.uint8))[:n_bits]
+
+
+# Workers
+
+def mark_clip(source, scheme, key, cache_dir):
+    """
+    Watermarked copy of one corpus clip, cached by source content, scheme and key.
+    Returns (source, scheme, code, marked path or None, error or None).
+    """
+    import librosa
+
+    try:
+        content_hash = _file_hash(source)
+    except OSError as read_error:
+        return source, scheme, None, None, str(read_error)
+    code = payload_code(content_hash)
+    key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()[:8]
+    marked_path = os.path.join(cache_dir, 'marked', f"{content_hash}-{scheme}-{key_hash}.wav")
+    if not os.path.exists(marked_path):
+        try:
+            waveform, _ = librosa.load(source, sr=SR, mono=True)
+            _write_atomic(marked_path, SCHEMES[scheme][0](waveform, code, key))
+        except Exception as decode_error:      # librosa's decoders and soundfile raise unrelated types
+            return source, scheme, code, None, str(decode_error)
+    return source, scheme, code, marked_path, None
+
+
+def _ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y', *args], check=True)
+
+
+def _attack(marked_path, attack, attacked_path, workdir):
+    kind, params = ATTACKS[attack]
+    if kind == 'none':
+        shutil.copyfile(marked_path, attacked_path)
+    elif kind == 'codec':
+        encoded = os.path.join(workdir, f"encoded.{params['ext']}")
+        _ffmpeg('-i', marked_path, '-c:a', params['codec'], '-b:a', params['bitrate'], encoded)
+        _ffmpeg('-i', encoded, '-ac', '1', '-ar', str(SR), '-c:a', 'pcm_s16le', attacked_path)
+    elif kind == 'resample':
+        resampled = os.path.join(workdir, 'resampled.wav')
+        _ffmpeg('-i', marked_path, '-ar', str(params['rate']), resampled)
+        _ffmpeg('-i', resampled, '-ar', str(SR), '-c:a', 'pcm_s16le', attacked_path)
+    else:
+        samples = _read_int16(marked_path).astype(np.float64)
+        if kind == 'noise':
+            # Seeded by the clip so cached and fresh runs see the same noise
+            rng = np.random.default_rng(int(hashlib.sha256(os.path.basename(marked_path).encode()).hexdigest()[:8], 16))
+            power = np.mean(samples ** 2) / 10 ** (params['snr_db'] / 10)
+            samples = samples + rng.normal(0.0, np.sqrt(power), len(samples))
+        else:
+            samples = samples[int(params['seconds'] * SR):]
+        _write_atomic(attacked_path, np.clip(np.round(samples), -32768, 32767).astype(np.int16))
+
+
+def run_case(source, scheme, code, marked_path, attack, key, cache_dir):
+    """Attack one marked clip (cached) and read the payload back; returns one result row."""
+    attacked_path = os.path.join(cache_dir, 'attacked',
+                                 f"{os.path.splitext(os.path.basename(marked_path))[0]}-{attack}.wav")
+    row = {'source': source, 'scheme': scheme, 'attack': attack}
+    try:
+        if not os.path.exists(attacked_path):
+            # Private scratch directory: concurrent ffmpeg runs never share an output path
+            with tempfile.TemporaryDirectory(prefix='wm-robustness-') as workdir:
+                staged = os.path.join(workdir, 'attacked.wav')
+                _attack(marked_path, attack, staged, workdir)
+                # The scratch directory may be on another filesystem; publish into the cache atomically
+                tmp_path = f"{attacked_path}.{os.getpid()}.tmp"
+                shutil.copyfile(staged, tmp_path)
+                os.replace(tmp_path, attacked_path)
+        samples = _read_int16(attacked_path)
+    except Exception as attack_error:       # ffmpeg failures and unreadable outputs alike
+        row['error'] = str(attack_error)
+        return row
+
+    _, extract, n_bits = SCHEMES[scheme]
+    started = time.perf_counter()
+    bits, detected, detail = extract(samples, key, code)
+    row['detect_seconds'] = time.perf_counter() - started
+    row['detected'] = bool(detected)
+    row['ber'] = (float(np.mean(bits[:n_bits] != _expected_bits(code, n_bits)))
+                  if bits is not None else None)
+    row.update(detail)
+    return row
+
+
+def summarize(rows):
+    """Per (scheme, attack): clips, detection rate, mean BER of clips with bits read back, exact payload rate, timings."""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row['scheme'], row['attack']), []).append(row)
+
+    summary = []
+    for (scheme, attack), members in sorted(groups.items()):
+        ok = [row for row in members if 'error' not in row]
+        detected = [row for row in ok if row['detected']]
+        decoded = [row for row in ok if row['ber'] is not None]
+        times = np.array([row['detect_seconds'] for row in ok]) if ok else np.zeros(1)
+        summary.append({
+            'scheme': scheme,
+            'attack': attack,
+            'clips': len(members),
+            'errors': len(members) - len(ok),
+            'detection_rate': round(len(detected) / len(ok), 3) if ok else None,
+            'mean_ber': round(float(np.mean([row['ber'] for row in decoded])), 4) if decoded else None,
+            'exact_payload_rate': round(sum(row['ber'] == 0 for row in decoded) / len(ok), 3) if ok else None,
+            'detect_ms_mean': round(float(times.mean()) * 1000, 2),
+            'detect_ms_p95': round(float(np.percentile(times, 95)) * 1000, 2),
+        })
+    return summary
+
+
+def run_matrix(sources, schemes, attacks, key, cache_dir, workers=None):
+    for name in ('marked', 'attacked'):
+        os.makedirs(os.path.join(cache_dir, name), exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        marked = [future.result() for future in [
+            pool.submit(mark_clip, source, scheme, key, cache_dir) for source in sources for scheme in schemes
+        ]]
+        # A clip that could not be decoded counts as an error under every attack
+        rows = [{'source': source, 'scheme': scheme, 'attack': attack, 'error': error}
+                for source, scheme, _, _, error in marked if error is not None for attack in attacks]
+        futures = [pool.submit(run_case, source, scheme, code, marked_path, attack, key, cache_dir)
+                   for source, scheme, code, marked_path, error in marked if error is None for attack in attacks]
+        return rows + [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watermark robustness matrix over a corpus")
+    parser.add_argument('corpus', help="directory of audio clips")
+    parser.add_argument('--schemes', nargs='+', default=list(SCHEMES), choices=list(SCHEMES))
+    parser.add_argument('--attacks', nargs='+', default=list(ATTACKS), choices=list(ATTACKS))
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--limit', type=int, default=0, help="use at most this many clips (0 = all)")
+    parser.add_argument('--cache-dir', default=os.path.join(tempfile.gettempdir(), 'voice-guard-robustness'))
+    parser.add_argument('--key', default=os.getenv('WATERMARK_KEY', 'robustness-test-key'))
+    parser.add_argument('--output', default=None, help="JSON file with the summary and every result row")
+    args = parser.parse_args()
+
+    needs_ffmpeg = any(ATTACKS[attack][0] in ('codec', 'resample') for attack in args.attacks)
+    if needs_ffmpeg and shutil.which('ffmpeg') is None:
+        parser.error("ffmpeg is required for codec and resampling attacks")
+
+    sources = sorted(os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                     if name.lower().endswith(AUDIO_EXTENSIONS))
+    if args.limit:
+        sources = sources[:args.limit]
+
+    started = time.perf_counter()
+    rows = run_matrix(sources, args.schemes, args.attacks, args.key, args.cache_dir, args.workers)
+    summary = summarize(rows)
+    print(f"{len(rows)} cases over {len(sources)} clips in {time.perf_counter() - started:.1f}s")
+    print(f"{'scheme':<16} {'attack':<13} {'detected':>8} {'BER':>7} {'exact':>6} {'ms':>8} {'p95 ms':>8}")
+    for item in summary:
+        print(f"{item['scheme']:<16} {item['attack']:<13} {item['detection_rate'] or 0:>8.2f} "
+              f"{item['mean_ber'] if item['mean_ber'] is not None else float('nan'):>7.3f} "
+              f"{item['exact_payload_rate'] or 0:>6.2f} {item['detect_ms_mean']:>8.2f} {item['detect_ms_p95']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'summary': summary, 'results': rows}, file, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Write-behind buffer for fire-and-forget MongoDB inserts.
+
+Endpoints enqueue documents and return immediately. Each document gets a
+client-side ObjectId and is appended to a local JSON-lines spool before it is
+acknowledged. A background thread flushes the queue with `insert_many`
+whenever `max_batch` documents are waiting or `flush_interval` seconds have
+passed. Spool segments are deleted only after their documents are stored. On
+startup leftover segments are replayed, and duplicate-key errors from the replay
+are ignored, so every record is persisted at least once and stored exactly once.
+
+Every process spools to its own `<spool_path>.<pid>` file and holds an
+exclusive lock on `<spool_path>.<pid>.lock` while it runs (`flock`, or
+`msvcrt.locking` on Windows). A starting process
+adopts only the spools whose lock it can take, i.e. those of processes that have
+exited, so gunicorn workers never replay or delete each other's live records.
+"""
+import glob
+import os
+import threading
+import time
+from collections import defaultdict
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
+
+DUPLICATE_KEY = 11000
+
+
+def _lock(file, blocking=True):
+    """Exclusive lock on an open lock file; raises OSError if non-blocking and another process holds it."""
+    if fcntl is not None:
+        fcntl.flock(file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+
+class WriteBehindBuffer:
+    def __init__(self, database, spool_path, max_batch=500, flush_interval=1.0, write_concern='1',
+                 journal=False, fsync='always', max_queue=50000):
+        self.database = database
+        self.spool_base = spool_path
+        self.spool_path = f"{spool_path}.{os.getpid()}"
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        w = int(write_concern) if str(write_concern).isdigit() else write_concern
+        self.write_concern = WriteConcern(w=w, j=journal or None)
+        self.fsync = fsync                  # 'always': fsync per record, 'flush': once per flush cycle
+        self.max_queue = max_queue
+
+        self._queue = []                    # (collection name, document)
+        self._segments = []                 # rotated spool files whose documents are not yet stored
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._spool = None
+        self.stats = {'enqueued': 0, 'flushed': 0, 'duplicates': 0, 'errors': 0, 'sync_fallbacks': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(spool_path)), exist_ok=True)
+        self._owner_lock = open(f"{self.spool_path}.lock", 'a')
+        _lock(self._owner_lock)
+        self._recover()
+        self._spool = open(self.spool_path, 'a', encoding='utf-8')
+        threading.Thread(target=self._run, name='write-behind', daemon=True).start()
+
+    def _recover(self):
+        # Our own files can only be left over from an earlier process with the same pid
+        leftovers = self._adopt(self.spool_path)
+        for lock_path in glob.glob(f"{glob.escape(self.spool_base)}.*.lock"):
+            owner_path = lock_path[:-len('.lock')]
+            if owner_path == self.spool_path:
+                continue
+            try:
+                lock = open(lock_path, 'a')
+            except OSError:
+                continue            # adopted and removed by another process meanwhile
+            try:
+                _lock(lock, blocking=False)
+            except OSError:
+                lock.close()        # the owner is alive
+                continue
+            try:
+                leftovers.extend(self._adopt(owner_path))
+            finally:
+                lock.close()
+            try:
+                os.remove(lock_path)        # after closing: Windows cannot remove an open file
+            except OSError:
+                pass
+        leftovers.sort()
+
+        for segment in leftovers:
+            with open(segment, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json_util.loads(line)
+                    except ValueError:
+                        continue        # torn last line from a crash mid-write
+                    self._queue.append((record['c'], record['d']))
+            self._segments.append(segment)
+        if leftovers:
+            print(f"Write-behind: replaying {len(self._queue)} spooled records")
+
+    def _adopt(self, owner_path):
+        """Move a process's spool and segments into segments of ours; the caller holds its lock."""
+        adopted = []
+        sources = sorted(glob.glob(f"{glob.escape(owner_path)}.*.segment"))
+        if os.path.exists(owner_path):
+            if os.path.getsize(owner_path):
+                sources.append(owner_path)
+            else:
+                os.remove(owner_path)
+        for source in sources:
+            segment = f"{self.spool_path}.{time.time_ns()}.segment"
+            os.replace(source, segment)
+            adopted.append(segment)
+        return adopted
+
+    def enqueue(self, collection_name, document):
+        """
+        Queue a document for insertion and return its ObjectId without waiting on MongoDB.
+        Falls back to a synchronous insert when the in-memory queue is full.
+        """
+        document = dict(document)
+        document.setdefault('_id', ObjectId())
+
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                overflow = True
+            else:
+                overflow = False
+                self._spool.write(json_util.dumps({'c': collection_name, 'd': document},
+                                                  json_options=json_util.CANONICAL_JSON_OPTIONS) + '\n')
+                self._spool.flush()
+                if self.fsync == 'always':
+                    os.fsync(self._spool.fileno())
+                self._queue.append((collection_name, document))
+                self.stats['enqueued'] += 1
+                if len(self._queue) >= self.max_batch:
+                    self._wake.notify()
+
+        if overflow:
+            # Backpressure: do not grow without bound while MongoDB is slow
+            self.stats['sync_fallbacks'] += 1
+            self._collection(collection_name).insert_one(document)
+        return document['_id']
+
+    def _collection(self, name):
+        return self.database.get_collection(name, write_concern=self.write_concern)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._queue) < self.max_batch:
+                    self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as flush_error:
+                self.stats['errors'] += 1
+                print(f"Error flushing write-behind buffer: {flush_error}")
+                time.sleep(min(30.0, self.flush_interval * 5))
+
+    def flush(self):
+        """Write everything queued so far; raises (keeping the records queued) if MongoDB fails."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._queue:
+                    return 0
+                batch, self._queue = self._queue, []
+                # Rotate the spool so new records go to a fresh segment
+                if self.fsync == 'flush':
+                    os.fsync(self._spool.fileno())
+                self._spool.close()
+                if os.path.getsize(self.spool_path):
+                    segment = f"{self.spool_path}.{time.time_ns()}.segment"
+                    os.replace(self.spool_path, segment)
+                    self._segments.append(segment)
+                self._spool = open(self.spool_path, 'a', encoding='utf-8')
+
+            by_collection = defaultdict(list)
+            for collection_name, document in batch:
+                by_collection[collection_name].append(document)
+
+            try:
+                for collection_name, documents in by_collection.items():
+                    for start in range(0, len(documents), self.max_batch):
+                        self._insert(collection_name, documents[start:start + self.max_batch])
+            except PyMongoError:
+                with self._lock:
+                    # Already-stored documents come back as duplicates on retry and are skipped
+                    self._queue = batch + self._queue
+                raise
+
+            with self._lock:
+                segments, self._segments = self._segments, []
+            for segment in segments:
+                os.remove(segment)
+            self.stats['flushed'] += len(batch)
+            return len(batch)
+
+    def _insert(self, collection_name, documents):
+        try:
+            self._collection(collection_name).insert_many(documents, ordered=False)
+        except BulkWriteError as bulk_error:
+            errors = bulk_error.details.get('writeErrors', [])
+            if any(error.get('code') != DUPLICATE_KEY for error in errors) or \
+                    bulk_error.details.get('writeConcernErrors'):
+                raise
+            self.stats['duplicates'] += len(errors)
+
+    def close(self):
+        """Final flush at shutdown; unflushed records stay spooled for the next start."""
+        try:
+            self.flush()
+        except Exception as flush_error:
+            print(f"Error flushing write-behind buffer at shutdown: {flush_error}")
+        with self._lock:
+            self._spool.close()
+            if not os.path.getsize(self.spool_path):
+                os.remove(self.spool_path)
+        self._owner_lock.close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, queued=len(self._queue), spool_segments=len(self._segments))